@@ -0,0 +1,3 @@
+# -----------------------------
+# Benchmarks and the load test; run each from the repo root with `python -m bench.<name>`
+# -----------------------------
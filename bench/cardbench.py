@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import io
+import os
+import time
+
+from aiohttp import web
+
+# -----------------------------
+# /np card benchmark
+# -----------------------------
+# Renders /np cards through CardRenderer, with album art and avatars served from local fixture files
+# by an in-process HTTP server, so downloads go through the real session without reaching a CDN.
+# It reports three things:
+#   first  the first card, including starting the worker process
+#   cold   every card has new art, a new avatar and a new title: download, decode, all layers
+#   warm   the same card with new progress: bytes cached here, decoded images and layers in the worker
+# plus "warm in-process", the same render without the trip to the worker. Run from the repo root:
+#
+#   python -m bench.cardbench                             # synthetic fixtures
+#   python -m bench.cardbench --art cover.jpg --avatar me.png --cdn-latency 40
+#   python -m bench.cardbench --template light --json cardbench.json
+#
+# It also checks that downloads bigger than one read arrive whole and that ones over the size cap
+# are refused, and exits 1 if not.
+from bench import runner
+from np_card import CARD_READ_CHUNK, CARD_TEMPLATES, CardRenderer, NowPlayingCard, render_card_sync
+
+LARGE_FIXTURE_BYTES = 600_000  # Many read chunks, and more than aiohttp buffers before the first read
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+def synthetic_art(size: int = 640) -> bytes:
+    """A Spotify-sized album cover: 640x640 JPEG."""
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.effect_mandelbrot((size, size), (-2.0, -1.5, 1.0, 1.5), 100).convert("RGB").save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def synthetic_avatar(size: int = 128) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.radial_gradient("L").convert("RGB").resize((size, size)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class FixtureCDN:
+    """Serves the fixture bytes at any /art/... or /avatar/... path, after `latency` seconds."""
+
+    def __init__(self, art: bytes, avatar: bytes, latency: float):
+        self.files = {"art": (art, "image/jpeg"), "avatar": (avatar, "image/png")}
+        self.latency = latency
+        self.requests = 0
+        self._runner = None
+        self.url = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        data, content_type = self.files[request.match_info["kind"]]
+        response = web.Response(body=data, content_type=content_type)
+        if request.match_info["name"].startswith("chunked"):
+            response.enable_chunked_encoding()  # No Content-Length to refuse it by up front
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{kind:art|avatar}/{name}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def summary(name: str, timings: list, sizes: list) -> dict:
+    timings = sorted(timings)
+    return {
+        "case": name,
+        "count": len(timings),
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "max_ms": timings[-1] * 1000,
+        "kib": sum(sizes) / len(sizes) / 1024,
+    }
+
+
+def card(cdn: FixtureCDN, n: int, progress: float) -> NowPlayingCard:
+    return NowPlayingCard(
+        f"Track number {n} with a reasonably long title", "tripleS, Artist Feature", "ASSEMBLE25",
+        progress, 215, f"listener{n}", f"{cdn.url}/art/{n}.jpg", f"{cdn.url}/avatar/{n}.png?size=128",
+    )
+
+
+async def timed_render(renderer: CardRenderer, np_card: NowPlayingCard) -> tuple:
+    start = time.perf_counter()
+    data = await renderer.render(np_card)
+    return time.perf_counter() - start, len(data)
+
+
+async def check_downloads(renderer: CardRenderer, cdn: FixtureCDN) -> list:
+    """Large bodies arrive whole, and bodies over the cap are refused even without a Content-Length."""
+    problems = []
+    files = dict(cdn.files)
+    large = os.urandom(LARGE_FIXTURE_BYTES)
+    cdn.files["art"] = (large, "image/jpeg")
+    try:
+        for name in ("large.jpg", "chunked-large.jpg"):
+            data = await renderer.fetch(f"{cdn.url}/art/{name}")
+            if data != large:
+                problems.append(f"download: {name} came back as {len(data or b'')} of {len(large)} bytes")
+        cap, renderer.max_image_bytes = renderer.max_image_bytes, LARGE_FIXTURE_BYTES - CARD_READ_CHUNK
+        try:
+            for name in ("over-cap.jpg", "chunked-over-cap.jpg"):
+                if await renderer.fetch(f"{cdn.url}/art/{name}") is not None:
+                    problems.append(f"download: {name} is over the size cap but was kept")
+        finally:
+            renderer.max_image_bytes = cap
+    finally:
+        cdn.files = files
+    return problems
+
+
+async def run(args) -> dict:
+    art = read_file(args.art) if args.art else synthetic_art()
+    avatar = read_file(args.avatar) if args.avatar else synthetic_avatar()
+    cdn = FixtureCDN(art, avatar, args.cdn_latency / 1000)
+    await cdn.start()
+    renderer = CardRenderer(args.template, workers=1)
+    try:
+        first, first_size = await timed_render(renderer, card(cdn, 0, 0))
+        results = [summary("first", [first], [first_size])]
+
+        cold = [await timed_render(renderer, card(cdn, n, 60)) for n in range(1, args.renders + 1)]
+        results.append(summary("cold", [t for t, _ in cold], [s for _, s in cold]))
+
+        # The last cold card is the one most certainly still in every cache
+        last = args.renders
+        warm = [await timed_render(renderer, card(cdn, last, n % 215)) for n in range(args.renders)]
+        results.append(summary("warm", [t for t, _ in warm], [s for _, s in warm]))
+
+        # The worker's part of a warm render, in this process after one call to fill its caches
+        art_data = await renderer.fetch(card(cdn, last, 0).art_url)
+        avatar_data = await renderer.fetch(card(cdn, last, 0).avatar_url)
+        render_card_sync(args.template, card(cdn, last, 0), art_data, avatar_data)
+        local = []
+        for n in range(args.renders):
+            start = time.perf_counter()
+            data = render_card_sync(args.template, card(cdn, last, n % 215), art_data, avatar_data)
+            local.append((time.perf_counter() - start, len(data)))
+        results.append(summary("warm in-process", [t for t, _ in local], [s for _, s in local]))
+        downloads, cache = cdn.requests, renderer.images.stats()
+        problems = await check_downloads(renderer, cdn)
+    finally:
+        await renderer.close()
+        await cdn.stop()
+    return {"results": results, "cdn_requests": downloads, "cache": cache, "problems": problems}
+
+
+def print_results(result: dict):
+    print(f"{'case':>16} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'KiB':>6}")
+    for r in result["results"]:
+        print(f"{r['case']:>16} {r['count']:>6} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['max_ms']:>8.2f} {r['kib']:>6.0f}")
+    cache = result["cache"]
+    print(f"{result['cdn_requests']} fixture downloads; image cache {cache['size']}/{cache['maxsize']}, "
+          f"hit rate {cache['hit_rate']:.0%}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cold and warm render latency of /np cards.")
+    parser.add_argument("--renders", type=int, default=100, help="Cards per case")
+    parser.add_argument("--template", choices=list(CARD_TEMPLATES), default="dark")
+    parser.add_argument("--art", help="Album art fixture (default: a synthetic 640x640 JPEG)")
+    parser.add_argument("--avatar", help="Avatar fixture (default: a synthetic 128x128 PNG)")
+    parser.add_argument("--cdn-latency", type=float, default=0, help="ms the fixture server waits per request")
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    runner.finish(args, result, print_results)
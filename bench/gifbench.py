@@ -0,0 +1,247 @@
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+# -----------------------------
+# GIF fitting benchmark
+# -----------------------------
+# Shrinks a synthetic many-frame GIF under a target size with the old loop and with
+# media.fit_gif_sync, the model-guided search over scale, fps and palette. For each it reports the
+# encodes needed, the time, the output size and how much of the target it used, the output width,
+# and the PSNR of the first frame scaled back up against the source's (higher is better). The fitter
+# must fit the target in no more encodes than the old loop, or the run exits 1.
+#
+# Then it runs each way of shrinking it in a fresh subprocess and reports peak RSS over the
+# process's baseline:
+#   legacy    the old compress_gif_until_fit: every frame decoded to RGBA and kept in a list, the
+#             list resized by 0.85 and saved to a file, repeated until it fits (at most 10 rounds)
+#   reencode  one media.reencode_gif pass at 0.85 scale, one frame at a time
+#   fit-gif   media.fit_gif_sync down to the target size
+#   fit-webp  media.fit_webp_sync on the sample as animated WebP, down to the same share of its size
+#   animate   media.image_to_animation_sync to GIF and to WebP, as /gif's auto mode does for an upload
+# Pillow's pixel buffers don't go through Python's allocator, so tracemalloc can't see them; RSS
+# can. The streaming paths must stay under --limit MiB whatever the frame count, or the run exits 1.
+# Run from the repo root:
+#
+#   python -m bench.gifbench
+#   python -m bench.gifbench --frames 600 --size 640x480
+#   python -m bench.gifbench --target 0.2          # a tighter budget, where the old loop needs many rounds
+#   python -m bench.gifbench --limit 32 --json gifbench.json
+#
+from bench import runner
+import media
+from media import fit_gif_sync, fit_webp_sync, image_to_animation_sync, reencode_gif
+
+LEGACY_SHRINK = 0.85
+LEGACY_MAX_ATTEMPTS = 10
+STREAMING_PATHS = ("reencode", "fit-gif", "fit-webp", "animate")
+
+
+# -----------------------------
+# Synthetic sample
+# -----------------------------
+def panning_gif(frames: int, size: tuple) -> bytes:
+    """A camera pan across a Mandelbrot render: every frame changes, like a real clip."""
+    from PIL import Image, ImageChops
+    scene = Image.effect_mandelbrot((size[0] * 2, size[1]), (-2.2, -1.2, 1.0, 1.2), 80).convert("RGB")
+    palette = scene.quantize(256)
+    step = max(1, size[0] // frames)
+
+    def frame(n):
+        return ImageChops.offset(palette, -(n * step) % scene.width, 0).crop((0, 0) + size)
+
+    buf = io.BytesIO()
+    frame(0).save(buf, "GIF", save_all=True, append_images=(frame(n) for n in range(1, frames)), duration=66, loop=0)
+    return buf.getvalue()
+
+
+# -----------------------------
+# The old path
+# -----------------------------
+def legacy_compress_sync(input_path: str, output_path: str, scale_factor: float):
+    """compress_gif_sync as it was before the streaming rewrite."""
+    from PIL import Image, ImageSequence
+    with Image.open(input_path) as img:
+        frames = []
+        duration = img.info.get('duration', 100)
+        loop_val = img.info.get('loop', 0)
+        for frame in ImageSequence.Iterator(img):
+            frame = frame.convert("RGBA")
+            new_size = (int(frame.width * scale_factor), int(frame.height * scale_factor))
+            frames.append(frame.resize(new_size, Image.Resampling.LANCZOS))
+        frames[0].save(output_path, save_all=True, append_images=frames[1:], optimize=True,
+                       duration=duration, loop=loop_val, disposal=2)
+
+
+def legacy_fit(data: bytes, target_size: int) -> tuple:
+    """compress_gif_until_fit with `target_size` for MAX_SIZE; returns (output, encodes)."""
+    with tempfile.TemporaryDirectory(prefix="gifbench-") as directory:
+        current = os.path.join(directory, "input.gif")
+        with open(current, "wb") as f:
+            f.write(data)
+        encodes = 0
+        for attempt in range(LEGACY_MAX_ATTEMPTS):
+            if os.path.getsize(current) <= target_size:
+                break
+            output = os.path.join(directory, f"compressed-{attempt}.gif")
+            legacy_compress_sync(current, output, LEGACY_SHRINK)
+            encodes += 1
+            current = output
+        with open(current, "rb") as f:
+            return f.read(), encodes
+
+
+def counted_fit(data: bytes, target_size: int) -> tuple:
+    """fit_gif_sync; returns (output or None, encodes)."""
+    encodes = 0
+
+    def counting_reencode(*args, **kwargs):
+        nonlocal encodes
+        encodes += 1
+        return reencode_gif(*args, **kwargs)
+
+    media.reencode_gif = counting_reencode
+    try:
+        return fit_gif_sync(data, target_size), encodes
+    finally:
+        media.reencode_gif = reencode_gif
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+def first_frame_psnr(source: bytes, output: bytes) -> float:
+    from PIL import Image, ImageChops, ImageStat
+    with Image.open(io.BytesIO(source)) as src, Image.open(io.BytesIO(output)) as out:
+        reference = src.convert("RGB")
+        restored = out.convert("RGB").resize(reference.size, Image.Resampling.LANCZOS)
+    mse = sum(v * v for v in ImageStat.Stat(ImageChops.difference(reference, restored)).rms) / 3
+    return 10 * math.log10(255 ** 2 / mse) if mse else float("inf")
+
+
+def output_width(data: bytes) -> int:
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img:
+        return img.width
+
+
+def measure_fit(name: str, fit, data: bytes, target_size: int) -> dict:
+    start = time.perf_counter()
+    out, encodes = fit(data, target_size)
+    seconds = time.perf_counter() - start
+    fits = out is not None and len(out) <= target_size
+    return {
+        "path": name,
+        "encodes": encodes,
+        "ms": seconds * 1000,
+        "kib": len(out) / 1024 if out is not None else None,
+        "fill": len(out) / target_size if fits else None,
+        "width": output_width(out) if out is not None else None,
+        "psnr": first_frame_psnr(data, out) if out is not None else None,
+    }
+
+
+def run_memory_child(path: str, sample: str, target_size: int) -> dict:
+    """One path over the sample file in this (fresh) process; peak RSS above the loaded baseline."""
+    from PIL import Image  # noqa: F401 - imported before the baseline, like in a warm media worker
+    with open(sample, "rb") as f:
+        data = f.read()
+    if path == "fit-webp":
+        webp = image_to_animation_sync(data, "webp")
+        data, target_size = webp, int(len(webp) * target_size / len(data))
+    baseline = runner.rss_bytes()
+    if path == "legacy":
+        legacy_fit(data, target_size)
+    elif path == "reencode":
+        reencode_gif(io.BytesIO(data), io.BytesIO(), LEGACY_SHRINK)
+    elif path == "fit-gif":
+        fit_gif_sync(data, target_size)
+    elif path == "fit-webp":
+        fit_webp_sync(data, target_size)
+    elif path == "animate":
+        for fmt in ("gif", "webp"):
+            image_to_animation_sync(data, fmt)
+    return {"path": path, "peak_mib": (runner.peak_rss_bytes() - baseline) / 2**20}
+
+
+def measure_memory(path: str, sample: str, target_size: int) -> dict:
+    return runner.run_child("gifbench", path, sample, target_size)
+
+
+def run(args) -> dict:
+    width, height = (int(n) for n in args.size.split("x"))
+    data = panning_gif(args.frames, (width, height))
+    target_size = int(len(data) * args.target)
+    fits = [measure_fit("legacy", legacy_fit, data, target_size), measure_fit("fit", counted_fit, data, target_size)]
+    with tempfile.TemporaryDirectory(prefix="gifbench-") as directory:
+        sample = os.path.join(directory, "sample.gif")
+        with open(sample, "wb") as f:
+            f.write(data)
+        memory = [measure_memory(path, sample, target_size) for path in args.paths]
+    problems = [
+        f"{m['path']}: peak {m['peak_mib']:.0f} MiB over the {args.limit:.0f} MiB limit"
+        for m in memory if m["path"] in STREAMING_PATHS and m["peak_mib"] > args.limit
+    ]
+    legacy, fit = fits
+    if fit["fill"] is None:
+        problems.append(f"fit: nothing fit the {target_size / 1024:.0f} KiB target")
+    elif fit["encodes"] > legacy["encodes"]:
+        problems.append(f"fit: {fit['encodes']} encodes, more than the old loop's {legacy['encodes']}")
+    return {"frames": args.frames, "size": args.size, "input_kib": len(data) / 1024, "target_kib": target_size / 1024,
+            "fits": fits, "memory": memory, "problems": problems}
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+FIT_COLUMNS = (
+    ("path", "path", 10, "{}"),
+    ("encodes", "encodes", 8, "{}"),
+    ("ms", "ms", 8, "{:.0f}"),
+    ("kib", "KiB", 8, "{:.0f}"),
+    ("fill", "of target", 10, "{:.0%}"),
+    ("width", "width", 6, "{}"),
+    ("psnr", "PSNR dB", 8, "{:.1f}"),
+)
+
+
+def print_results(result: dict):
+    print(f"{result['frames']} frames at {result['size']}: {result['input_kib']:.0f} KiB, target {result['target_kib']:.0f} KiB")
+    print(" ".join(f"{title:>{width}}" for _, title, width, _ in FIT_COLUMNS))
+    for fit in result["fits"]:
+        print(" ".join(
+            f"{fmt.format(fit[key]) if fit[key] is not None else '-':>{width}}" for key, _, width, fmt in FIT_COLUMNS
+        ))
+    print()
+    print(f"{'path':>10} {'peak MiB':>9}")
+    for m in result["memory"]:
+        print(f"{m['path']:>10} {m['peak_mib']:>9.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Encodes, quality and peak memory of GIF fitting, old and new.")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--size", default="480x360", help="Frame size, WIDTHxHEIGHT")
+    parser.add_argument("--target", type=float, default=0.5, help="Target size as a fraction of the input")
+    parser.add_argument("--paths", nargs="+", default=["legacy", *STREAMING_PATHS],
+                        choices=["legacy", *STREAMING_PATHS], help="Paths to measure")
+    parser.add_argument("--limit", type=float, default=48, help="Peak MiB allowed for the streaming paths")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--child", nargs=3, metavar=("PATH", "SAMPLE", "TARGET"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        path, sample, target_size = args.child
+        print(json.dumps(run_memory_child(path, sample, int(target_size))))
+        sys.exit(0)
+
+    result = run(args)
+    runner.finish(args, result, print_results)
@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+# -----------------------------
+# Listening history benchmark
+# -----------------------------
+# Feeds synthetic plays through ListeningHistory.record the way presence updates would. Every
+# play is repeated as a duplicate update, and some are also seen from a second guild. Plays are
+# flushed in batches to a fresh SQLite file. The benchmark reports ingest rate, flush cost and
+# /topartists and /toptracks query latency from the rollups, against a GROUP BY over the raw play
+# log for comparison. Run from the repo root:
+#
+#   python -m bench.historybench                  # 1M plays
+#   python -m bench.historybench --plays 5000000 --users 50000
+#   python -m bench.historybench --json historybench.json
+#
+from bench import runner
+from listening_history import ListeningHistory, SQLiteHistoryStore
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def synthetic_catalog(args, rng: random.Random) -> list:
+    """(track_id, title, artists) with a few features, so artist rollups get more rows than tracks."""
+    catalog = []
+    for n in range(args.tracks):
+        artists = (f"Artist {n % args.artists}",)
+        if rng.random() < 0.2:
+            artists += (f"Artist {rng.randrange(args.artists)}",)
+        catalog.append((f"{n:022d}", f"Track {n}", artists))
+    return catalog
+
+
+async def ingest(history: ListeningHistory, args) -> dict:
+    rng = random.Random(args.seed)
+    catalog = synthetic_catalog(args, rng)
+    home = {user: 10**17 + user % args.guilds for user in range(args.users)}
+    next_start = dict.fromkeys(range(args.users), 1.7e9)  # Each member's next song starts when the last ended
+    history.clock = lambda: 1.7e9
+
+    flush_seconds = 0.0
+    flushes = 0
+    start = time.perf_counter()
+    for n in range(args.plays):
+        user = rng.randrange(args.users)
+        # Skewed towards popular tracks, like real listening
+        track_id, title, artists = catalog[min(int(rng.expovariate(8 / args.tracks)), args.tracks - 1)]
+        begin = next_start[user]
+        end = next_start[user] = begin + 200
+        guild = home[user]
+        history.record(guild, user, track_id, title, artists, begin, end)
+        history.record(guild, user, track_id, title, artists, begin, end)  # Seek or pause: same play
+        if rng.random() < args.shared:
+            history.record(guild + 1, user, track_id, title, artists, begin, end)  # Seen from another guild too
+        if len(history) >= history.batch_size:
+            flush_start = time.perf_counter()
+            await history.flush()
+            flush_seconds += time.perf_counter() - flush_start
+            flushes += 1
+    flush_start = time.perf_counter()
+    await history.flush()
+    flush_seconds += time.perf_counter() - flush_start
+    flushes += 1
+    wall = time.perf_counter() - start
+    return {
+        "plays": history.plays,
+        "duplicates": history.duplicates,
+        "ingest_seconds": wall,
+        "plays_per_second": args.plays / wall,
+        "record_us": (wall - flush_seconds) / args.plays * 1e6,
+        "flushes": flushes,
+        "flush_ms": flush_seconds / flushes * 1000,
+    }
+
+
+def time_queries(func, owners: list) -> list:
+    timings = []
+    for owner in owners:
+        start = time.perf_counter()
+        func(owner)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+
+def query_latency(store: SQLiteHistoryStore, args) -> list:
+    rng = random.Random(args.seed + 1)
+    users = [rng.randrange(args.users) for _ in range(args.queries)]
+    guilds = [10**17 + rng.randrange(args.guilds) for _ in range(args.queries)]
+    conn = sqlite3.connect(store.path)
+    scan_queries = max(1, args.queries // 50)  # The raw scans are slow; a handful is enough
+
+    queries = (
+        ("toptracks user", lambda u: store.top_tracks(user_id=u), users),
+        ("topartists user", lambda u: store.top_artists(user_id=u), users),
+        ("toptracks guild", lambda g: store.top_tracks(guild_id=g), guilds),
+        ("topartists guild", lambda g: store.top_artists(guild_id=g), guilds),
+        ("toptracks guild (scan)", lambda g: conn.execute(
+            "SELECT track_id, COUNT(*) AS n FROM plays WHERE guild_id = ? GROUP BY track_id ORDER BY n DESC LIMIT 10",
+            (g,)).fetchall(), guilds[:scan_queries]),
+        ("toptracks user (scan)", lambda u: conn.execute(
+            "SELECT track_id, COUNT(*) AS n FROM plays WHERE user_id = ? AND first GROUP BY track_id "
+            "ORDER BY n DESC LIMIT 10", (u,)).fetchall(), users[:scan_queries]),
+    )
+    results = []
+    for name, func, owners in queries:
+        timings = time_queries(func, owners)
+        results.append({
+            "query": name,
+            "count": len(timings),
+            "p50_ms": percentile(timings, 50) * 1000,
+            "p95_ms": percentile(timings, 95) * 1000,
+            "p99_ms": percentile(timings, 99) * 1000,
+        })
+    conn.close()
+    return results
+
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="historybench-") as directory:
+        path = args.db or os.path.join(directory, "history.sqlite3")
+        store = SQLiteHistoryStore(path)
+        history = ListeningHistory(store, batch_size=args.batch)
+        result = await ingest(history, args)
+        result["db_mib"] = sum(
+            os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)
+        ) / 2**20
+        result["queries"] = query_latency(store, args)
+        store.close()
+    return result
+
+
+def print_results(result: dict):
+    print(f"ingested {result['plays']} plays ({result['duplicates']} duplicate updates dropped) "
+          f"in {result['ingest_seconds']:.1f}s: {result['plays_per_second']:.0f} plays/s")
+    print(f"  record {result['record_us']:.2f}µs per play, {result['flushes']} flushes "
+          f"of {result['flush_ms']:.1f}ms on average, database {result['db_mib']:.0f} MiB")
+    print(f"{'query':>24} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for query in result["queries"]:
+        print(f"{query['query']:>24} {query['count']:>6} {query['p50_ms']:>8.3f} {query['p95_ms']:>8.3f} {query['p99_ms']:>8.3f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest rate and top list latency of the listening history.")
+    parser.add_argument("--plays", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--tracks", type=int, default=50_000)
+    parser.add_argument("--artists", type=int, default=5_000)
+    parser.add_argument("--shared", type=float, default=0.2, help="Fraction of plays also seen from a second guild")
+    parser.add_argument("--batch", type=int, default=1000, help="Plays per flush")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per kind")
+    parser.add_argument("--db", help="SQLite file to write (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    runner.finish(args, result, print_results)
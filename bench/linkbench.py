@@ -0,0 +1,210 @@
+import argparse
+import random
+import re
+import time
+
+# -----------------------------
+# Link rewriter micro-benchmark
+# -----------------------------
+# Times the combined LinkRewriter against the chain on_message used before it: four regexes, each
+# searched over every message, then str.replace on the first match. Both run over the same corpus of
+# synthetic chat messages, most of them without links, like a real server. The benchmark reports
+# messages per second for each kind of message and overall, best of --repeat runs, and how long each
+# fixed link took. The old chain only ever fixed the first link in a message, so for messages with
+# several links the time per fixed link is the fair comparison. It exits 1 if the rewriter misses a
+# link the old chain fixed, or takes longer per fixed link than the old chain on messages with links
+# (by more than --tolerance, which only absorbs timing noise).
+# Run from the repo root:
+#
+#   python -m bench.linkbench
+#   python -m bench.linkbench --messages 50000 --links 0.5 --json linkbench.json
+#
+from bench import runner
+from link_fixer import LinkRewriter
+
+WORDS = ("omg", "did", "you", "see", "the", "new", "comeback", "teaser", "lol", "tripleS", "is", "so", "good",
+         "stream", "it", "tonight", "haha", "who", "is", "your", "bias", "same", "literally", "crying", "rn")
+LINKS = {
+    "twitter": ("https://x.com/user{n}/status/{id}", "https://twitter.com/someone/status/{id}?s=20"),
+    "instagram": ("https://www.instagram.com/reel/C{id}/?igsh=abc", "https://instagram.com/p/{id}/"),
+    "reddit": ("https://www.reddit.com/r/kpop/comments/{id}/title/",),
+    "tiktok": ("https://www.tiktok.com/@user{n}/video/{id}",),
+    "other": ("https://example.com/not/{id}/supported", "https://youtu.be/{id}"),
+}
+LINK_KINDS = ("one link", "several links")  # Must be no slower per fixed link than the old chain
+
+
+# -----------------------------
+# The old path
+# -----------------------------
+twitter_regex = re.compile(r"https?://(?:www\.)?(x\.com|twitter\.com)/(\w+)/status/(\d+)")
+instagram_regex = re.compile(r"(https?://(www\.)?instagram\.com/\S+)")
+reddit_regex = re.compile(r"(https?://(www\.)?reddit\.com/\S+)")
+tiktok_regex = re.compile(r"https?://(?:www\.)?tiktok\.com/\S+")
+
+
+def legacy_rewrite(content: str) -> str:
+    """on_message's link processing as it was before LinkRewriter; the reply, or "" for none."""
+    link_found = False
+    markdown_message = ""
+
+    twitter_match = twitter_regex.search(content)
+    if twitter_match:
+        link_found = True
+        username = twitter_match.group(2)
+        original_link = twitter_match.group(0)
+        fixed_link = original_link.replace("x.com", "fixupx.com").replace("twitter.com", "fixupx.com")
+        markdown_message = f"[Twitter • @{username}]({fixed_link})"
+
+    insta_match = instagram_regex.search(content)
+    if not link_found and insta_match:
+        link_found = True
+        original_link = insta_match.group(1)
+        clean_link = original_link.split("?")[0]
+        fixed_link = clean_link.replace("instagram.com", "kkinstagram.com")
+        markdown_message = f"[Instagram]({fixed_link})"
+
+    reddit_match = reddit_regex.search(content)
+    if not link_found and reddit_match:
+        link_found = True
+        original_link = reddit_match.group(1)
+        fixed_link = original_link.replace("reddit.com", "rxddit.com")
+        markdown_message = f"[Reddit]({fixed_link})"
+
+    tiktok_match = tiktok_regex.search(content)
+    if not link_found and tiktok_match:
+        link_found = True
+        original_link = tiktok_match.group(0)
+        fixed_link = original_link.replace("tiktok.com", "tnktok.com")
+        markdown_message = f"[TikTok]({fixed_link})"
+
+    return markdown_message
+
+
+def legacy_links(content: str) -> int:
+    return 1 if legacy_rewrite(content) else 0
+
+
+def rewriter_path(rewriter: LinkRewriter):
+    """LinkRewriter as on_message uses it, plus the reply the queue later builds from its links."""
+    def rewrite(content: str) -> str:
+        fixed = rewriter.rewrite(content)
+        return rewriter.format_reply(fixed) if fixed else ""
+    return rewrite
+
+
+# -----------------------------
+# Corpus
+# -----------------------------
+def chatter(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 30)))
+
+
+def corpus(args) -> list:
+    """(kind, message) pairs: "chatter", "unsupported", "one link" or "several links"."""
+    rng = random.Random(args.seed)
+    supported = [template for provider, templates in LINKS.items() if provider != "other" for template in templates]
+
+    def link(templates):
+        return rng.choice(templates).format(n=rng.randrange(100), id=rng.randrange(10**18, 10**19))
+
+    messages = []
+    for _ in range(args.messages):
+        if rng.random() >= args.links:
+            messages.append(("chatter", chatter(rng)))
+        elif rng.random() < 0.2:
+            messages.append(("unsupported", f"{chatter(rng)} {link(LINKS['other'])}"))
+        elif rng.random() < 0.8:
+            messages.append(("one link", f"{chatter(rng)} {link(supported)} {chatter(rng)}"))
+        else:
+            links = [link(supported) for _ in range(rng.randint(2, 4))]
+            messages.append(("several links", " ".join([chatter(rng), *links])))
+    return messages
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+def best_times(paths: dict, messages: list, repeat: int, chunk: int = 200) -> dict:
+    """Best seconds per message for each path over `repeat` passes.
+
+    Within a pass the paths take turns every `chunk` messages, so a busy machine slows them down alike.
+    """
+    chunks = [messages[i:i + chunk] for i in range(0, len(messages), chunk)]
+    best = dict.fromkeys(paths, float("inf"))
+    for _ in range(repeat):
+        totals = dict.fromkeys(paths, 0.0)
+        for group in chunks:
+            for name, rewrite in paths.items():
+                start = time.perf_counter()
+                for message in group:
+                    rewrite(message)
+                totals[name] += time.perf_counter() - start
+        for name, seconds in totals.items():
+            best[name] = min(best[name], seconds)
+    return {name: seconds / len(messages) for name, seconds in best.items()}
+
+
+def run(args) -> dict:
+    messages = corpus(args)
+    rewriter = LinkRewriter()
+    paths = {"legacy": legacy_rewrite, "rewriter": rewriter_path(rewriter)}
+    kinds = {}
+    for kind, message in messages:
+        kinds.setdefault(kind, []).append(message)
+    kinds["all"] = [message for _, message in messages]
+
+    results = []
+    for kind, group in kinds.items():
+        timings = best_times(paths, group, args.repeat)
+        links = {
+            "legacy": sum(legacy_links(message) for message in group),
+            "rewriter": sum(len(rewriter.rewrite(message)) for message in group),
+        }
+        # Seconds per fixed link; None when a path fixed nothing in this kind of message
+        per_link = {name: timings[name] * len(group) / links[name] if links[name] else None for name in paths}
+        results.append({
+            "kind": kind,
+            "messages": len(group),
+            "legacy_per_s": 1 / timings["legacy"],
+            "rewriter_per_s": 1 / timings["rewriter"],
+            "speedup": timings["legacy"] / timings["rewriter"] if timings["rewriter"] else float("inf"),
+            "legacy_links": links["legacy"],
+            "rewriter_links": links["rewriter"],
+            "link_speedup": per_link["legacy"] / per_link["rewriter"] if per_link["legacy"] and per_link["rewriter"] else None,
+        })
+
+    missed = [message for message in kinds["all"] if legacy_rewrite(message) and not paths["rewriter"](message)]
+    problems = []
+    if missed:
+        problems.append(f"rewriter: no link fixed in {len(missed)} messages the old chain fixed, e.g. {missed[0]!r}")
+    for r in results:
+        if r["kind"] in LINK_KINDS and r["link_speedup"] is not None and r["link_speedup"] < 1 - args.tolerance:
+            problems.append(f"REGRESSION {r['kind']}: {r['link_speedup']:.2f}x the old chain's speed per fixed link")
+    return {"results": results, "problems": problems}
+
+
+def print_results(result: dict):
+    print(f"{'kind':>14} {'messages':>9} {'old msg/s':>11} {'new msg/s':>11} {'speedup':>8} "
+          f"{'old links':>10} {'new links':>10} {'per link':>9}")
+    for r in result["results"]:
+        link_speedup = f"{r['link_speedup']:.2f}x" if r["link_speedup"] is not None else "-"
+        print(f"{r['kind']:>14} {r['messages']:>9} {r['legacy_per_s']:>11,.0f} {r['rewriter_per_s']:>11,.0f} "
+              f"{r['speedup']:>7.2f}x {r['legacy_links']:>10} {r['rewriter_links']:>10} {link_speedup:>9}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="LinkRewriter against the old four-regex chain.")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--links", type=float, default=0.2, help="Fraction of messages with a link")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes per path; the best is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown per fixed link (0.1 = 10%%)")
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run(args)
+    runner.finish(args, result, print_results)
@@ -0,0 +1,1306 @@
+import argparse
+import asyncio
+import io
+import json
+import mimetypes
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from typing import Callable, NamedTuple
+
+import aiohttp
+import discord
+
+# -----------------------------
+# Offline load test for the bot's handlers
+# -----------------------------
+# Drives the real handlers in main.py with fake Discord objects, while Supabase, Spotify and the
+# Discord API are replaced by in-process fakes with configurable latency. Nothing here connects
+# to anything. Run from the repo root:
+#
+#   python -m bench.loadtest                             # every scenario with default sizes
+#   python -m bench.loadtest links np --rate 500         # open-loop arrivals at 500 events/s
+#   python -m bench.loadtest --json results.json         # save results ...
+#   python -m bench.loadtest --baseline results.json     # ... and fail (exit 1) if p95 or throughput regress
+#
+# Any guild config query after the initial preload also fails the run: config lookups must stay
+# in memory on the hot path.
+#
+# Placeholders win over .env so importing main can never reach the real services
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "loadtest.loadtest.loadtest")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "loadtest")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "loadtest")
+
+from bench import runner
+import main
+from cogs import EXTENSIONS
+from guild_config import GuildConfig, GuildConfigStore, MemoryGuildConfigBackend
+from keep_alive import HealthServer
+from listeners import ListenerIndex
+from listening_history import ListeningHistory, SQLiteHistoryStore
+from logs import setup_logging
+from live_embeds import LiveEmbedScheduler
+from loop_watchdog import LoopWatchdog
+from metrics import MEDIA_DISK_BYTES, MEDIA_JOB_SECONDS, MEDIA_OUTPUTS, registry
+from profile_store import PRELOAD_CHUNK_SIZE, MemoryProfileBackend, SpotifyProfileStore
+from result_cache import MediaResultCache
+from spotify_api import TRACKS_BATCH_SIZE, SpotifyClient
+
+ALLOC_EVENTS = 200  # Events in the separate tracemalloc pass; tracing is too slow for the timed pass
+
+
+class Latency:
+    """A delay in milliseconds with gaussian jitter; zero means no await at all."""
+
+    def __init__(self, ms: float, jitter_ms: float = 0):
+        self.ms = ms
+        self.jitter_ms = jitter_ms
+
+    def sample(self) -> float:
+        if not self.ms and not self.jitter_ms:
+            return 0.0
+        return max(0.0, random.gauss(self.ms, self.jitter_ms)) / 1000
+
+    async def sleep(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+# -----------------------------
+# Fake backends
+# -----------------------------
+def fake_track(track_id: str) -> dict:
+    artist_id = f"artist{hash(track_id) % 40}"
+    return {
+        "id": track_id,
+        "name": f"Track {track_id}",
+        "artists": [{"name": f"Artist {artist_id}", "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"}}],
+    }
+
+
+class FakeSpotifyClient(SpotifyClient):
+    """The real client (cache, batching) with the HTTP layer replaced by a delay and synthetic JSON."""
+
+    def __init__(self, latency: Latency):
+        super().__init__("loadtest", "loadtest")
+        self.latency = latency
+        self.requests = 0
+        self.fail_once = set()  # Track ids whose next single-track lookup fails
+
+    async def request(self, path: str, params: dict | None = None) -> dict:
+        self.requests += 1
+        await self.latency.sleep()
+        if path == "/tracks":
+            return {"tracks": [fake_track(track_id) for track_id in params["ids"].split(",")]}
+        track_id = path.rsplit("/", 1)[1]
+        if track_id in self.fail_once:
+            self.fail_once.discard(track_id)
+            raise aiohttp.ClientConnectionError("loadtest: injected Spotify failure")
+        return fake_track(track_id)
+
+
+class FakeSupabaseBackend(MemoryProfileBackend):
+    """MemoryProfileBackend whose calls block a worker thread, like the sync supabase client does."""
+
+    def __init__(self, rows: dict, latency: Latency):
+        super().__init__(rows)
+        self.latency = latency
+
+    async def _wait(self):
+        await asyncio.to_thread(time.sleep, self.latency.sample())
+
+    async def fetch_many(self, user_ids) -> dict:
+        # Rows are read on the server, then the response takes its time coming back, so a write can land in between
+        rows = await super().fetch_many(user_ids)
+        await self._wait()
+        return rows
+
+    async def upsert(self, user_id: int, link: str):
+        await self._wait()
+        await super().upsert(user_id, link)
+
+    async def delete(self, user_id: int) -> bool:
+        await self._wait()
+        return await super().delete(user_id)
+
+
+class UncachedResults(MediaResultCache):
+    """Hashes inputs like the real cache but never hits, so every gif job runs the full pipeline."""
+
+    async def get(self, key: str, input_size: int = 0) -> bytes | None:
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes, fmt: str = "gif"):
+        pass
+
+
+class FakeClock:
+    """A monotonic clock that only moves when told to."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+# -----------------------------
+# Fake Discord objects
+# -----------------------------
+class DiscordAPI:
+    """Every outbound Discord call goes through here: adds latency and counts "❌" replies."""
+
+    def __init__(self, latency: Latency, clock: FakeClock | None = None):
+        self.latency = latency
+        self.clock = clock
+        self.calls = 0
+        self.failures = 0
+        self.edits = []  # (clock time, channel id, message id, embed) for every message edit
+        self.sent = []  # (channel id, content) for every message sent
+        self.rate_limited = 0
+        self.expired = set()  # Message ids whose edits fail with a 401, like an expired interaction token
+        self.refused_edits = {}  # message id -> edits refused that way
+        self._ids = iter(range(10**15, 10**16))
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    async def call(self, content=None, **kwargs):
+        self.calls += 1
+        if isinstance(content, str) and content.startswith("❌"):
+            self.failures += 1
+        await self.latency.sleep()
+
+
+class FakeAsset:
+    __slots__ = ("url",)
+
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str, bot: bool = False, guild=None):
+        self.id = user_id
+        self.name = self.display_name = self.global_name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+        self.avatar = None
+        self.default_avatar = FakeAsset("https://cdn.discordapp.com/embed/avatars/0.png")
+        self.activities = ()
+        self.guild = guild
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, name: str):
+        self.id = guild_id
+        self.name = name
+        self.filesize_limit = 25 * 1024 * 1024
+        self.icon = None
+        self.members = []
+        self._members = {}
+
+    def add(self, member: FakeUser):
+        self.members.append(member)
+        self._members[member.id] = member
+
+    @property
+    def member_count(self) -> int:
+        return len(self.members)
+
+    def get_member(self, member_id: int):
+        return self._members.get(member_id)
+
+
+class SentMessage:
+    def __init__(self, api: DiscordAPI, channel=None):
+        self.api = api
+        self.id = api.next_id()
+        self.channel = channel
+
+    async def edit(self, content=None, **kwargs):
+        if self.id in self.api.expired:
+            self.api.refused_edits[self.id] = self.api.refused_edits.get(self.id, 0) + 1
+            raise discord.HTTPException(FakeHTTPResponse(401, "Unauthorized", {}),
+                                        {"message": "Invalid Webhook Token", "code": 50027})
+        if self.api.clock is not None:
+            self.api.edits.append((self.api.clock(), self.channel.id if self.channel else None, self.id, kwargs.get("embed")))
+        await self.api.call(content, **kwargs)
+
+    async def delete(self):
+        await self.api.call()
+
+
+class FakeHTTPResponse:
+    """Just enough of aiohttp.ClientResponse for discord.HTTPException."""
+
+    def __init__(self, status: int, reason: str, headers: dict):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+
+
+class FakeChannel:
+    def __init__(self, api: DiscordAPI, channel_id: int, name: str = "general", rate_limit: tuple | None = None):
+        self.api = api
+        self.id = channel_id
+        self.name = name
+        self.rate_limit = rate_limit  # (sends, per seconds); more than that gets a 429 like Discord's bucket
+        self._sent_at = []
+
+    def _take_token(self):
+        limit, per = self.rate_limit
+        now = time.monotonic()
+        self._sent_at = [at for at in self._sent_at if now - at < per]
+        if len(self._sent_at) >= limit:
+            self.api.rate_limited += 1
+            reset_after = f"{per - (now - self._sent_at[0]):.3f}"
+            raise discord.HTTPException(
+                FakeHTTPResponse(429, "Too Many Requests", {"Retry-After": reset_after, "X-RateLimit-Reset-After": reset_after}),
+                {"message": "You are being rate limited.", "code": 0},
+            )
+        self._sent_at.append(now)
+
+    async def send(self, content=None, **kwargs):
+        if self.rate_limit:
+            self._take_token()
+        await self.api.call(content, **kwargs)
+        self.api.sent.append((self.id, content))
+        return SentMessage(self.api, self)
+
+
+class FakeMessage(SentMessage):
+    _state = None  # Only read by commands.Context, which this harness never invokes a command through
+
+    def __init__(self, api: DiscordAPI, author: FakeUser, channel: FakeChannel, content: str, attachments=()):
+        super().__init__(api, channel)
+        self.author = author
+        self.guild = author.guild
+        self.content = content
+        self.attachments = list(attachments)
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeAttachment:
+    def __init__(self, data: bytes, filename: str):
+        self.data = data
+        self.filename = filename
+        self.size = len(data)
+        self.content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        self.url = f"https://cdn.loadtest/attachments/{id(self)}/{filename}"
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+class FakeCDN:
+    """Stands in for the media cog's download session; serves attachments by URL in chunks."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.files = {}
+        self.downloads = 0
+
+    def attachment(self, data: bytes, filename: str) -> FakeAttachment:
+        attachment = FakeAttachment(data, filename)
+        self.files[attachment.url] = data
+        return attachment
+
+    def get(self, url: str, **kwargs):
+        return FakeDownload(self, self.files[url])
+
+
+class FakeDownload:
+    def __init__(self, cdn: FakeCDN, data: bytes):
+        self.cdn = cdn
+        self.data = data
+        self.content = self
+
+    async def __aenter__(self):
+        self.cdn.downloads += 1
+        await self.cdn.latency.sleep()
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def iter_chunked(self, size: int):
+        view = memoryview(self.data)
+        for start in range(0, len(view), size):
+            yield view[start:start + size]
+            await asyncio.sleep(0)
+
+
+class FakeContext:
+    def __init__(self, message: FakeMessage):
+        self.message = message
+        self.author = message.author
+        self.guild = message.guild
+        self.channel = message.channel
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeResponse:
+    def __init__(self, api: DiscordAPI):
+        self.api = api
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        await self.api.call(content, **kwargs)
+
+    async def defer(self, **kwargs):
+        self._done = True
+        await self.api.call()
+
+    async def edit_message(self, content=None, **kwargs):
+        self._done = True
+        await self.api.call(content, **kwargs)
+
+
+class FakeInteraction:
+    def __init__(self, api: DiscordAPI, user: FakeUser, channel: FakeChannel):
+        self.api = api
+        self.user = user
+        self.guild = user.guild
+        self.guild_id = user.guild.id
+        self.channel = channel
+        self.response = FakeResponse(api)
+        self.followup = channel
+        self.files = []  # Attachments of the last edit_original_response
+        self._original = None
+
+    async def original_response(self):
+        if self._original is None:
+            await self.api.call()
+            self._original = SentMessage(self.api, self.channel)
+        return self._original
+
+    async def edit_original_response(self, content=None, **kwargs):
+        self.files = kwargs.get("attachments", self.files)
+        await self.api.call(content, **kwargs)
+
+
+def fake_spotify(track_id: str, started_ago: float = 30, length: float = 200) -> discord.Spotify:
+    now = discord.utils.utcnow()
+    start = now - timedelta(seconds=started_ago)
+    end = start + timedelta(seconds=length)
+    number = int(track_id[5:])
+    return discord.Spotify(
+        name="Spotify",
+        details=f"Track {track_id}",
+        state=f"Artist {number % 40}; Feature {number % 7}",
+        assets={"large_image": f"spotify:ab67616d0000b273{number:024x}", "large_text": f"Album {number % 60}"},
+        timestamps={"start": int(start.timestamp() * 1000), "end": int(end.timestamp() * 1000)},
+        sync_id=track_id,
+        session_id="loadtest",
+        party={"id": f"spotify:{track_id}"},
+    )
+
+
+# -----------------------------
+# World setup
+# -----------------------------
+def fake_guild_config(index: int, channel: FakeChannel) -> GuildConfig:
+    """A spread of settings so handlers take different config-dependent paths per guild."""
+    return GuildConfig(
+        welcome_channel_id=channel.id if index % 2 == 0 else None,
+        link_providers=frozenset({"instagram", "reddit", "tiktok"}) if index % 3 == 1 else None,
+        gif_max_bytes=8 * 1024 * 1024 if index % 4 == 3 else None,
+    )
+
+
+class World:
+    """Fake guilds wired into main.client; rebuilt per pass so every run starts with cold caches."""
+
+    def __init__(self, args):
+        self.args = args
+        self.clock = FakeClock()
+        self.api = DiscordAPI(Latency(args.discord_latency, args.discord_latency / 4), self.clock)
+        self.channel = FakeChannel(self.api, 10**17 + 1)
+        self.channels = [self.channel]
+        self.guilds = [FakeGuild(10**17 + 100 * (g + 1), f"Load Test {g}") for g in range(args.guilds)]
+        self.bot = FakeUser(10**17 + 2, "Kwakinji", bot=True, guild=self.guilds[0])
+
+        rng = random.Random(args.seed)
+        tracks = [f"track{n}" for n in range(args.tracks)]
+        rows = {}
+        self.members = []
+        for n in range(args.members):
+            guild = self.guilds[n % len(self.guilds)]
+            member = FakeUser(10**18 + n, f"member{n}", guild=guild)
+            if rng.random() < args.listening:
+                # Skewed so a few tracks are popular, like a real server
+                member.activities = (fake_spotify(tracks[min(int(rng.expovariate(5 / len(tracks))), len(tracks) - 1)]),)
+            if rng.random() < args.profiles:
+                rows[member.id] = f"https://open.spotify.com/user/member{n}"
+            guild.add(member)
+            self.members.append(member)
+        self.listeners = [m for m in self.members if m.activities]
+        self.guild_listeners = {guild.id: [m for m in guild.members if m.activities] for guild in self.guilds}
+
+        self.spotify = FakeSpotifyClient(Latency(args.spotify_latency, args.spotify_latency / 4))
+        self.backend = FakeSupabaseBackend(rows, Latency(args.supabase_latency, args.supabase_latency / 4))
+        self.config_backend = MemoryGuildConfigBackend(
+            {guild.id: fake_guild_config(g, self.channel) for g, guild in enumerate(self.guilds)}
+        )
+        self.config_preload_queries = 0
+        self._gif_cache = tempfile.TemporaryDirectory(prefix="loadtest-gif-")
+        self.scratch = tempfile.TemporaryDirectory(prefix="loadtest-media-")
+        self.cdn = FakeCDN(Latency(args.discord_latency, args.discord_latency / 4))
+        self._history = tempfile.TemporaryDirectory(prefix="loadtest-history-")
+        self.watchdog = None
+
+    async def install(self):
+        """Swap the fakes into the client and reload the cogs so they pick them up."""
+        client = main.client
+        client.spotify = self.spotify
+        client.profiles = SpotifyProfileStore(self.backend)
+        client.gif_cache = UncachedResults(directory=self._gif_cache.name)
+        client.listener_index = ListenerIndex()
+        # Driven by hand against the fake clock (see verify_live) instead of by its ticker task
+        client.live_embeds = LiveEmbedScheduler(clock=self.clock)
+        # Flushed by the queries and at the end of the run rather than by its writer task
+        client.history = ListeningHistory(SQLiteHistoryStore(os.path.join(self._history.name, "history.sqlite3")))
+        for guild in self.guilds:
+            client.listener_index.rebuild(guild)
+        # Loaded up front like on_ready does; every lookup after this must be served from memory
+        client.guild_configs = GuildConfigStore(self.config_backend)
+        await client.guild_configs.load(guild.id for guild in self.guilds)
+        self.config_preload_queries = self.config_backend.queries
+        client._connection.user = self.bot
+        client.get_channel = lambda channel_id: self.channel
+
+        for extension in EXTENSIONS:
+            if extension in client.extensions:
+                await client.unload_extension(extension)
+        await client.load_extensions()
+        media = client.get_cog("Media")
+        media.scratch_dir = self.scratch.name
+        media._get_session = lambda: self.cdn
+        if self.args.spool_threshold is not None:
+            media.spool_threshold = self.args.spool_threshold
+
+    @property
+    def config_queries(self) -> int:
+        """Guild config queries since the preload, i.e. ones made on a hot path."""
+        return self.config_backend.queries - self.config_preload_queries
+
+    def member(self, i: int) -> FakeUser:
+        return self.members[i % len(self.members)]
+
+    def close(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            main.client.loop_watchdog = None
+        self._gif_cache.cleanup()
+        self.scratch.cleanup()
+        main.client.history.store.close()
+        self._history.cleanup()
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+LINK_SAMPLES = (
+    "https://x.com/user{n}/status/{id}",
+    "look https://twitter.com/someone/status/{id}?s=20 lol",
+    "https://www.instagram.com/reel/C{id}/?igsh=abc",
+    "https://www.reddit.com/r/kpop/comments/{id}/title/ and https://x.com/a/status/{id}",
+    "https://www.tiktok.com/@user{n}/video/{id}",
+    "no links here, just chatting about tripleS #{n}",
+    "https://example.com/not/{id}/supported",
+)
+
+
+def link_message(world: World, i: int) -> "FakeMessage":
+    content = LINK_SAMPLES[i % len(LINK_SAMPLES)].format(n=i % 97, id=10**18 + i)
+    return FakeMessage(world.api, world.member(i), world.channel, content)
+
+
+async def link_flood(world: World, i: int):
+    await main.client.on_message(link_message(world, i))
+
+
+def parse_exposition(text: str) -> dict:
+    """Prometheus text format to {'name{labels}': value}."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def prepare_links(world: World):
+    world.events = world.args.events or SCENARIOS["links"].events
+    world.metrics_before = parse_exposition(registry.render())
+
+
+async def verify_links(world: World) -> dict:
+    """Scrape /metrics, /healthz and /readyz from a HealthServer after the replay.
+
+    The scraped counters and histograms must have grown by exactly what was sent, /healthz must
+    answer 200 (and 503 once the gateway has been down too long) and /readyz 503, since the
+    harness never connects to Discord.
+    """
+    cog = main.client.get_cog("Links")
+    expected = {}
+    for i in range(world.events):
+        message = link_message(world, i)
+        providers = main.client.guild_configs.get(message.guild.id).link_providers
+        for link in cog.rewriter.rewrite(message.content, providers):
+            key = f'bot_link_rewrites_total{{provider="{link.provider}"}}'
+            expected[key] = expected.get(key, 0) + 1
+    on_message = 'bot_event_seconds_count{event="on_message"}'
+    expected[on_message] = world.events
+
+    server = HealthServer(port=0, live_checks=main.health_server.live_checks,
+                          ready_checks=main.health_server.ready_checks)
+    await server.start()
+    try:
+        host, port = server._runner.addresses[0][:2]
+        statuses = {}
+        async with aiohttp.ClientSession(f"http://{host}:{port}") as session:
+            async with session.get("/metrics") as response:
+                scraped = parse_exposition(await response.text())
+            for path in ("/healthz", "/readyz"):
+                async with session.get(path) as response:
+                    statuses[path] = response.status
+            down_since, main.client.disconnected_since = main.client.disconnected_since, time.monotonic() - 3600
+            try:
+                async with session.get("/healthz") as response:
+                    statuses["/healthz down"] = response.status
+            finally:
+                main.client.disconnected_since = down_since
+    finally:
+        await server.stop()
+
+    problems = []
+    for key, count in expected.items():
+        grown = scraped.get(key, 0) - world.metrics_before.get(key, 0)
+        if grown != count:
+            problems.append(f"metrics: {key} went up by {grown:.0f}, expected {count}")
+    infinite = 'bot_event_seconds_bucket{event="on_message",le="+Inf"}'
+    if scraped.get(infinite) != scraped.get(on_message):
+        problems.append(f"metrics: {infinite} is {scraped.get(infinite)}, the count is {scraped.get(on_message)}")
+    for path, status in (("/healthz", 200), ("/readyz", 503), ("/healthz down", 503)):
+        if statuses[path] != status:
+            problems.append(f"health: {path} answered {statuses[path]}, expected {status}")
+    return {"problems": problems}
+
+
+LINK_BURST_RATE_LIMIT = (2, 2.0)  # Tighter than Discord's so the burst has to back off
+
+
+def prepare_link_burst(world: World):
+    world.channel.rate_limit = LINK_BURST_RATE_LIMIT
+    world.burst = [
+        (world.member(i), LINK_SAMPLES[i % 5].format(n=i % 13, id=10**18 + i % 70))  # 30 repeat an earlier link
+        for i in range(world.args.events or SCENARIOS["linkburst"].events)
+    ]
+
+
+async def link_burst(world: World, i: int):
+    author, content = world.burst[i % len(world.burst)]
+    await main.client.on_message(FakeMessage(world.api, author, world.channel, content))
+
+
+async def verify_link_burst(world: World) -> dict:
+    """Every distinct fixed link was posted exactly once, despite duplicates and 429s."""
+    cog = main.client.get_cog("Links")
+    expected = {
+        link.url
+        for author, content in world.burst
+        for link in cog.rewriter.rewrite(content, main.client.guild_configs.get(author.guild.id).link_providers)
+    }
+    posted = [url for _, content in world.api.sent for url in re.findall(r"\]\((https://[^)\s]+)\)", content or "")]
+    problems = []
+    missing = expected - set(posted)
+    if missing:
+        problems.append(f"linkburst: {len(missing)} fixed links were never posted")
+    if len(posted) != len(set(posted)):
+        problems.append(f"linkburst: {len(posted) - len(set(posted))} fixed links were posted twice")
+    return {
+        "link_replies": len(world.api.sent),
+        "rate_limited": world.api.rate_limited,
+        "problems": problems,
+    }
+
+
+async def np_storm(world: World, i: int):
+    author = world.member(i)
+    listeners = world.guild_listeners[author.guild.id]
+    target = listeners[i % len(listeners)] if listeners else author
+    cog = main.client.get_cog("Spotify")
+    if i % 2:
+        interaction = FakeInteraction(world.api, author, world.channel)
+        await cog.now_playing_slash.callback(cog, interaction, target)
+    else:
+        message = FakeMessage(world.api, author, world.channel, f"!np {target.mention}")
+        await cog.now_playing.callback(cog, FakeContext(message), target)
+
+
+async def verify_np(world: World) -> dict:
+    """A guild joined after startup: the members already listening must be indexed without a presence update."""
+    cog = main.client.get_cog("Spotify")
+    guild = world.guilds[0]
+    listeners = world.guild_listeners[guild.id]
+    for member in listeners:
+        main.client.listener_index.remove(guild.id, member.id)
+    main.client.profiles.cache.clear()
+    queries = world.backend.queries
+    main.client.is_ready = lambda: True
+    try:
+        await cog.on_guild_join(guild)
+    finally:
+        del main.client.is_ready
+    problems = []
+    missing = [m for m in listeners if main.client.listener_index.record(guild.id, m.id) is None]
+    if missing:
+        problems.append(f"np: {len(missing)} of {len(listeners)} listeners in a newly joined guild aren't indexed")
+    if listeners and world.backend.queries == queries:
+        problems.append("np: no Spotify profiles preloaded for a newly joined guild")
+    return {"problems": problems}
+
+
+async def listening_storm(world: World, i: int):
+    """!listening and /listening from members all over the guilds."""
+    author = world.member(i)
+    cog = main.client.get_cog("Spotify")
+    if i % 2:
+        interaction = FakeInteraction(world.api, author, world.channel)
+        await cog.listening_slash.callback(cog, interaction)
+    else:
+        message = FakeMessage(world.api, author, world.channel, "!listening")
+        await cog.listening.callback(cog, FakeContext(message))
+
+
+async def verify_listening(world: World) -> dict:
+    """Each guild's dashboard from cold caches: one batched query per 200 listeners and per 50 tracks."""
+    cog = main.client.get_cog("Spotify")
+    problems = []
+    slowest = 0.0
+    for guild in world.guilds:
+        listeners = world.guild_listeners[guild.id]
+        tracks = {member.activities[0].track_id for member in listeners}
+        main.client.profiles.cache.clear()
+        main.client.spotify.track_cache.clear()
+        queries, requests = world.backend.queries, world.spotify.requests
+        start = time.perf_counter()
+        embeds = await cog.generate_listening_embeds(guild)
+        slowest = max(slowest, time.perf_counter() - start)
+
+        expected_queries = -(-len(listeners) // PRELOAD_CHUNK_SIZE)
+        expected_requests = -(-len(tracks) // TRACKS_BATCH_SIZE)
+        if world.backend.queries - queries != expected_queries:
+            problems.append(f"listening: {world.backend.queries - queries} profile queries for {len(listeners)} "
+                            f"listeners in {guild.name}, expected {expected_queries}")
+        if world.spotify.requests - requests != expected_requests:
+            problems.append(f"listening: {world.spotify.requests - requests} Spotify requests for {len(tracks)} "
+                            f"tracks in {guild.name}, expected {expected_requests}")
+        if listeners and (not embeds or not embeds[0].footer.text.startswith(f"{len(listeners)} listening")):
+            problems.append(f"listening: {guild.name} dashboard doesn't count its {len(listeners)} listeners")
+    return {"listening_cold_ms": slowest * 1000, "problems": problems}
+
+
+LIVE_CHANNELS = 25
+LIVE_TRACK_CHANGE_AT = 60  # Fake-clock seconds into verify_live when a third of the listeners skip a song
+LIVE_FAILED_LOOKUPS = 5  # Of those new songs, how many fail their first artist lookup
+LIVE_EXPIRED_TOKENS = 5  # Embeds whose every edit fails with a 401 from that point on
+
+
+def prepare_live(world: World):
+    world.channels = [FakeChannel(world.api, 10**17 + 1000 + c) for c in range(LIVE_CHANNELS)]
+
+
+async def live_np(world: World, i: int):
+    """np_storm with every !np and /np asking for a live embed, spread over several channels."""
+    author = world.member(i)
+    listeners = world.guild_listeners[author.guild.id]
+    target = listeners[i % len(listeners)] if listeners else author
+    channel = world.channels[i % len(world.channels)]
+    cog = main.client.get_cog("Spotify")
+    if i % 2:
+        interaction = FakeInteraction(world.api, author, channel)
+        await cog.now_playing_slash.callback(cog, interaction, target, live=True)
+    else:
+        message = FakeMessage(world.api, author, channel, f"!np {target.mention} live")
+        await cog.now_playing.callback(cog, FakeContext(message), target, "live")
+
+
+async def verify_live(world: World) -> dict:
+    """Run the embeds `live_np` registered to expiry on the fake clock and check what the scheduler
+    sent through the fake REST layer: rate limits held, skipped songs showed up with their own artist
+    even when the first lookup failed, embeds whose token expired were given up on, nothing left live.
+    """
+    scheduler = main.client.live_embeds
+    cog = main.client.get_cog("Spotify")
+    lives = list(scheduler._live.values())
+    if not lives:
+        return {"problems": ["live: no live embeds were registered"]}
+
+    current = [live for live in lives if not live.final]  # The rest were replaced by a newer /np
+    skipped = {}  # member id -> title of the song they skipped to
+    world.api.edits.clear()
+    switched_at = None  # Set when the songs change
+    steps = int((scheduler.lifetime + scheduler.interval) / scheduler.tick_interval) + len(lives) // scheduler.edits_per_tick + 60
+    for step in range(steps):
+        if step == LIVE_TRACK_CHANGE_AT:
+            switched_at = world.clock()
+            for n, live in enumerate(current[::3]):
+                member = live.data.member
+                if member.id not in skipped:
+                    track_id = f"track{world.args.tracks + n}"
+                    if n < LIVE_FAILED_LOOKUPS:
+                        world.spotify.fail_once.add(track_id)
+                    member.activities = (fake_spotify(track_id),)
+                    skipped[member.id] = member.activities[0].title, fake_track(track_id)["artists"][0]["name"]
+                    await cog.on_presence_update(member, member)
+            unchanged = [live.message.id for live in current if live.member_id not in skipped]
+            world.api.expired.update(unchanged[:LIVE_EXPIRED_TOKENS])
+        await scheduler.tick()
+        if not len(scheduler):
+            break
+        world.clock.advance(scheduler.tick_interval)
+
+    problems = []
+    if len(scheduler):
+        problems.append(f"live: {len(scheduler)} embeds still live after their lifetime")
+
+    expected = {live.message.id: skipped[live.member_id][0] for live in current if live.member_id in skipped}
+    artists = {live.message.id: skipped[live.member_id][1] for live in current if live.member_id in skipped}
+    per_tick, per_channel, last_embed, switch_latency = {}, {}, {}, {}
+    for at, channel_id, message_id, embed in world.api.edits:
+        per_tick[at] = per_tick.get(at, 0) + 1
+        previous = per_channel.get(channel_id)
+        if previous is not None and at - previous < scheduler.channel_interval:
+            problems.append(f"live: two edits {at - previous:.1f}s apart in channel {channel_id}")
+        per_channel[channel_id] = at
+        last_embed[message_id] = embed
+        title = expected.get(message_id)
+        if title and message_id not in switch_latency and f"**{title}**" in (embed.description or ""):
+            switch_latency[message_id] = at - switched_at
+    if per_tick and max(per_tick.values()) > scheduler.edits_per_tick:
+        problems.append(f"live: {max(per_tick.values())} edits in one tick (budget {scheduler.edits_per_tick})")
+
+    missed = [message_id for message_id in expected if message_id not in switch_latency]
+    if missed:
+        problems.append(f"live: {len(missed)} of {len(expected)} embeds never showed the new song")
+    wrong_artist = [m for m in artists if m in last_embed and f"**{artists[m]}**" not in (last_embed[m].description or "")]
+    if wrong_artist:
+        problems.append(f"live: {len(wrong_artist)} embeds showed the new song with another artist")
+    retried = [n for n in world.api.refused_edits.values() if n > scheduler.max_failures]
+    if retried:
+        problems.append(f"live: {len(retried)} embeds with an expired token were retried up to {max(retried)} times")
+    # An embed that can no longer be edited keeps whatever it last showed
+    still_live = [m for m, embed in last_embed.items() if embed is not None and "🔴 Live" in (embed.footer.text or "")
+                  and m not in world.api.expired]
+    if still_live:
+        problems.append(f"live: {len(still_live)} embeds were left saying they're live")
+    return {
+        "live_edits": len(world.api.edits),
+        "live_switch_max_s": max(switch_latency.values(), default=0.0),
+        "problems": problems,
+    }
+
+
+async def member_joins(world: World, i: int):
+    await main.client.on_member_join(world.member(i))
+
+
+HISTORY_QUERY_EVERY = 10
+
+
+def prepare_history(world: World):
+    world.expected_plays = 0
+    world.last_track = {}  # member id -> track of their last update
+
+
+async def history_plays(world: World, i: int):
+    """A member moves on to another track; the presence arrives twice, like a seek or a second shared guild."""
+    cog = main.client.get_cog("History")
+    member = world.member(i)
+    track = f"track{i % world.args.tracks}"
+    if world.last_track.get(member.id) != track:
+        world.expected_plays += 1
+    world.last_track[member.id] = track
+    member.activities = (fake_spotify(track),)
+    await cog.on_presence_update(member, member)
+    await cog.on_presence_update(member, member)
+    if i % HISTORY_QUERY_EVERY == 0:
+        interaction = FakeInteraction(world.api, member, world.channel)
+        command = cog.top_tracks_slash if i % (2 * HISTORY_QUERY_EVERY) else cog.top_artists_slash
+        await command.callback(cog, interaction, None, server=bool(i % 3))
+
+
+async def verify_history(world: World) -> dict:
+    history = main.client.history
+    await history.flush()
+    store = history.store
+    recorded = store.conn.execute("SELECT COALESCE(SUM(plays), 0) FROM user_tracks").fetchone()[0]
+    logged = store.conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+    problems = []
+    if recorded != world.expected_plays:
+        problems.append(f"history: {recorded} plays counted, expected {world.expected_plays}")
+    if logged != world.expected_plays:
+        problems.append(f"history: {logged} plays logged, expected {world.expected_plays}")
+    if not history.duplicates:
+        problems.append("history: repeated presence updates were never recognised as the same play")
+    return {"history_plays": recorded, "history_duplicates": history.duplicates, "problems": problems}
+
+
+PROFILE_LINK = "https://open.spotify.com/user/{name}?v={n}"
+
+
+def prepare_profiles(world: World):
+    world.profile_users = set()
+
+
+async def profile_commands(world: World, i: int):
+    """/myspotify, /setspotify and /removespotify for the same member at once, so reads race writes."""
+    cog = main.client.get_cog("Spotify")
+    member = world.member(i // 4)
+    world.profile_users.add(member)
+    interaction = FakeInteraction(world.api, member, world.channel)
+    step = i % 4
+    if step == 1:
+        await cog.setspotify_slash.callback(cog, interaction, PROFILE_LINK.format(name=member.name, n=i))
+    elif step == 3 and i // 4 % 2:
+        await cog.removespotify_slash.callback(cog, interaction)
+    else:
+        await cog.myspotify_slash.callback(cog, interaction)
+
+
+async def verify_profiles(world: World) -> dict:
+    """Cached links match the stored rows, after single reads and after a bulk read, both racing writes."""
+    profiles, rows = main.client.profiles, world.backend.rows
+    stale = [m for m in world.profile_users if await profiles.get(m.id) != rows.get(m.id)]
+
+    # get_many over cold ids while their owners save new links
+    profiles.cache.clear()
+    members = sorted(world.profile_users, key=lambda m: m.id)
+    await asyncio.gather(
+        profiles.get_many(m.id for m in members),
+        *(profiles.set(m.id, PROFILE_LINK.format(name=m.name, n="bulk")) for m in members[::2]),
+    )
+    stale_bulk = [m for m in members if profiles.cache.get(m.id, count=False) != rows.get(m.id)]
+
+    problems = []
+    if stale:
+        problems.append(f"profiles: {len(stale)} cached links were older than the stored ones")
+    if stale_bulk:
+        problems.append(f"profiles: {len(stale_bulk)} links cached by a bulk read were older than the stored ones")
+    return {"problems": problems}
+
+
+STALL_EVERY = 500  # One event in this many blocks the loop
+STALL_SECONDS = 0.3
+STALL_THRESHOLD = 0.1
+
+
+def prepare_stall(world: World):
+    world.watchdog = main.client.loop_watchdog = LoopWatchdog(threshold=STALL_THRESHOLD, interval=0.02)
+    world.watchdog.start()
+
+
+async def blocking_handler():
+    """Stands in for a handler that does sync work (a Pillow call, a sync client) on the loop."""
+    time.sleep(STALL_SECONDS)
+
+
+async def stalled_traffic(world: World, i: int):
+    """link_flood with the loop watchdog running, and every STALL_EVERY-th event blocking the loop."""
+    if i % STALL_EVERY == 0:
+        # In a task of its own, as discord.py dispatches events, so it's the outermost frame on the stack
+        await asyncio.create_task(blocking_handler())
+        return
+    await link_flood(world, i)
+
+
+async def verify_stall(world: World) -> dict:
+    """The watchdog caught the blocking handler by name, for its whole length, and !perf shows it."""
+    watchdog = world.watchdog
+    await asyncio.sleep(watchdog.interval * 5)  # Let the watchdog thread see the heartbeat resume
+    stalls = [stall for stall in watchdog.stalls if stall.handler == "blocking_handler"]
+
+    cog = main.client.get_cog("Help")
+    ctx = FakeContext(FakeMessage(world.api, world.member(0), world.channel, "!perf"))
+    embeds = []
+
+    async def send(content=None, **kwargs):
+        embeds.append(kwargs.get("embed"))
+    ctx.send = send
+    await cog.perf.callback(cog, ctx)
+
+    problems = []
+    if not stalls:
+        problems.append(f"stall: no stall attributed to blocking_handler "
+                        f"(recorded: {sorted(set(stall.handler for stall in watchdog.stalls)) or 'none'})")
+    elif max(stall.duration for stall in stalls) < STALL_SECONDS - STALL_THRESHOLD:
+        problems.append(f"stall: longest blocking_handler stall recorded as {max(s.duration for s in stalls) * 1000:.0f}ms, "
+                        f"it blocked for {STALL_SECONDS * 1000:.0f}ms")
+    if not embeds or embeds[0] is None or "blocking_handler" not in embeds[0].fields[0].value:
+        problems.append("stall: !perf doesn't list blocking_handler")
+    return {"stalls": len(watchdog.stalls), "problems": problems}
+
+
+def synthetic_png(size=(640, 480)) -> bytes:
+    from PIL import Image
+    image = Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 100).convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def prepare_gif(world: World):
+    disk, seconds = MEDIA_DISK_BYTES.labels(), MEDIA_JOB_SECONDS.labels()
+    world.media_before = (disk.count, disk.sum, seconds.sum)
+    if world.args.gif_source:
+        with open(world.args.gif_source, "rb") as f:
+            world.gif_attachment = world.cdn.attachment(f.read(), os.path.basename(world.args.gif_source))
+        return
+    world.gif_attachment = world.cdn.attachment(synthetic_png(), "loadtest.png")
+
+
+async def gif_jobs(world: World, i: int):
+    cog = main.client.get_cog("Media")
+    output = "gif" if i % 4 == 3 else "auto"  # Some people insist on a real GIF
+    if i % 2:
+        interaction = FakeInteraction(world.api, world.member(i), world.channel)
+        await cog.gif_slash.callback(cog, interaction, world.gif_attachment, output)
+    else:
+        message = FakeMessage(world.api, world.member(i), world.channel, "!gif", [world.gif_attachment])
+        await cog.gif_prefix.callback(cog, FakeContext(message), output)
+
+
+async def verify_gif(world: World) -> dict:
+    """Per-job disk bytes and latency of the timed pass, then two same-user jobs spooled side by side."""
+    from PIL import Image
+
+    disk, seconds = MEDIA_DISK_BYTES.labels(), MEDIA_JOB_SECONDS.labels()
+    count, disk_sum, seconds_sum = world.media_before
+    jobs = disk.count - count
+    result = {
+        "media_jobs": jobs,
+        "disk_kib_per_job": (disk.sum - disk_sum) / 1024 / jobs if jobs else 0.0,
+        "job_ms": (seconds.sum - seconds_sum) * 1000 / jobs if jobs else 0.0,
+    }
+
+    # Same user, same filename, different pictures, both over the spool threshold, at the same time
+    cog = main.client.get_cog("Media")
+    threshold, cog.spool_threshold = cog.spool_threshold, 1024
+    user = world.member(0)
+    sizes = ((320, 240), (200, 300))
+    interactions = [FakeInteraction(world.api, user, world.channel) for _ in sizes]
+    spooled_before = disk.sum
+    try:
+        await asyncio.gather(*(
+            cog.gif_slash.callback(cog, interaction, world.cdn.attachment(synthetic_png(size), "upload.png"))
+            for interaction, size in zip(interactions, sizes)
+        ))
+    finally:
+        cog.spool_threshold = threshold
+
+    problems = []
+    for interaction, size in zip(interactions, sizes):
+        if not interaction.files:
+            problems.append(f"gif: same-user job for a {size[0]}x{size[1]} upload returned no file")
+            continue
+        with Image.open(interaction.files[0].fp) as gif:
+            if gif.size != size:
+                problems.append(f"gif: {size[0]}x{size[1]} upload came back as {gif.size[0]}x{gif.size[1]}")
+    if disk.sum == spooled_before:
+        problems.append("gif: uploads over the spool threshold were never written to disk")
+    leftovers = os.listdir(world.scratch.name)
+    if leftovers:
+        problems.append(f"gif: {len(leftovers)} job directories left behind")
+    result["problems"] = problems
+    return result
+
+
+def media_outputs() -> float:
+    return sum(value for _, _, value in MEDIA_OUTPUTS.samples())
+
+
+def prepare_gif_cache(world: World):
+    prepare_gif(world)
+    # The real cache this time, in the world's scratch cache directory
+    world.gif_cache = MediaResultCache(directory=world._gif_cache.name)
+    main.client.gif_cache = main.client.get_cog("Media").gif_cache = world.gif_cache
+    world.gif_lock = asyncio.Lock()
+    world.outputs_before = media_outputs()
+    world.gif_replies = []
+
+
+async def repeated_gif(world: World, i: int):
+    """/gif on the same upload in one guild, one job after another, like people re-posting a popular clip."""
+    cog = main.client.get_cog("Media")
+    members = world.guilds[0].members
+    async with world.gif_lock:
+        interaction = FakeInteraction(world.api, members[i % len(members)], world.channel)
+        await cog.gif_slash.callback(cog, interaction, world.gif_attachment)
+        world.gif_replies.append(interaction.files)
+
+
+async def verify_gif_cache(world: World) -> dict:
+    """Every job after the first must be a cache hit, stored under its output's format."""
+    jobs = len(world.gif_replies)
+    encodes = media_outputs() - world.outputs_before
+    cache = world.gif_cache
+    problems = []
+    if encodes != 1:
+        problems.append(f"gifcache: {encodes:.0f} conversions for {jobs} jobs on the same upload, expected 1")
+    if cache.hits != jobs - 1:
+        problems.append(f"gifcache: {cache.hits} cache hits for {jobs} jobs on the same upload, expected {jobs - 1}")
+    stored = [name for _, _, names in os.walk(cache.directory) for name in names]
+    sent = {files[0].filename.rpartition(".")[2] for files in world.gif_replies if files}
+    if len(stored) != 1 or {name.rpartition(".")[2] for name in stored} != sent:
+        problems.append(f"gifcache: stored {stored} for jobs that sent {sorted(sent)}")
+    return {"cache_hits": cache.hits, "problems": problems}
+
+
+class Scenario(NamedTuple):
+    name: str
+    description: str
+    events: int                       # Default event count
+    run: Callable                     # async (world, i) -> None, one handler invocation
+    prepare: Callable | None = None   # (world) -> None, untimed setup
+    verify: Callable | None = None    # async (world) -> dict of extra results, untimed, after the timed pass
+
+
+SCENARIOS = {
+    s.name: s for s in (
+        Scenario("links", "on_message with a mix of fixable links and chatter, then a /metrics scrape", 5000,
+                 link_flood, prepare_links, verify_links),
+        Scenario("linkburst", "100 link messages at once into one rate-limited channel", 100, link_burst,
+                 prepare_link_burst, verify_link_burst),
+        Scenario("np", "!np and /np for members who are listening, then a guild joined after startup", 2000,
+                 np_storm, verify=verify_np),
+        Scenario("listening", "!listening and /listening, then each guild's dashboard from cold caches", 200,
+                 listening_storm, verify=verify_listening),
+        Scenario("live", "!np live and /np live, then the live embed scheduler on a fake clock", 400, live_np,
+                 prepare_live, verify_live),
+        Scenario("join", "on_member_join welcome embeds", 1000, member_joins),
+        Scenario("stall", "link traffic with the loop watchdog on and a handler that blocks the loop", 2000,
+                 stalled_traffic, prepare_stall, verify_stall),
+        Scenario("profiles", "/myspotify racing /setspotify and /removespotify for the same members", 1000,
+                 profile_commands, prepare_profiles, verify_profiles),
+        Scenario("history", "presence updates recorded as plays, with /toptracks and /topartists", 3000,
+                 history_plays, prepare_history, verify_history),
+        Scenario("gif", "concurrent !gif and /gif jobs through the media scheduler", 12, gif_jobs, prepare_gif,
+                 verify_gif),
+        Scenario("gifcache", "/gif on the same upload twice, through the real result cache", 2, repeated_gif,
+                 prepare_gif_cache, verify_gif_cache),
+    )
+}
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+async def drive(scenario: Scenario, world: World, events: int, rate: float) -> tuple:
+    """Fire `events` handler calls as tasks, paced open-loop at `rate`/s (0 = all at once)."""
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            await scenario.run(world, i)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(events):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+async def run_scenario(scenario: Scenario, args) -> dict:
+    events = args.events or scenario.events
+
+    world = World(args)
+    try:
+        await world.install()
+        if scenario.prepare:
+            scenario.prepare(world)
+        wall, latencies, errors = await drive(scenario, world, events, args.rate)
+        # Link fixer replies go out after the handler returns; count them with the rest of the calls
+        await main.client.get_cog("Links").replies.drain()
+        result = {
+            "scenario": scenario.name,
+            "events": events,
+            "throughput": events / wall if wall else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            "errors": errors,
+            "failed_replies": world.api.failures,
+            "discord_calls": world.api.calls,
+            "spotify_requests": world.spotify.requests,
+            "supabase_queries": world.backend.queries,
+            "config_queries": world.config_queries,
+        }
+        if scenario.verify:
+            result.update(await scenario.verify(world))
+    finally:
+        world.close()
+
+    if not args.no_alloc:
+        alloc_events = min(events, ALLOC_EVENTS)
+        world = World(args)
+        try:
+            await world.install()
+            if scenario.prepare:
+                scenario.prepare(world)
+            tracemalloc.start()
+            baseline, _ = tracemalloc.get_traced_memory()
+            await drive(scenario, world, alloc_events, args.rate)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            world.close()
+        result["alloc_peak_kib"] = (peak - baseline) / 1024
+        result["alloc_retained_kib_per_event"] = (current - baseline) / 1024 / alloc_events
+    return result
+
+
+REPORT_COLUMNS = (
+    # (result key, header, width, format)
+    ("scenario", "scenario", 8, "{}"),
+    ("events", "events", 7, "{}"),
+    ("throughput", "events/s", 9, "{:.1f}"),
+    ("p50_ms", "p50 ms", 8, "{:.2f}"),
+    ("p95_ms", "p95 ms", 8, "{:.2f}"),
+    ("p99_ms", "p99 ms", 8, "{:.2f}"),
+    ("max_ms", "max ms", 9, "{:.2f}"),
+    ("errors", "errors", 6, "{}"),
+    ("failed_replies", "❌ sent", 7, "{}"),
+    ("discord_calls", "REST", 6, "{}"),
+    ("config_queries", "cfg q", 5, "{}"),
+    ("disk_kib_per_job", "disk KiB/job", 12, "{:.0f}"),
+    ("alloc_peak_kib", "peak KiB", 9, "{:.0f}"),
+    ("alloc_retained_kib_per_event", "KiB/event", 9, "{:.2f}"),
+)
+
+
+def print_results(results: list):
+    print("  ".join(f"{header:>{width}}" for _, header, width, _ in REPORT_COLUMNS))
+    for result in results:
+        print("  ".join(
+            f"{fmt.format(result[key]) if key in result else '-':>{width}}" for key, _, width, fmt in REPORT_COLUMNS
+        ))
+
+
+def check_baseline(results: list, path: str, tolerance: float) -> list:
+    """Compare against a previous --json run; returns human-readable regressions."""
+    with open(path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{result['scenario']}: throughput {before['throughput']:.1f}/s -> {result['throughput']:.1f}/s"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the bot's event and command handlers.")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"Scenarios to run ({', '.join(SCENARIOS)}); default all")
+    parser.add_argument("--events", type=int, default=0, help="Events per scenario (default: per scenario)")
+    parser.add_argument("--rate", type=float, default=0, help="Arrival rate in events/s; 0 fires all at once")
+    parser.add_argument("--members", type=int, default=2000, help="Members, spread round-robin over the guilds")
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--tracks", type=int, default=150, help="Distinct tracks members are playing")
+    parser.add_argument("--listening", type=float, default=0.3, help="Fraction of members on Spotify")
+    parser.add_argument("--profiles", type=float, default=0.4, help="Fraction of members with a saved profile")
+    parser.add_argument("--spotify-latency", type=float, default=80, help="ms per Spotify API call")
+    parser.add_argument("--supabase-latency", type=float, default=40, help="ms per Supabase query")
+    parser.add_argument("--discord-latency", type=float, default=60, help="ms per Discord API call")
+    parser.add_argument("--gif-source", help="Image or video to convert in the gif scenario (default: synthetic PNG)")
+    parser.add_argument("--spool-threshold", type=int,
+                        help="Bytes above which gif uploads are spooled to disk (default: MEDIA_SPOOL_THRESHOLD)")
+    parser.add_argument("--log-level", default="WARNING",
+                        help="LOG_LEVEL for the run, e.g. DEBUG or INFO,links=DEBUG; logs go to stderr")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-alloc", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Previous --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs --baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    return args
+
+
+async def run(args) -> list:
+    results = []
+    setup_logging(args.log_level)
+    try:
+        for name in args.scenarios or SCENARIOS:
+            results.append(await run_scenario(SCENARIOS[name], args))
+    finally:
+        main.client.media_jobs.shutdown()
+        await main.client.spotify.close()
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    results = asyncio.run(run(args))
+    problems = [
+        f"{result['scenario']}: {result['config_queries']} guild config queries on the hot path"
+        for result in results if result["config_queries"]
+    ]
+    problems += [problem for result in results for problem in result.get("problems", ())]
+    if args.baseline:
+        problems += [f"REGRESSION {regression}" for regression in check_baseline(results, args.baseline, args.tolerance)]
+    runner.finish(args, results, print_results, problems)
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+
+# -----------------------------
+# Logging overhead benchmark
+# -----------------------------
+# Runs loadtest's `links` traffic (link messages and chatter) through on_message once per logging
+# mode, and reports handler throughput and latency. It also reports how much each mode wrote and
+# how long the log thread took to catch up afterwards. "print" restores the print() calls that
+# on_message, the link fixer and the reply queue used to make, writing to stdout. The other modes
+# go through logs.py at that level. Everything is written to the same sink, a temporary file unless
+# --sink is given. Run from the repo root:
+#
+#   python -m bench.logbench
+#   python -m bench.logbench --events 50000 --repeat 5
+#   python -m bench.logbench --sink /dev/tty       # as if stdout/stderr were a terminal
+#
+from bench import loadtest, runner
+import main
+from logs import setup_logging, stop_logging
+from metrics import LOG_RECORDS_DROPPED
+
+UNSAMPLED = "message=1,links.found=1,links.suppress=1"
+MODES = {
+    # name: (LOG_LEVEL, LOG_SAMPLE); None for the print() baseline
+    "print": None,
+    "info": ("INFO", ""),
+    "debug": ("DEBUG", ""),
+    "debug-unsampled": ("DEBUG", UNSAMPLED),
+}
+
+
+def prepare_print(world):
+    """Put the removed print() calls back, around the same code they used to sit in."""
+    links = main.client.get_cog("Links")
+    rewrite = links.rewriter.rewrite
+    suppress = links.replies._suppress
+
+    def printing_rewrite(content, providers=None):
+        fixed_links = rewrite(content, providers)
+        if fixed_links:
+            print(f"DEBUG: Found {len(fixed_links)} link(s). Queueing fix and reply.")
+        return fixed_links
+
+    async def printing_suppress(queue, message):
+        await suppress(queue, message)
+        print(f"DEBUG: Successfully suppressed embed for message {message.id}")
+
+    links.rewriter.rewrite = printing_rewrite
+    links.replies._suppress = printing_suppress
+
+
+async def print_flood(world, i: int):
+    message = loadtest.link_message(world, i)
+    if not message.author.bot and message.content:
+        print(f"DEBUG: Reading message from {message.author}: '{message.content}'")
+    await main.client.on_message(message)
+
+
+def dropped() -> float:
+    return sum(value for _, _, value in LOG_RECORDS_DROPPED.samples())
+
+
+async def run_mode(mode: str, sink_path: str, args) -> dict:
+    load_args = loadtest.parse_args(["links", "--no-alloc", "--events", str(args.events),
+                                     "--members", str(args.members), "--discord-latency", str(args.discord_latency)])
+    # Only the replay is timed; the /metrics and health checks after it are the load test's job
+    links = loadtest.SCENARIOS["links"]._replace(verify=None)
+    dropped_before = dropped()
+    # Line buffered, like a terminal or a container's stdout with PYTHONUNBUFFERED
+    with open(sink_path, "w", buffering=1) as sink:
+        if MODES[mode] is None:
+            setup_logging("WARNING", stream=sink)
+            scenario = links._replace(run=print_flood, prepare=prepare_print)
+            with contextlib.redirect_stdout(sink):
+                result = await loadtest.run_scenario(scenario, load_args)
+        else:
+            level, sample = MODES[mode]
+            setup_logging(level, stream=sink, sample=sample)
+            result = await loadtest.run_scenario(links, load_args)
+        start = time.perf_counter()
+        stop_logging()  # Returns once the log thread has written everything queued
+        drain = time.perf_counter() - start
+    with open(sink_path, "rb") as f:
+        lines = sum(1 for _ in f)
+    return {
+        "mode": mode,
+        "throughput": result["throughput"],
+        "p50_us": result["p50_ms"] * 1000,
+        "p99_us": result["p99_ms"] * 1000,
+        "lines": lines,
+        "kib": os.path.getsize(sink_path) / 1024,
+        "drain_ms": drain * 1000,
+        "dropped": dropped() - dropped_before,
+    }
+
+
+async def run(args) -> list:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="logbench-") as directory:
+        sink_path = args.sink or os.path.join(directory, "bot.log")
+        for mode in args.modes:
+            # Best of --repeat, so a noisy neighbour doesn't decide the comparison
+            runs = [await run_mode(mode, sink_path, args) for _ in range(args.repeat)]
+            results.append(max(runs, key=lambda r: r["throughput"]))
+    main.client.media_jobs.shutdown()
+    await main.client.spotify.close()
+    return results
+
+
+def print_results(results: list):
+    print(f"{'mode':>16} {'events/s':>10} {'p50 µs':>8} {'p99 µs':>8} {'lines':>7} {'KiB':>7} {'drain ms':>9} {'dropped':>8}")
+    for r in results:
+        print(f"{r['mode']:>16} {r['throughput']:>10.0f} {r['p50_us']:>8.1f} {r['p99_us']:>8.1f} {r['lines']:>7} "
+              f"{r['kib']:>7.0f} {r['drain_ms']:>9.1f} {r['dropped']:>8.0f}")
+    baseline = next((r for r in results if r["mode"] == "print"), None)
+    if baseline:
+        for r in results:
+            if r is not baseline:
+                print(f"{r['mode']}: {r['throughput'] / baseline['throughput']:.2f}x the print() throughput")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="on_message throughput under each logging mode.")
+    parser.add_argument("modes", nargs="*", metavar="mode", help=f"Modes to run ({', '.join(MODES)}); default all")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--discord-latency", type=float, default=60, help="ms per Discord API call")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the fastest is reported")
+    parser.add_argument("--sink", help="File every mode writes to (default: a temporary file)")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+    unknown = [mode for mode in args.modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)}")
+    args.modes = args.modes or list(MODES)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(run(args))
+    runner.finish(args, results, print_results)
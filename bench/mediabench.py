@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# -----------------------------
+# Output format benchmark
+# -----------------------------
+# Converts sample clips to every output format the gif commands can send. For each one it reports
+# the size and time of the first encode, then of the result shrunk under the target size, and which
+# format "auto" would upload. Without arguments it uses synthetic samples: an animated GIF and a
+# still PNG from Pillow, plus an ffmpeg test pattern clip when ffmpeg is installed. Run from the
+# repo root:
+#
+#   python -m bench.mediabench                     # synthetic samples
+#   python -m bench.mediabench clip.mp4 meme.gif --target 8
+#   python -m bench.mediabench --json mediabench.json
+#
+from bench import runner
+from media import (FFMPEG, VideoSource, convert_video, encode_video, fit_animation_sync,
+                   image_to_animation_sync, plan_encode, BYTES_PER_PIXEL)
+from media_io import AUTOPLAY_FORMATS, OUTPUT_FORMATS, JobFiles, MediaInput
+
+
+# -----------------------------
+# Synthetic samples
+# -----------------------------
+def zoom_gif(frames: int = 24, size=(480, 360)) -> bytes:
+    from PIL import Image
+    images = []
+    for n in range(frames):
+        zoom = 0.93 ** n
+        box = (-0.75 - 1.25 * zoom, -0.9 * zoom, -0.75 + 1.25 * zoom, 0.9 * zoom)
+        images.append(Image.effect_mandelbrot(size, box, 60 + 4 * n).convert("RGB"))
+    buf = io.BytesIO()
+    images[0].save(buf, "GIF", save_all=True, append_images=images[1:], duration=80, loop=0)
+    return buf.getvalue()
+
+
+def still_png(size=(640, 480)) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 100).convert("RGB").save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_pattern_mp4(directory: str, seconds: int = 6) -> str | None:
+    if shutil.which(FFMPEG) is None:
+        return None
+    path = os.path.join(directory, "testsrc.mp4")
+    subprocess.run([FFMPEG, "-v", "error", "-f", "lavfi", "-i", f"testsrc2=duration={seconds}:size=1280x720:rate=30",
+                    "-pix_fmt", "yuv420p", "-y", path], check=True)
+    return path
+
+
+def synthetic_samples(directory: str) -> list:
+    samples = [("zoom.gif", zoom_gif(), False), ("still.png", still_png(), False)]
+    path = test_pattern_mp4(directory)
+    if path is None:
+        print("ffmpeg not found; skipping the video sample", file=sys.stderr)
+    else:
+        with open(path, "rb") as f:
+            samples.append(("testsrc.mp4", f.read(), True))
+    return samples
+
+
+def file_samples(paths) -> list:
+    samples = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        is_video = os.path.splitext(path)[1].lower() in (".mp4", ".mov", ".webm", ".mkv", ".avi")
+        samples.append((os.path.basename(path), data, is_video))
+    return samples
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+async def measure_video(name: str, data: bytes, fmt: str, target_size: int) -> dict:
+    with JobFiles() as files:
+        source = await VideoSource(MediaInput(files, name, data)).probe()
+        width, fps = plan_encode(source.width, source.height, source.duration, source.fps,
+                                 target_size, BYTES_PER_PIXEL[fmt])
+        start = time.perf_counter()
+        first = await encode_video(source, fmt, width, fps, target_size)
+        first_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        final = await convert_video(source, fmt, target_size)
+        final_seconds = time.perf_counter() - start
+    return {
+        "first_kib": len(first) / 1024, "first_ms": first_seconds * 1000,
+        "final_kib": len(final) / 1024 if len(final) <= target_size else None, "final_ms": final_seconds * 1000,
+    }
+
+
+def measure_image(data: bytes, fmt: str, target_size: int) -> dict:
+    start = time.perf_counter()
+    first = image_to_animation_sync(data, fmt)
+    first_seconds = time.perf_counter() - start
+    final = fit_animation_sync(first, fmt, target_size)
+    final_seconds = time.perf_counter() - start
+    return {
+        "first_kib": len(first) / 1024, "first_ms": first_seconds * 1000,
+        "final_kib": len(final) / 1024 if final is not None else None, "final_ms": final_seconds * 1000,
+    }
+
+
+async def run(args) -> list:
+    target_size = int(args.target * 1024 * 1024)
+    with tempfile.TemporaryDirectory(prefix="mediabench-") as directory:
+        samples = file_samples(args.samples) if args.samples else synthetic_samples(directory)
+        results = []
+        for name, data, is_video in samples:
+            for fmt in args.formats:
+                if fmt == "mp4" and not is_video:
+                    continue
+                try:
+                    if is_video:
+                        result = await measure_video(name, data, fmt, target_size)
+                    else:
+                        result = measure_image(data, fmt, target_size)
+                except Exception as e:
+                    print(f"{name} as {fmt} failed: {e}", file=sys.stderr)
+                    continue
+                results.append({"sample": name, "input_kib": len(data) / 1024, "format": fmt, **result})
+    return results
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+REPORT_COLUMNS = (
+    ("sample", "sample", 14, "{}"),
+    ("format", "format", 6, "{}"),
+    ("input_kib", "input KiB", 10, "{:.0f}"),
+    ("first_kib", "1st KiB", 9, "{:.0f}"),
+    ("first_ms", "1st ms", 9, "{:.0f}"),
+    ("final_kib", "fit KiB", 9, "{:.0f}"),
+    ("final_ms", "fit ms", 9, "{:.0f}"),
+)
+
+
+def print_results(results: list):
+    print(" ".join(f"{title:>{width}}" for _, title, width, _ in REPORT_COLUMNS))
+    for result in results:
+        print(" ".join(
+            f"{fmt.format(result[key]) if result[key] is not None else '-':>{width}}"
+            for key, _, width, fmt in REPORT_COLUMNS
+        ))
+    by_sample = {}
+    for result in results:
+        by_sample.setdefault(result["sample"], {})[result["format"]] = result
+    for sample, formats in by_sample.items():
+        # What "auto" uploads: the smallest first encode among the autoplaying formats that could be made to fit
+        fitting = sorted((r["first_kib"], fmt) for fmt, r in formats.items()
+                         if fmt in AUTOPLAY_FORMATS and r["final_kib"] is not None)
+        if not fitting:
+            print(f"{sample}: nothing fit")
+            continue
+        fmt = fitting[0][1]
+        size = formats[fmt]["final_kib"]
+        gif = formats.get("gif", {}).get("first_kib")
+        first = formats[fmt]["first_kib"]
+        versus = f", encodes {gif / first:.1f}x smaller than GIF" if gif and fmt != "gif" else ""
+        print(f"{sample}: auto sends {fmt} ({size:.0f} KiB{versus})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bytes and encode time per output format for the gif commands.")
+    parser.add_argument("samples", nargs="*", help="Images or videos to convert (default: synthetic samples)")
+    parser.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS, default=list(OUTPUT_FORMATS))
+    parser.add_argument("--target", type=float, default=8, help="Size limit in MiB")
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(run(args))
+    runner.finish(args, results, print_results)
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+from bench import runner
+
+# -----------------------------
+# Member cache memory benchmark
+# -----------------------------
+# Feeds a synthetic guild (member chunks plus a round of presence updates) through discord.py's
+# real gateway parsers and the Spotify cog's listeners, then reports the process RSS in default
+# and lean member cache mode (LEAN_MEMBER_CACHE). Each run is a fresh subprocess so the numbers
+# don't share an allocator. Nothing here connects to anything. Run from the repo root:
+#
+#   python -m bench.membench                     # 10k, 50k and 100k members in both modes
+#   python -m bench.membench --members 20000 --online 0.6
+#   python -m bench.membench --json membench.json
+#
+# Placeholders win over .env so importing main can never reach the real services
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "membench.membench.membench")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "membench")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "membench")
+
+MODES = ("default", "lean")
+GUILD_ID = 10**17
+BOT_ID = 10**17 + 2
+CHUNK_SIZE = 1000  # Members per GUILD_MEMBERS_CHUNK, as Discord sends them
+
+
+# -----------------------------
+# Synthetic gateway payloads
+# -----------------------------
+def member_payload(n: int, rng: random.Random) -> dict:
+    return {
+        "user": {
+            "id": str(10**18 + n),
+            "username": f"member{n}",
+            "global_name": f"Member {n}" if rng.random() < 0.7 else None,
+            "discriminator": "0",
+            "avatar": f"{rng.getrandbits(128):032x}" if rng.random() < 0.8 else None,
+            "public_flags": 0,
+        },
+        "nick": f"nick{n}" if rng.random() < 0.2 else None,
+        "roles": [str(GUILD_ID + 10 + r) for r in rng.sample(range(20), rng.randint(0, 3))],
+        "joined_at": "2024-01-01T00:00:00.000000+00:00",
+        "premium_since": None,
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+        "pending": False,
+    }
+
+
+def spotify_payload(rng: random.Random, tracks: int) -> dict:
+    number = min(int(rng.expovariate(5 / tracks)), tracks - 1)
+    start = int(time.time() * 1000) - rng.randint(0, 180_000)
+    return {
+        "type": 2,
+        "name": "Spotify",
+        "id": "spotify:1",
+        "flags": 48,
+        "details": f"Track {number}",
+        "state": f"Artist {number % 40}; Feature {number % 7}",
+        "sync_id": f"{number:022d}",
+        "session_id": f"{rng.getrandbits(128):032x}",
+        "party": {"id": f"spotify:{rng.getrandbits(64)}"},
+        "timestamps": {"start": start, "end": start + 200_000},
+        "assets": {"large_image": f"spotify:ab67616d0000b273{number:024x}", "large_text": f"Album {number % 60}"},
+        "created_at": start,
+    }
+
+
+def presence_payload(n: int, rng: random.Random, args) -> dict:
+    """An online member's presence: Spotify for some, plus the custom statuses and games most people have."""
+    activities = []
+    if rng.random() < 0.4:
+        activities.append({"type": 4, "name": "Custom Status", "id": "custom", "state": f"status of member {n}",
+                           "created_at": int(time.time() * 1000)})
+    if rng.random() < args.listening:
+        activities.append(spotify_payload(rng, args.tracks))
+    if rng.random() < 0.15:
+        activities.append({"type": 0, "name": "Valorant", "application_id": "700136079562375258",
+                           "timestamps": {"start": int(time.time() * 1000)}, "created_at": int(time.time() * 1000)})
+    status = rng.choice(("online", "idle", "dnd"))
+    return {
+        "user": {"id": str(10**18 + n)},
+        "guild_id": str(GUILD_ID),
+        "status": status,
+        "client_status": {"desktop": status},
+        "activities": activities,
+    }
+
+
+def guild_payload(members: int) -> dict:
+    return {
+        "id": str(GUILD_ID),
+        "name": "Memory Benchmark",
+        "owner_id": str(BOT_ID),
+        "member_count": members,
+        "large": True,
+        "roles": [
+            {"id": str(GUILD_ID + 10 + r) if r else str(GUILD_ID), "name": f"role{r}" if r else "@everyone",
+             "permissions": "0", "position": r, "color": 0, "hoist": False, "managed": False, "mentionable": False}
+            for r in range(21)
+        ],
+        "channels": [],
+        "members": [],
+        "presences": [],
+    }
+
+
+# -----------------------------
+# One measurement (runs in a child process)
+# -----------------------------
+async def measure(mode: str, members: int, args) -> dict:
+    import main
+    from cogs.spotify import SpotifyCommands
+    from discord.state import ChunkRequest
+    from listeners import ListenerIndex
+
+    lean = mode == "lean"
+    bot = main.Client(
+        command_prefix="!",
+        intents=main.intents,
+        help_command=None,
+        home_guild=None,
+        guild_configs=main.client.guild_configs,
+        spotify=main.client.spotify,
+        profiles=main.client.profiles,
+        listener_index=ListenerIndex(),
+        live_embeds=main.client.live_embeds,
+        history=main.client.history,
+        np_cards=main.client.np_cards,
+        media_jobs=main.client.media_jobs,
+        gif_cache=main.client.gif_cache,
+        lean_members=lean,
+    )
+    await bot._async_setup_hook()  # What login() does first: binds the client to this loop
+    await bot.add_cog(SpotifyCommands(bot))
+    state = bot._connection
+    state.user = type("BotUser", (), {"id": BOT_ID, "bot": True})()
+    gc.collect()
+    baseline = runner.rss_bytes()
+
+    rng = random.Random(args.seed)
+    state._add_guild_from_data(guild_payload(members))
+    guild = bot.get_guild(GUILD_ID)
+    online = [n for n in range(members) if rng.random() < args.online]
+
+    if not lean:
+        # What chunk_guilds_at_startup does: every member, with presences for the online ones
+        request = ChunkRequest(GUILD_ID, 0, asyncio.get_running_loop(), state._get_guild, cache=True)
+        state._chunk_requests[GUILD_ID] = request
+        chunk_count = -(-members // CHUNK_SIZE)
+        online_set = set(online)
+        for index in range(chunk_count):
+            ids = range(index * CHUNK_SIZE, min(members, (index + 1) * CHUNK_SIZE))
+            state.parse_guild_members_chunk({
+                "guild_id": str(GUILD_ID),
+                "members": [member_payload(n, rng) for n in ids],
+                "presences": [presence_payload(n, rng, args) for n in ids if n in online_set],
+                "chunk_index": index,
+                "chunk_count": chunk_count,
+                "nonce": request.nonce,
+            })
+        bot.listener_index.rebuild(guild)
+
+    # Steady state: every online member's presence changes once (new song, new status). Its own
+    # generator, so both modes end up with the same listeners.
+    updates = random.Random(args.seed + 1)
+    for start in range(0, len(online), CHUNK_SIZE):
+        for n in online[start:start + CHUNK_SIZE]:
+            state.parse_presence_update(presence_payload(n, updates, args))
+        await asyncio.sleep(0)  # Let the dispatched listener tasks run
+    while len(asyncio.all_tasks()) > 1:
+        await asyncio.sleep(0)
+
+    gc.collect()
+    rss = runner.rss_bytes()
+    return {
+        "mode": mode,
+        "members": members,
+        "online": len(online),
+        "cached_members": len(guild.members),
+        "listeners": sum(len(member_ids) for _, member_ids in bot.listener_index.tracks(GUILD_ID)),
+        "baseline_mib": baseline / 2**20,
+        "rss_mib": rss / 2**20,
+        "delta_mib": (rss - baseline) / 2**20,
+        "bytes_per_member": (rss - baseline) / members,
+    }
+
+
+def run_child(mode: str, members: int, args) -> dict:
+    return runner.run_child(
+        "membench", mode, members, "--online", args.online, "--listening", args.listening,
+        "--tracks", args.tracks, "--seed", args.seed,
+    )
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+REPORT_COLUMNS = (
+    ("members", "members", 8, "{}"),
+    ("mode", "mode", 8, "{}"),
+    ("cached_members", "cached", 8, "{}"),
+    ("listeners", "spotify", 8, "{}"),
+    ("rss_mib", "RSS MiB", 9, "{:.1f}"),
+    ("delta_mib", "Δ MiB", 9, "{:.1f}"),
+    ("bytes_per_member", "B/member", 9, "{:.0f}"),
+)
+
+
+def print_results(results: list):
+    print(" ".join(f"{title:>{width}}" for _, title, width, _ in REPORT_COLUMNS))
+    for result in results:
+        print(" ".join(f"{fmt.format(result[key]):>{width}}" for key, _, width, fmt in REPORT_COLUMNS))
+    by_size = {}
+    for result in results:
+        by_size.setdefault(result["members"], {})[result["mode"]] = result
+    for members, modes in by_size.items():
+        if set(modes) == set(MODES) and modes["default"]["delta_mib"] > 0:
+            saved = 1 - modes["lean"]["delta_mib"] / modes["default"]["delta_mib"]
+            print(f"{members} members: lean mode uses {saved:.0%} less memory for the guild")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="RSS of the member and presence caches in default and lean mode.")
+    parser.add_argument("--members", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--online", type=float, default=0.4, help="Fraction of members online")
+    parser.add_argument("--listening", type=float, default=0.25, help="Fraction of online members on Spotify")
+    parser.add_argument("--tracks", type=int, default=500, help="Distinct tracks members are playing")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "MEMBERS"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        mode, members = args.child
+        result = asyncio.run(measure(mode, int(members), args))
+        print(json.dumps(result))
+        sys.exit(0)
+
+    results = [run_child(mode, members, args) for members in args.members for mode in args.modes]
+    runner.finish(args, results, print_results)
@@ -0,0 +1,168 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+# -----------------------------
+# Listener index benchmark
+# -----------------------------
+# Feeds a synthetic stream of presence updates into ListenerIndex, the way on_presence_update and
+# on_raw_presence_update do. The stream mixes new songs, the same song again (seek or pause),
+# stopping, and presences without Spotify, spread over several guilds. It reports updates per
+# second. Then it times "who is listening to this track / artist" from the index against scanning
+# every member's activities, as /np did before the index. Finally it checks that the index answers
+# exactly what the scan does, for every track and artist, and exits 1 if not. Run from the repo root:
+#
+#   python -m bench.presencebench
+#   python -m bench.presencebench --members 100000 --updates 1000000 --json presencebench.json
+#
+from bench import runner
+from listeners import ListenerIndex
+
+UPDATE_KINDS = (("new track", 0.5), ("same track", 0.25), ("stopped", 0.1), ("no spotify", 0.15))
+GUILD_ID = 10**17
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+OTHER_ACTIVITIES = (discord.CustomActivity("vibing"), discord.Game("Valorant"))
+
+
+class Member:
+    __slots__ = ("id", "guild_id", "activities")
+
+    def __init__(self, member_id: int, guild_id: int):
+        self.id = member_id
+        self.guild_id = guild_id
+        self.activities = ()
+
+
+def spotify(number: int, started: float) -> discord.Spotify:
+    start = NOW + timedelta(seconds=started)
+    return discord.Spotify(
+        name="Spotify",
+        details=f"Track {number}",
+        state=f"Artist {number % 40}; Feature {number % 7}",
+        assets={"large_image": f"spotify:ab67616d0000b273{number:024x}", "large_text": f"Album {number % 60}"},
+        timestamps={"start": int(start.timestamp() * 1000), "end": int(start.timestamp() * 1000) + 200_000},
+        sync_id=f"{number:022d}",
+        session_id="presencebench",
+        party={"id": f"spotify:{number}"},
+    )
+
+
+def presence_stream(args) -> tuple:
+    """(members, [(member, activities)]), activities built up front so only the index is timed."""
+    rng = random.Random(args.seed)
+    members = [Member(10**18 + n, GUILD_ID + n % args.guilds) for n in range(args.members)]
+    playing = {}  # member id -> track number
+    kinds = [kind for kind, _ in UPDATE_KINDS]
+    weights = [weight for _, weight in UPDATE_KINDS]
+    stream = []
+    for n in range(args.updates):
+        member = rng.choice(members)
+        kind = rng.choices(kinds, weights)[0]
+        extra = (rng.choice(OTHER_ACTIVITIES),) if rng.random() < 0.4 else ()
+        if kind == "new track" or (kind == "same track" and member.id not in playing):
+            # Skewed towards popular tracks, like a real server
+            playing[member.id] = min(int(rng.expovariate(5 / args.tracks)), args.tracks - 1)
+            activities = extra + (spotify(playing[member.id], n),)
+        elif kind == "same track":
+            activities = extra + (spotify(playing[member.id], n - rng.randint(0, 100)),)
+        else:
+            playing.pop(member.id, None)
+            activities = extra
+        stream.append((member, activities))
+    return members, stream
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+def scan_track(members, guild_id: int, track_id: str) -> set:
+    return {m.id for m in members if m.guild_id == guild_id
+            and any(isinstance(a, discord.Spotify) and a.track_id == track_id for a in m.activities)}
+
+
+def scan_artist(members, guild_id: int, artist: str) -> set:
+    return {m.id for m in members if m.guild_id == guild_id
+            and any(isinstance(a, discord.Spotify) and artist in a.artists for a in m.activities)}
+
+
+def time_lookups(lookup, queries: list) -> float:
+    """Seconds per lookup."""
+    start = time.perf_counter()
+    for query in queries:
+        lookup(*query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def run(args) -> dict:
+    members, stream = presence_stream(args)
+    index = ListenerIndex()
+    start = time.perf_counter()
+    for member, activities in stream:
+        index.update_activities(member.guild_id, member.id, activities)
+    ingest = time.perf_counter() - start
+    for member, activities in stream:
+        member.activities = activities
+
+    guild_ids = sorted({m.guild_id for m in members})
+    tracks = [(g, track_id) for g in guild_ids for track_id, _ in index.tracks(g)]
+    artists = [(g, artist) for g in guild_ids for artist in {a for m in members if m.guild_id == g
+                                                              for act in m.activities if isinstance(act, discord.Spotify)
+                                                              for a in act.artists}]
+    rng = random.Random(args.seed + 1)
+    queries = [rng.choice(tracks) for _ in range(args.lookups)] if tracks else []
+    by_guild = {g: [m for m in members if m.guild_id == g] for g in guild_ids}
+    lookups = {
+        "index_track_us": time_lookups(index.listeners_of_track, queries) * 1e6,
+        "index_count_us": time_lookups(index.count_track, queries) * 1e6,
+        "scan_track_us": time_lookups(lambda g, t: scan_track(by_guild[g], g, t), queries) * 1e6,
+    } if queries else {}
+
+    problems = []
+    wrong_tracks = [(g, t) for g, t in tracks if index.listeners_of_track(g, t) != scan_track(by_guild[g], g, t)]
+    wrong_artists = [(g, a) for g, a in artists if index.listeners_of_artist(g, a) != scan_artist(by_guild[g], g, a)]
+    listening = sum(1 for m in members if any(isinstance(a, discord.Spotify) for a in m.activities))
+    indexed = sum(len(ids) for g in guild_ids for _, ids in index.tracks(g))
+    if wrong_tracks:
+        problems.append(f"index: {len(wrong_tracks)} of {len(tracks)} tracks list different listeners than a scan")
+    if wrong_artists:
+        problems.append(f"index: {len(wrong_artists)} of {len(artists)} artists list different listeners than a scan")
+    if indexed != listening:
+        problems.append(f"index: {indexed} members indexed, {listening} are listening")
+    return {
+        "updates": args.updates,
+        "updates_per_s": args.updates / ingest,
+        "listening": listening,
+        "tracks": len(tracks),
+        **lookups,
+        "problems": problems,
+    }
+
+
+def print_results(result: dict):
+    print(f"{result['updates']} presence updates: {result['updates_per_s']:,.0f}/s into the index; "
+          f"{result['listening']} listening to {result['tracks']} tracks at the end")
+    if "scan_track_us" in result:
+        print(f"listeners of a track: index {result['index_track_us']:.2f} µs, count {result['index_count_us']:.2f} µs, "
+              f"scanning members {result['scan_track_us']:.0f} µs "
+              f"({result['scan_track_us'] / result['index_track_us']:,.0f}x)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ListenerIndex update throughput and lookups against a member scan.")
+    parser.add_argument("--members", type=int, default=20_000)
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--tracks", type=int, default=500, help="Distinct tracks members are playing")
+    parser.add_argument("--updates", type=int, default=200_000, help="Presence updates in the stream")
+    parser.add_argument("--lookups", type=int, default=200, help="Track lookups timed each way")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run(args)
+    runner.finish(args, result, print_results)
@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+# -----------------------------
+# Shared helpers for the benchmarks
+# -----------------------------
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource  # Peak rather than current RSS, but close enough right after a run
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def peak_rss_bytes() -> int:
+    # VmHWM rather than ru_maxrss: Linux carries ru_maxrss over from the parent across fork and exec
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+
+
+def run_child(module: str, *args) -> dict:
+    """Run `python -m bench.<module> --child <args>` in a fresh process; returns the JSON line it printed last."""
+    command = [sys.executable, "-m", f"bench.{module}", "--child", *map(str, args)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def finish(args, result, print_results, problems=None):
+    """Print `result`, save it to --json, then print `problems` and exit 1 if there are any.
+
+    `problems` defaults to `result["problems"]` when the result is a dict.
+    """
+    print_results(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            body = result if isinstance(result, dict) else {"results": result}
+            json.dump({"args": vars(args), **body}, f, indent=2)
+    if problems is None:
+        problems = result.get("problems", ()) if isinstance(result, dict) else ()
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
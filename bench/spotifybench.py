@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import json
+import time
+from email.utils import formatdate
+
+import aiohttp
+from aiohttp import web
+
+# -----------------------------
+# Spotify client benchmark
+# -----------------------------
+# Runs SpotifyClient against a fake Spotify (token endpoint and /v1/tracks) served by an in-process
+# HTTP server, so requests go through the real session, pool and retry loop without reaching
+# Spotify. It reports how long a burst of concurrent /np-style artist lookups takes and how many of
+# them the server saw at once, then checks that:
+#   overlap   the burst runs side by side: far quicker than one lookup after another
+#   token     a cold client fetches one token for the whole burst
+#   429       every Retry-After form (seconds, HTTP-date, junk, huge) is retried, within the cap
+#   pool      a request waiting out a 429 doesn't hold its connection: with a pool of one and the
+#             429's body still on its way, another request finishes during the wait
+#   401       an expired token is refreshed once and the request retried
+#   cancel    lookups sharing one track load still get the track when the caller that started it
+#             is cancelled, and the track is fetched once
+# and exits 1 if any fails. Run from the repo root:
+#
+#   python -m bench.spotifybench
+#   python -m bench.spotifybench --lookups 200 --latency 40 --json spotifybench.json
+#
+from bench import runner
+from spotify_api import SpotifyClient, parse_retry_after
+
+RETRY_AFTER_CAP = 0.3  # max_retry_after for the checks, so "huge" waits are visibly cut short
+POOL_WAIT = 0.25  # Retry-After of the 429 in the pool check
+RATE_LIMITED = {"error": {"status": 429, "message": "API rate limit exceeded"}}
+
+
+# -----------------------------
+# Fake Spotify
+# -----------------------------
+class FakeSpotify:
+    """Token endpoint and GET /v1/tracks/{id}, each answering after `latency` seconds.
+
+    Track ids pick the first response: "r429-<retry-after>-<n>" gets a 429 with that Retry-After
+    ("date" sends an HTTP-date, "none" no header; a "-slow" suffix sends its body only after twice
+    that), "r401-<n>" a 401, "always429-<n>" only 429s.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.token_requests = 0
+        self.track_requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.refused = set()  # Track ids already given their 429 or 401
+        self.tokens = 0
+        self._runner = None
+        self.url = None
+
+    async def token(self, request: web.Request) -> web.Response:
+        self.token_requests += 1
+        await asyncio.sleep(self.latency)
+        self.tokens += 1
+        return web.json_response({"access_token": f"token{self.tokens}", "token_type": "Bearer", "expires_in": 3600})
+
+    async def track(self, request: web.Request) -> web.Response:
+        self.track_requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        track_id = request.match_info["id"]
+        kind, _, rest = track_id.partition("-")
+        if kind == "always429" or (kind == "r429" and track_id not in self.refused):
+            self.refused.add(track_id)
+            retry_after = rest.rsplit("-", 1)[0] if kind == "r429" else "0"
+            headers = {}
+            if retry_after == "date":
+                headers["Retry-After"] = formatdate(time.time() + 1, usegmt=True)
+            elif retry_after != "none":
+                headers["Retry-After"] = retry_after
+            if rest.endswith("-slow"):
+                return await self.slow_error(request, headers, 2 * float(retry_after))
+            return web.json_response(RATE_LIMITED, status=429, headers=headers)
+        if kind == "r401" and track_id not in self.refused:
+            self.refused.add(track_id)
+            return web.Response(status=401)
+        return web.json_response({
+            "id": track_id,
+            "name": f"Track {track_id}",
+            "artists": [{"name": f"Artist of {track_id}",
+                         "external_urls": {"spotify": f"https://open.spotify.com/artist/{track_id}"}}],
+        })
+
+    async def slow_error(self, request: web.Request, headers: dict, delay: float) -> web.StreamResponse:
+        """A 429 whose body arrives `delay` seconds after its headers; the connection is busy until then."""
+        response = web.StreamResponse(status=429, headers={**headers, "Content-Type": "application/json"})
+        await response.prepare(request)
+        await asyncio.sleep(delay)
+        try:
+            await response.write(json.dumps(RATE_LIMITED).encode())
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # The client dropped the connection rather than wait for the body
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/token", self.token)
+        app.router.add_get("/v1/tracks/{id}", self.track)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+def client_for(fake: FakeSpotify, **kwargs) -> SpotifyClient:
+    kwargs.setdefault("max_retry_after", RETRY_AFTER_CAP)
+    return SpotifyClient("bench", "bench", api_url=f"{fake.url}/v1", token_url=f"{fake.url}/api/token", **kwargs)
+
+
+async def timed(coro) -> tuple:
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+# -----------------------------
+# Checks
+# -----------------------------
+def check_parse() -> list:
+    cases = {
+        "2": 2.0, "0.5": 0.5, "-3": 0.0, "junk": 1.0, None: 1.0, "nan": 1.0, "1e9": 5.0,
+        formatdate(0, usegmt=True): 0.0, formatdate(time.time() + 3600, usegmt=True): 5.0,
+    }
+    return [
+        f"parse: Retry-After {value!r} gave {parse_retry_after(value, maximum=5):.2f}s, expected {expected}s"
+        for value, expected in cases.items() if abs(parse_retry_after(value, maximum=5) - expected) > 0.01
+    ]
+
+
+async def check_burst(fake: FakeSpotify, lookups: int) -> tuple:
+    """A cold client answering `lookups` concurrent artist lookups; returns (result, problems)."""
+    client = client_for(fake)
+    fake.token_requests = fake.peak_in_flight = 0
+    try:
+        wall, artists = await timed(asyncio.gather(*(client.get_artist_from_track(f"t{n}") for n in range(lookups))))
+    finally:
+        await client.close()
+    result = {
+        "lookups": lookups,
+        "wall_ms": wall * 1000,
+        "serial_ms": lookups * fake.latency * 1000,
+        "peak_in_flight": fake.peak_in_flight,
+        "token_requests": fake.token_requests,
+    }
+    problems = []
+    if any(artist is None for artist in artists):
+        problems.append(f"burst: {sum(a is None for a in artists)} lookups came back empty")
+    expected_peak = min(lookups, client.max_connections)
+    if fake.peak_in_flight < expected_peak:
+        problems.append(f"overlap: at most {fake.peak_in_flight} lookups in flight, expected {expected_peak}")
+    # Token, then ceil(lookups / pool) rounds of the API, with room for scheduling
+    rounds = 1 + -(-lookups // client.max_connections)
+    if wall > rounds * fake.latency * 2:
+        problems.append(f"overlap: {lookups} lookups took {wall * 1000:.0f}ms, expected about "
+                        f"{rounds * fake.latency * 1000:.0f}ms")
+    if fake.token_requests != 1:
+        problems.append(f"token: {fake.token_requests} token requests for one burst, expected 1")
+    return result, problems
+
+
+async def check_cancel(fake: FakeSpotify, waiters: int = 5) -> list:
+    """Cancel the first of several lookups sharing one track load; the others must still get the track."""
+    problems = []
+    client = client_for(fake)
+    try:
+        await client.get_token()
+        requests = fake.track_requests
+        lookups = [asyncio.create_task(client.get_track("shared-1")) for _ in range(waiters)]
+        while fake.track_requests == requests:
+            await asyncio.sleep(0.005)
+        lookups[0].cancel()
+        results = await asyncio.gather(*lookups[1:], return_exceptions=True)
+        failed = [r for r in results if not isinstance(r, dict)]
+        if failed:
+            problems.append(f"cancel: {len(failed)} of {waiters - 1} lookups sharing a cancelled caller's load "
+                            f"failed, e.g. {failed[0]!r}")
+        if await client.get_track("shared-1") is None or fake.track_requests != requests + 1:
+            problems.append(f"cancel: {fake.track_requests - requests} requests for one shared track, expected 1")
+    finally:
+        await client.close()
+    return problems
+
+
+async def check_retries(fake: FakeSpotify) -> list:
+    problems = []
+    client = client_for(fake)
+    try:
+        await client.get_token()
+        for retry_after in ("0.1", "date", "junk", "none", "99999"):
+            try:
+                wall, track = await timed(client.get_track(f"r429-{retry_after}-1"))
+            except aiohttp.ClientResponseError as e:
+                problems.append(f"429: Retry-After {retry_after!r} ended in HTTP {e.status}")
+                continue
+            if track is None:
+                problems.append(f"429: Retry-After {retry_after!r} came back empty")
+            elif wall > RETRY_AFTER_CAP + 2 * fake.latency + 0.2:
+                problems.append(f"429: Retry-After {retry_after!r} waited {wall * 1000:.0f}ms, "
+                                f"over the {RETRY_AFTER_CAP * 1000:.0f}ms cap")
+
+        try:
+            await client.get_track("always429-1")
+            problems.append("429: a track that only ever gets 429s was returned")
+        except aiohttp.ClientResponseError as e:
+            if e.status != 429:
+                problems.append(f"429: a track that only ever gets 429s raised HTTP {e.status}")
+
+        tokens = fake.token_requests
+        if await client.get_track("r401-1") is None:
+            problems.append("401: the retried request came back empty")
+        if fake.token_requests != tokens + 1:
+            problems.append(f"401: {fake.token_requests - tokens} token requests after one 401, expected 1")
+    finally:
+        await client.close()
+
+    # One connection: a request must get it while another waits out a 429 whose body is still coming
+    client = client_for(fake, max_connections=1, max_retry_after=POOL_WAIT * 2)
+    try:
+        await client.get_token()
+        limited_id = f"r429-{POOL_WAIT}-slow"
+        limited = asyncio.create_task(client.get_track(limited_id))
+        while limited_id not in fake.refused:
+            await asyncio.sleep(0.005)
+        wall, _ = await timed(client.get_track("pool-1"))
+        await limited
+        if wall >= POOL_WAIT:
+            problems.append(f"pool: a request waited {wall * 1000:.0f}ms for the connection held by a 429 wait")
+    finally:
+        await client.close()
+    return problems
+
+
+async def run(args) -> dict:
+    fake = FakeSpotify(args.latency / 1000)
+    await fake.start()
+    try:
+        burst, problems = await check_burst(fake, args.lookups)
+        problems = check_parse() + problems + await check_retries(fake) + await check_cancel(fake)
+    finally:
+        await fake.stop()
+    return {"burst": burst, "problems": problems}
+
+
+def print_results(result: dict):
+    burst = result["burst"]
+    print(f"{burst['lookups']} concurrent lookups: {burst['wall_ms']:.0f}ms "
+          f"(one after another: {burst['serial_ms']:.0f}ms), {burst['peak_in_flight']} in flight at once, "
+          f"{burst['token_requests']} token request(s)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SpotifyClient concurrency, token refresh and retries.")
+    parser.add_argument("--lookups", type=int, default=50, help="Concurrent artist lookups in the burst")
+    parser.add_argument("--latency", type=float, default=100, help="ms the fake Spotify waits per request")
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    runner.finish(args, result, print_results)
@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# -----------------------------
+# Video to GIF benchmark
+# -----------------------------
+# Converts sample clips to a GIF under the target size two ways, each in a fresh subprocess:
+#   legacy     the old gif commands: the upload saved to a file, `ffmpeg -vf fps=15,scale=320:-1`
+#              run synchronously on the event loop (as ffmpeg-python's .run() did), then the old
+#              compress_gif_until_fit loop in an executor until it fits (at most 10 rounds)
+#   streaming  media.convert_video: probe, predicted width and fps, one palettegen/paletteuse
+#              encode from an asyncio subprocess fed over a pipe, a second only if it overshoots
+# For each it reports wall time, encodes, output size, the longest the event loop went without
+# running, and peak RSS: of the Python process over its baseline, and of the largest ffmpeg it ran.
+# The streaming path must fit the target and never hold the loop for more than --max-stall ms, or
+# the run exits 1. Needs ffmpeg and ffprobe (FFMPEG_BINARY, FFPROBE_BINARY). Run from the repo root:
+#
+#   python -m bench.videobench                    # synthetic test pattern clips
+#   python -m bench.videobench clip.mp4 other.webm --target 8
+#   python -m bench.videobench --json videobench.json
+#
+from bench import runner
+import media
+from bench.gifbench import legacy_fit
+from media import FFMPEG, FFPROBE, VideoSource, convert_video
+from media_io import JobFiles, MediaInput
+
+PATHS = ("legacy", "streaming")
+LEGACY_FILTER = "fps=15,scale=320:-1:flags=lanczos"
+HEARTBEAT = 0.01
+# (name, size, seconds, faststart): without faststart the MP4 index is at the end and the clip has to be spooled
+SYNTHETIC_CLIPS = (
+    ("720p-6s.mp4", "1280x720", 6, True),
+    ("1080p-15s.mp4", "1920x1080", 15, False),
+    ("480p-30s.mp4", "854x480", 30, True),
+)
+
+
+# -----------------------------
+# Samples
+# -----------------------------
+def test_pattern(directory: str, name: str, size: str, seconds: int, faststart: bool) -> str:
+    path = os.path.join(directory, name)
+    args = [FFMPEG, "-v", "error", "-f", "lavfi", "-i", f"testsrc2=duration={seconds}:size={size}:rate=30",
+            "-pix_fmt", "yuv420p"]
+    if faststart:
+        args += ["-movflags", "+faststart"]
+    subprocess.run(args + ["-y", path], check=True)
+    return path
+
+
+# -----------------------------
+# The two paths
+# -----------------------------
+async def legacy_path(data: bytes, target_size: int) -> tuple:
+    with tempfile.TemporaryDirectory(prefix="videobench-") as directory:
+        upload = os.path.join(directory, "upload")
+        with open(upload, "wb") as f:
+            f.write(data)
+        output = os.path.join(directory, "output.gif")
+        # Blocks the loop, like the old commands did
+        subprocess.run([FFMPEG, "-i", upload, "-vf", LEGACY_FILTER, "-y", output], capture_output=True, check=True)
+        with open(output, "rb") as f:
+            gif = f.read()
+    out, encodes = await asyncio.get_running_loop().run_in_executor(None, legacy_fit, gif, target_size)
+    return out, encodes + 1
+
+
+async def streaming_path(data: bytes, target_size: int) -> tuple:
+    encodes = 0
+    encode_video = media.encode_video
+
+    async def counting_encode(*args, **kwargs):
+        nonlocal encodes
+        encodes += 1
+        return await encode_video(*args, **kwargs)
+
+    media.encode_video = counting_encode
+    try:
+        with JobFiles() as files:
+            source = await VideoSource(MediaInput(files, "upload", data)).probe()
+            return await convert_video(source, "gif", target_size), encodes
+    finally:
+        media.encode_video = encode_video
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+async def run_child(path: str, sample: str, target_size: int) -> dict:
+    """One path over one sample in this (fresh) process."""
+    from PIL import Image  # noqa: F401 - imported before the baseline, like in a warm bot process
+    with open(sample, "rb") as f:
+        data = f.read()
+    baseline = runner.rss_bytes()
+    longest_gap = 0.0
+
+    async def heartbeat():
+        nonlocal longest_gap
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(HEARTBEAT)
+            now = time.perf_counter()
+            longest_gap = max(longest_gap, now - last - HEARTBEAT)
+            last = now
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    out, encodes = await (legacy_path if path == "legacy" else streaming_path)(data, target_size)
+    wall = time.perf_counter() - start
+    beat.cancel()
+    return {
+        "path": path,
+        "ms": wall * 1000,
+        "encodes": encodes,
+        "kib": len(out) / 1024,
+        "fits": len(out) <= target_size,
+        "stall_ms": longest_gap * 1000,
+        "python_mib": (runner.peak_rss_bytes() - baseline) / 2**20,
+        # Linux reports ru_maxrss in KiB; the largest of the ffmpeg/ffprobe processes this one waited for
+        "ffmpeg_mib": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def measure(path: str, sample: str, target_size: int) -> dict:
+    return runner.run_child("videobench", path, sample, target_size)
+
+
+def run(args) -> dict:
+    target_size = int(args.target * 1024 * 1024)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="videobench-") as directory:
+        if args.samples:
+            samples = list(args.samples)
+        else:
+            samples = [test_pattern(directory, *clip) for clip in SYNTHETIC_CLIPS]
+        for sample in samples:
+            for path in args.paths:
+                try:
+                    result = measure(path, sample, target_size)
+                except subprocess.CalledProcessError as e:
+                    detail = e.stderr.strip().splitlines()
+                    print(f"{os.path.basename(sample)} via {path} failed: {detail[-1] if detail else e}",
+                          file=sys.stderr)
+                    continue
+                results.append({"sample": os.path.basename(sample), "input_kib": os.path.getsize(sample) / 1024,
+                                **result})
+
+    problems = []
+    for r in results:
+        if r["path"] != "streaming":
+            continue
+        if not r["fits"]:
+            problems.append(f"{r['sample']}: {r['kib']:.0f} KiB GIF is over the {args.target:g} MiB target")
+        if r["stall_ms"] > args.max_stall:
+            problems.append(f"{r['sample']}: the event loop stalled for {r['stall_ms']:.0f}ms "
+                            f"(limit {args.max_stall:.0f}ms)")
+    return {"target_kib": target_size / 1024, "results": results, "problems": problems}
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+REPORT_COLUMNS = (
+    ("sample", "sample", 14, "{}"),
+    ("input_kib", "input KiB", 10, "{:.0f}"),
+    ("path", "path", 10, "{}"),
+    ("ms", "ms", 8, "{:.0f}"),
+    ("encodes", "encodes", 8, "{}"),
+    ("kib", "KiB", 8, "{:.0f}"),
+    ("stall_ms", "stall ms", 9, "{:.0f}"),
+    ("python_mib", "py MiB", 8, "{:.1f}"),
+    ("ffmpeg_mib", "ffmpeg MiB", 11, "{:.1f}"),
+)
+
+
+def print_results(result: dict):
+    print(f"target {result['target_kib']:.0f} KiB")
+    print(" ".join(f"{title:>{width}}" for _, title, width, _ in REPORT_COLUMNS))
+    for r in result["results"]:
+        print(" ".join(f"{fmt.format(r[key]):>{width}}" for key, _, width, fmt in REPORT_COLUMNS)
+              + ("" if r["fits"] else "  (over target)"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Wall time, loop stalls and peak RSS of video to GIF, old and new.")
+    parser.add_argument("samples", nargs="*", help="Videos to convert (default: synthetic test pattern clips)")
+    parser.add_argument("--target", type=float, default=8, help="Size limit in MiB")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--max-stall", type=float, default=100, help="ms the streaming path may hold the event loop")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--child", nargs=3, metavar=("PATH", "SAMPLE", "TARGET"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        path, sample, target_size = args.child
+        print(json.dumps(asyncio.run(run_child(path, sample, int(target_size)))))
+        sys.exit(0)
+
+    missing = [binary for binary in (FFMPEG, FFPROBE) if shutil.which(binary) is None]
+    if missing:
+        sys.exit(f"videobench needs {' and '.join(missing)}; set FFMPEG_BINARY / FFPROBE_BINARY if they aren't on PATH")
+    result = run(args)
+    runner.finish(args, result, print_results)
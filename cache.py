@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+# -----------------------------
+# Bounded TTL + LRU cache
+# -----------------------------
+_MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache with per-entry expiry and single-flight async loading."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, negative_ttl: float | None = _MISSING,
+                 clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Lifetime for cached None values (negative caching); defaults to `ttl`
+        self.negative_ttl = ttl if negative_ttl is _MISSING else negative_ttl
+        self.clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> asyncio.Task
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count: bool = True):
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at is None or expires_at > self.clock():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            del self._data[key]
+        if count:
+            self.misses += 1
+        return default
+
+    def set(self, key, value, ttl: float | None = _MISSING):
+        if ttl is _MISSING:
+            ttl = self.negative_ttl if value is None else self.ttl
+        expires_at = None if ttl is None else self.clock() + ttl
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(self, key, loader, ttl: float | None = _MISSING):
+        """Return the cached value or await `loader()` once, sharing it with concurrent callers.
+
+        The load runs in its own task, so a caller that gets cancelled only stops waiting; the load
+        still finishes for everyone else.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader, ttl))
+            self._inflight[key] = task
+            self.loads += 1
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, ttl):
+        try:
+            value = await loader()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "loads": self.loads,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,2 @@
+# Extensions loaded by Client.setup_hook in main.py, in load order
+EXTENSIONS = ("cogs.links", "cogs.spotify", "cogs.history", "cogs.media", "cogs.profile", "cogs.config", "cogs.help")
@@ -0,0 +1,81 @@
+from typing import Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from guild_config import ConfigUnavailable
+from link_fixer import LINK_RULES
+
+PROVIDER_CHOICES = [app_commands.Choice(name=rule.label.split(" •")[0], value=rule.name) for rule in LINK_RULES]
+
+
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+class ConfigCommands(commands.GroupCog, name="Config", group_name="config", group_description="Configure the bot for this server"):
+    """Per-guild settings (welcome channel, link providers, GIF size limit), stored via GuildConfigStore."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        super().__init__()
+
+    def _config_embed(self, guild: discord.Guild) -> discord.Embed:
+        config = self.bot.guild_configs.get(guild.id)
+        providers = config.link_providers if config.link_providers is not None else {rule.name for rule in LINK_RULES}
+        embed = discord.Embed(title=f"⚙️ Settings for {guild.name}", color=discord.Color.blurple())
+        embed.add_field(
+            name="Welcome channel",
+            value=f"<#{config.welcome_channel_id}>" if config.welcome_channel_id else "Off",
+            inline=False
+        )
+        embed.add_field(
+            name="Link fixer",
+            value=", ".join(choice.name for choice in PROVIDER_CHOICES if choice.value in providers) or "Off",
+            inline=False
+        )
+        embed.add_field(
+            name="GIF size limit",
+            value=f"{config.gif_max_bytes / (1024 * 1024):g}MB" if config.gif_max_bytes else "Server upload limit",
+            inline=False
+        )
+        return embed
+
+    async def _update(self, interaction: discord.Interaction, **changes):
+        """Save `changes` and reply with the new settings, or with why nothing was saved."""
+        # Saving reads and writes the stored config, which can outlast Discord's 3 second reply deadline
+        await interaction.response.defer(ephemeral=True)
+        try:
+            await self.bot.guild_configs.update(interaction.guild_id, **changes)
+        except ConfigUnavailable as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        await interaction.followup.send(embed=self._config_embed(interaction.guild), ephemeral=True)
+
+    @app_commands.command(name="show", description="Show this server's bot settings")
+    async def show(self, interaction: discord.Interaction):
+        await interaction.response.send_message(embed=self._config_embed(interaction.guild), ephemeral=True)
+
+    @app_commands.command(name="welcome", description="Set the welcome channel (leave empty to turn welcomes off)")
+    async def welcome(self, interaction: discord.Interaction, channel: Optional[discord.TextChannel] = None):
+        await self._update(interaction, welcome_channel_id=channel.id if channel else None)
+
+    @app_commands.command(name="links", description="Turn link fixing on or off for one site")
+    @app_commands.choices(provider=PROVIDER_CHOICES)
+    async def links(self, interaction: discord.Interaction, provider: app_commands.Choice[str], enabled: bool):
+        def toggle(stored):
+            providers = set(stored if stored is not None else (rule.name for rule in LINK_RULES))
+            if enabled:
+                providers.add(provider.value)
+            else:
+                providers.discard(provider.value)
+            return frozenset(providers)
+
+        await self._update(interaction, link_providers=toggle)
+
+    @app_commands.command(name="giflimit", description="Cap /gif output size in MB (0 uses the server's upload limit)")
+    async def giflimit(self, interaction: discord.Interaction, megabytes: app_commands.Range[float, 0, 500]):
+        await self._update(interaction, gif_max_bytes=int(megabytes * 1024 * 1024) if megabytes else None)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(ConfigCommands(bot), guild=bot.home_guild)
@@ -0,0 +1,126 @@
+import time
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+
+class HelpCommands(commands.Cog, name="Help"):
+    """Help menu, small utility commands and owner-only diagnostics."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    # -----------------------------
+    # Commands
+    # -----------------------------
+    @commands.command()
+    async def hello(self, ctx):
+        await ctx.send("Hi there!")
+
+    @app_commands.command(name="hello", description="Say hello!")
+    async def hello_slash(self, interaction: discord.Interaction):
+        await interaction.response.send_message("Hi there!")
+
+    @commands.command()
+    async def ping(self, ctx):
+        await ctx.send(f"Pong! Latency is {round(self.bot.latency * 1000)}ms")
+
+    @app_commands.command(name="ping", description="Check bot latency")
+    async def ping_slash(self, interaction: discord.Interaction):
+        await interaction.response.send_message(f"Pong! Latency is {round(self.bot.latency * 1000)}ms")
+
+    # --- Owner-only diagnostics ---
+    @commands.command(name="perf")
+    @commands.is_owner()
+    async def perf(self, ctx):
+        loop_watchdog = self.bot.loop_watchdog
+        if loop_watchdog is None:
+            await ctx.send("❌ The loop watchdog is off. Start the bot with `LOOP_WATCHDOG=1` to enable it.")
+            return
+
+        report = loop_watchdog.report()
+        embed = discord.Embed(
+            title="🐢 Event Loop Stalls",
+            description=f"Stalls longer than {loop_watchdog.threshold * 1000:.0f}ms, by the handler that caused them.",
+            color=discord.Color.orange()
+        )
+        handlers = "\n".join(
+            f"`{handler}` — {count}× / {total * 1000:.0f}ms total" for handler, count, total in report["handlers"]
+        )
+        embed.add_field(name="Worst handlers", value=handlers or "No stalls recorded 🎉", inline=False)
+        for stall in report["recent"]:
+            ago = time.monotonic() - stall.started
+            stack = "\n".join(stall.stack[-4:])
+            embed.add_field(
+                name=f"{stall.duration * 1000:.0f}ms in {stall.handler} ({ago:.0f}s ago)",
+                value=f"```{stack[-1000:]}```",
+                inline=False
+            )
+        await ctx.send(embed=embed)
+
+    @perf.error
+    async def perf_error(self, ctx, error):
+        if isinstance(error, commands.NotOwner):
+            await ctx.send("❌ Only the bot owner can use this command.")
+
+    # -----------------------------
+    # Custom Help Command
+    # -----------------------------
+    @commands.command(name="help")
+    async def help_command(self, ctx):
+        embed = discord.Embed(
+            title="🤖 Bot Help — Commands",
+            description="Here are all the commands you can use:",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="👋 Hello", value="`!hello` or `/hello` — Say hello to the bot.", inline=False)
+        embed.add_field(name="🏓 Ping", value="`!ping` or `/ping` — Check the bot latency.", inline=False)
+        embed.add_field(
+            name="🎵 Spotify Profiles",
+            value=(
+                "`!setspotify <link>` or `/setspotify <link>` — Save your Spotify profile.\n"
+                "`!removespotify` or `/removespotify` — Remove your saved profile.\n"
+                "`!myspotify` or `/myspotify` — Show your saved profile."
+            ),
+            inline=False
+        )
+        embed.add_field(name="🎶 Now Playing", value="`!np [@member] [live|card]` or `/np [member] [live] [card]` — Show what you or someone else is listening to on Spotify; `live` keeps it updating for 10 minutes, `card` shows it as an image.", inline=False)
+        embed.add_field(name="📻 Listening", value="`!listening` or `/listening` — See what everyone in the server is listening to.", inline=False)
+        embed.add_field(name="📊 Top Artists & Tracks", value="`!topartists [@member] [server]` or `!toptracks [@member] [server]` — Most played Spotify artists or tracks for you, someone else or the whole server.", inline=False)
+        embed.add_field(name="🎞️ GIF", value="`!gif [gif]` or `/gif <file> [output]` — Turn an attached image or video into a looping WebP or GIF, whichever is smaller; add `gif` to always get a GIF.", inline=False)
+        embed.add_field(name="🔗 Link Fixer", value="Posting Twitter/X, Instagram, or Reddit links will automatically be fixed.", inline=False)
+        embed.add_field(name="⚙️ Server Settings", value="`/config` — Choose the welcome channel, which links get fixed, and the GIF size limit (Manage Server only).", inline=False)
+        embed.set_footer(text="Use the slash (/) versions for cleaner interactions!")
+        await ctx.send(embed=embed)
+
+    @app_commands.command(name="help", description="Show the help menu")
+    async def help_slash(self, interaction: discord.Interaction):
+        embed = discord.Embed(
+            title="🤖 Bot Help — Commands",
+            description="Here are all the commands you can use:",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="👋 Hello", value="`/hello` or `!hello` — Say hello to the bot.", inline=False)
+        embed.add_field(name="🏓 Ping", value="`/ping` or `!ping` — Check the bot latency.", inline=False)
+        embed.add_field(
+            name="🎵 Spotify Profiles",
+            value=(
+                "`/setspotify <link>` or `!setspotify <link>` — Save your Spotify profile.\n"
+                "`/removespotify` or `!removespotify` — Remove your saved profile.\n"
+                "`/myspotify` or `!myspotify` — Show your saved profile."
+            ),
+            inline=False
+        )
+        embed.add_field(name="🎶 Now Playing", value="`/np [member] [live] [card]` or `!np [@member] [live|card]` — Show what you or someone else is listening to on Spotify; `live` keeps it updating for 10 minutes, `card` shows it as an image.", inline=False)
+        embed.add_field(name="📻 Listening", value="`/listening` or `!listening` — See what everyone in the server is listening to.", inline=False)
+        embed.add_field(name="📊 Top Artists & Tracks", value="`/topartists [member] [server]` or `/toptracks [member] [server]` — Most played Spotify artists or tracks for you, someone else or the whole server.", inline=False)
+        embed.add_field(name="🎞️ GIF", value="`/gif <file> [output]` or `!gif [gif]` — Turn an attached image or video into a looping WebP or GIF, whichever is smaller; add `gif` to always get a GIF.", inline=False)
+        embed.add_field(name="🔗 Link Fixer", value="Posting Twitter/X, Instagram, or Reddit links will automatically be fixed.", inline=False)
+        embed.add_field(name="⚙️ Server Settings", value="`/config` — Choose the welcome channel, which links get fixed, and the GIF size limit (Manage Server only).", inline=False)
+        embed.set_footer(text="Use the slash (/) versions for cleaner interactions!")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(HelpCommands(bot), guild=bot.home_guild)
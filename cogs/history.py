@@ -0,0 +1,98 @@
+from typing import Literal, Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from metrics import timed, COMMAND_SECONDS, COMMAND_ERRORS
+
+MEDALS = ("🥇", "🥈", "🥉")
+
+
+def rank(n: int) -> str:
+    return MEDALS[n] if n < len(MEDALS) else f"`{n + 1}.`"
+
+
+def plays(n: int) -> str:
+    return f"{n} play" if n == 1 else f"{n} plays"
+
+
+class HistoryCommands(commands.Cog, name="History"):
+    """Top artists and tracks from the listening history, plus the presence listeners that record it."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.history = bot.history
+
+    # --- Recording ---
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        if not after.bot:
+            self.history.observe(after.guild.id, after.id, after.activities)
+
+    @commands.Cog.listener()
+    async def on_raw_presence_update(self, payload):
+        # Only dispatched in lean member cache mode, where on_presence_update never fires
+        if payload.guild_id is not None and payload.user_id != self.bot.user.id:
+            self.history.observe(payload.guild_id, payload.user_id, payload.activities)
+
+    # --- Embeds ---
+    async def top_embed(self, kind: str, guild: discord.Guild, member: Optional[discord.Member]) -> discord.Embed:
+        """`kind` is "artists" or "tracks"; a member's totals span every server, the server's are its own."""
+        owner = {"user_id": member.id} if member is not None else {"guild_id": guild.id}
+        if kind == "artists":
+            rows = await self.history.top_artists(**owner)
+            lines = [f"{rank(n)} **{artist}** — {plays(count)}" for n, (artist, count) in enumerate(rows)]
+        else:
+            rows = await self.history.top_tracks(**owner)
+            lines = [f"{rank(n)} **{title}** by {artist} — {plays(count)}" for n, (title, artist, count) in enumerate(rows)]
+
+        whose = member.display_name if member is not None else guild.name
+        embed = discord.Embed(
+            title=f"📊 Top {kind} — {whose}",
+            description="\n".join(lines) or "No plays recorded yet. Listening history starts when the bot sees you on Spotify.",
+            color=discord.Color.green(),
+        )
+        if member is not None:
+            embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
+        elif guild.icon:
+            embed.set_thumbnail(url=guild.icon.url)
+        return embed
+
+    # --- Top artists ---
+    @commands.command(name="topartists")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="topartists")
+    async def top_artists(self, ctx, member: Optional[discord.Member] = None, scope: Optional[Literal["server"]] = None):
+        if ctx.guild is None:
+            return
+        await ctx.send(embed=await self.top_embed("artists", ctx.guild, None if scope else member or ctx.author))
+
+    @app_commands.command(name="topartists", description="Most played Spotify artists for you, someone else or the server")
+    @app_commands.describe(server="Show the whole server's top artists instead")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="topartists")
+    async def top_artists_slash(self, interaction: discord.Interaction, member: Optional[discord.Member] = None,
+                                server: bool = False):
+        await interaction.response.defer()
+        embed = await self.top_embed("artists", interaction.guild, None if server else member or interaction.user)
+        await interaction.followup.send(embed=embed)
+
+    # --- Top tracks ---
+    @commands.command(name="toptracks")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="toptracks")
+    async def top_tracks(self, ctx, member: Optional[discord.Member] = None, scope: Optional[Literal["server"]] = None):
+        if ctx.guild is None:
+            return
+        await ctx.send(embed=await self.top_embed("tracks", ctx.guild, None if scope else member or ctx.author))
+
+    @app_commands.command(name="toptracks", description="Most played Spotify tracks for you, someone else or the server")
+    @app_commands.describe(server="Show the whole server's top tracks instead")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="toptracks")
+    async def top_tracks_slash(self, interaction: discord.Interaction, member: Optional[discord.Member] = None,
+                               server: bool = False):
+        await interaction.response.defer()
+        embed = await self.top_embed("tracks", interaction.guild, None if server else member or interaction.user)
+        await interaction.followup.send(embed=embed)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(HistoryCommands(bot), guild=bot.home_guild)
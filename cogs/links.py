@@ -0,0 +1,42 @@
+import logging
+
+import discord
+from discord.ext import commands
+
+from link_fixer import LinkRewriter
+from link_queue import LinkReplyQueue
+from logs import debug_sampled
+from metrics import LINK_REWRITES
+
+log = logging.getLogger("kwakinji.links")
+
+# -----------------------------
+# Twitter/X, Instagram, Reddit and Tiktok link fixer
+# -----------------------------
+class LinkFixer(commands.Cog, name="Links"):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.rewriter = LinkRewriter()
+        # Suppresses embeds and posts the fixed links, batched per channel
+        self.replies = LinkReplyQueue()
+
+    async def cog_unload(self):
+        self.replies.close()
+
+    async def fix_links(self, message: discord.Message) -> bool:
+        """Queue a reply with fixed versions of any supported links; returns whether the message had any."""
+        # Config lookups are in-memory; see GuildConfigStore
+        config = self.bot.guild_configs.get(message.guild.id if message.guild else None)
+        fixed_links = self.rewriter.rewrite(message.content, config.link_providers)
+        if not fixed_links:
+            return False
+
+        debug_sampled(log, "links.found", "Queueing fixed links", message_id=message.id, links=len(fixed_links))
+        for link in fixed_links:
+            LINK_REWRITES.inc(provider=link.provider)
+        self.replies.submit(message, fixed_links)
+        return True
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(LinkFixer(bot))
@@ -0,0 +1,202 @@
+import asyncio
+import io
+import logging
+import time
+from typing import Literal, Optional
+
+import aiohttp
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from jobs import QueueFull
+from media_io import AUTOPLAY_FORMATS, JobFiles, MediaInput, MEDIA_SPOOL_THRESHOLD, MEDIA_TMP_DIR, sniff_format
+from metrics import timed, COMMAND_SECONDS, COMMAND_ERRORS, MEDIA_DISK_BYTES, MEDIA_JOB_SECONDS, MEDIA_OUTPUTS
+
+MAX_SIZE = 25 * 1024 * 1024  # 25MB limit
+GIF_JOB_TIMEOUT = 14 * 60  # Interaction tokens expire after 15 minutes
+OutputFormat = Literal["auto", "gif", "webp", "mp4"]
+
+log = logging.getLogger("kwakinji.media")
+
+
+def gif_size_limit(guild: Optional[discord.Guild], config) -> int:
+    # Boosted servers allow bigger uploads; a guild's config can lower the limit further
+    limit = guild.filesize_limit if guild else MAX_SIZE
+    return min(limit, config.gif_max_bytes) if config.gif_max_bytes else limit
+
+
+def is_convertible(attachment: discord.Attachment) -> bool:
+    return bool(attachment.content_type) and attachment.content_type.startswith(('video', 'image'))
+
+
+class MediaCommands(commands.Cog, name="Media"):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.media_jobs = bot.media_jobs
+        self.gif_cache = bot.gif_cache
+        self.spool_threshold = MEDIA_SPOOL_THRESHOLD
+        self.scratch_dir = MEDIA_TMP_DIR
+        self._session = None  # Streams uploads over the spool threshold straight to disk
+
+    async def cog_unload(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=GIF_JOB_TIMEOUT))
+        return self._session
+
+    async def convert(self, attachment: discord.Attachment, target_size: int,
+                      output: str = "auto") -> tuple[bytes, str] | None:
+        """Media job shared by !gif and /gif; returns (data, format) under `target_size`, or None if nothing fits.
+
+        With `output` "auto" every format Discord autoplays is encoded at once and the smallest wins,
+        so only the winner ever needs shrinking. Any other value forces that format; mp4 only applies
+        to videos.
+        """
+        # Pillow only gets imported once someone actually converts something
+        from media import VideoSource, convert_video, image_to_animation_sync, fit_animation_sync
+
+        is_video = attachment.content_type.startswith('video')
+        if output == "auto" or (output == "mp4" and not is_video):
+            formats = AUTOPLAY_FORMATS
+        else:
+            formats = (output,)
+
+        start = time.perf_counter()
+        # Every job gets its own scratch directory, gone when the job ends, even if it's cancelled
+        with JobFiles(self.scratch_dir) as files:
+            try:
+                session = self._get_session() if attachment.size > self.spool_threshold else None
+                media = await MediaInput.fetch(attachment, files, self.spool_threshold, session)
+
+                # Same bytes + same settings always produce the same result, so repeat requests skip the pipeline
+                cache_key = await asyncio.to_thread(self.gif_cache.key, media.source, video=is_video,
+                                                    target_size=target_size, output=output)
+                cached = await self.gif_cache.get(cache_key, media.size)
+                if cached is not None:
+                    return cached, sniff_format(cached)
+
+                if is_video:
+                    # Probe once, then stream the upload through one ffmpeg per format
+                    source = await VideoSource(media).probe()
+
+                async def encode(fmt):
+                    if is_video:
+                        return await convert_video(source, fmt, target_size)
+                    return await self.media_jobs.run_cpu(image_to_animation_sync, media.source, fmt)
+
+                results = await asyncio.gather(*(encode(fmt) for fmt in formats), return_exceptions=True)
+                candidates = sorted(
+                    (len(data), fmt, data) for fmt, data in zip(formats, results) if not isinstance(data, Exception)
+                )
+                if not candidates:
+                    raise results[0]
+
+                # Smallest first; a bigger format is only shrunk if the smaller ones couldn't be made to fit
+                for _, fmt, data in candidates:
+                    if len(data) > target_size:
+                        data = await self.media_jobs.run_cpu(fit_animation_sync, data, fmt, target_size)
+                    if data is not None:
+                        MEDIA_OUTPUTS.inc(format=fmt)
+                        await self.gif_cache.put(cache_key, data, fmt)
+                        return data, fmt
+                return None
+            finally:
+                elapsed = time.perf_counter() - start
+                MEDIA_DISK_BYTES.observe(files.bytes_written)
+                MEDIA_JOB_SECONDS.observe(elapsed)
+                log.debug("Media job finished", extra={"input_bytes": attachment.size, "output": output,
+                                                       "seconds": round(elapsed, 3), "disk_bytes": files.bytes_written})
+
+    # -----------------------------
+    # !gif Command (prefix)
+    # -----------------------------
+    @commands.command(name="gif")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="gif")
+    async def gif_prefix(self, ctx, output: OutputFormat = "auto"):
+        if not ctx.message.attachments:
+            await ctx.send("❌ Please attach a video or image to convert.")
+            return
+
+        attachment = ctx.message.attachments[0]
+        if not is_convertible(attachment):
+            await ctx.send("❌ Unsupported file type.")
+            return
+
+        limit = gif_size_limit(ctx.guild, self.bot.guild_configs.get(ctx.guild.id if ctx.guild else None))
+        processing_msg = await ctx.send("⏳ Processing your file, please wait...")
+
+        async def on_queued(position):
+            await processing_msg.edit(content=f"⏳ You are #{position} in line, please wait...")
+
+        try:
+            result = await self.media_jobs.run(
+                ctx.author.id, ctx.guild.id if ctx.guild else None,
+                self.convert, attachment, limit, output,
+                on_queued=on_queued, timeout=GIF_JOB_TIMEOUT
+            )
+
+            if result is None:
+                await processing_msg.edit(content="❌ The result is still too large to upload to Discord.")
+            else:
+                data, fmt = result
+                await processing_msg.delete()
+                await ctx.send(file=discord.File(io.BytesIO(data), filename=f"output.{fmt}"))
+
+        except QueueFull as e:
+            await processing_msg.edit(content=f"❌ {e}")
+        except asyncio.TimeoutError:
+            await processing_msg.edit(content="❌ Conversion took too long and was cancelled.")
+        except Exception as e:
+            log.exception("gif job failed", extra={"user_id": ctx.author.id})
+            try:
+                await processing_msg.edit(content=f"❌ An error occurred: {e}")
+            except discord.NotFound:
+                await ctx.send(f"❌ An error occurred: {e}")
+
+    # -----------------------------
+    # /gif Command (slash)
+    # -----------------------------
+    @app_commands.command(name="gif", description="Convert an image or video to GIF")
+    @app_commands.describe(output="auto sends the smallest format Discord plays inline (WebP or GIF); gif always sends a GIF")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="gif")
+    async def gif_slash(self, interaction: discord.Interaction, file: discord.Attachment, output: OutputFormat = "auto"):
+        if not is_convertible(file):
+            await interaction.response.send_message("❌ Unsupported file type.", ephemeral=True)
+            return
+
+        limit = gif_size_limit(interaction.guild, self.bot.guild_configs.get(interaction.guild_id))
+        await interaction.response.defer()
+
+        async def on_queued(position):
+            await interaction.edit_original_response(content=f"⏳ You are #{position} in line, please wait...")
+
+        try:
+            result = await self.media_jobs.run(
+                interaction.user.id, interaction.guild_id,
+                self.convert, file, limit, output,
+                on_queued=on_queued, timeout=GIF_JOB_TIMEOUT
+            )
+
+            if result is None:
+                await interaction.edit_original_response(content="❌ The result is still too large to upload to Discord.")
+            else:
+                data, fmt = result
+                await interaction.edit_original_response(
+                    content=None, attachments=[discord.File(io.BytesIO(data), filename=f"output.{fmt}")]
+                )
+
+        except QueueFull as e:
+            await interaction.edit_original_response(content=f"❌ {e}")
+        except asyncio.TimeoutError:
+            await interaction.edit_original_response(content="❌ Conversion took too long and was cancelled.")
+        except Exception as e:
+            log.exception("gif job failed", extra={"user_id": interaction.user.id})
+            await interaction.edit_original_response(content=f"❌ An error occurred: {e}")
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(MediaCommands(bot), guild=bot.home_guild)
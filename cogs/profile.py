@@ -0,0 +1,95 @@
+from typing import Optional
+
+import discord
+from discord import app_commands, Embed, Color, Member
+from discord.ext import commands
+
+from member_cache import resolve_member
+
+# Badge emojis for visual flair
+BADGE_EMOJIS = {
+    "Discord Staff": "🛡️",
+    "Partnered Server Owner": "🤝",
+    "Bug Hunter": "🐛",
+    "HypeSquad Bravery": "🦁",
+    "HypeSquad Brilliance": "💡",
+    "HypeSquad Balance": "⚖️",
+    "Early Supporter": "🌟",
+    "Verified Bot": "🤖",
+    "Early Verified Bot Developer": "👨‍💻"
+}
+
+def get_user_badges(member: Member):
+    badges = []
+    flags = member.public_flags
+
+    # Use getattr to avoid AttributeErrors if flag doesn't exist
+    if getattr(flags, "staff", False): badges.append("Discord Staff")
+    if getattr(flags, "partner", False): badges.append("Partnered Server Owner")
+    if getattr(flags, "bug_hunter", False): badges.append("Bug Hunter")
+    if getattr(flags, "hypesquad_bravery", False): badges.append("HypeSquad Bravery")
+    if getattr(flags, "hypesquad_brilliance", False): badges.append("HypeSquad Brilliance")
+    if getattr(flags, "hypesquad_balance", False): badges.append("HypeSquad Balance")
+    if getattr(flags, "early_supporter", False): badges.append("Early Supporter")
+    if getattr(flags, "verified_bot", False): badges.append("Verified Bot")
+    if getattr(flags, "verified_developer", False): badges.append("Early Verified Bot Developer")
+
+    return badges if badges else ["None"]
+
+async def fetch_assets_embed(member: Member) -> Embed:
+    embed = Embed(
+        title=f"✨ Profile Assets — {member.display_name}",
+        color=Color.blurple()
+    )
+    embed.set_thumbnail(url=member.display_avatar.url)
+
+    # Avatar Decoration (simulate using top role color)
+    deco_color = member.top_role.color if member.top_role.name != "@everyone" else Color.default()
+    embed.add_field(name="Avatar Decoration", value=f"Role Color: {deco_color}", inline=False)
+
+    # Profile Effects (simulated using badges)
+    badges = get_user_badges(member)
+    badge_display = " ".join([BADGE_EMOJIS.get(b, b) for b in badges])
+    embed.add_field(name="HypeSquad House", value=badge_display, inline=False)
+
+    # Nameplate (simulated using top role name)
+    nameplate = member.top_role.name if member.top_role.name != "@everyone" else "No Pronouns"
+    embed.add_field(name="Pronouns", value=nameplate, inline=False)
+
+    # Roles
+    roles = [r.mention for r in member.roles if r.name != "@everyone"]
+    embed.add_field(name="Roles", value=", ".join(roles) if roles else "None", inline=False)
+
+    # Account creation date
+    embed.add_field(name="Account Created", value=member.created_at.strftime("%d %b %Y, %H:%M:%S UTC"), inline=False)
+
+    return embed
+
+
+# -----------------------------
+# Assets Command
+# -----------------------------
+class ProfileCommands(commands.Cog, name="Profile"):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @commands.command(name="profile")
+    async def assets(self, ctx, member: Optional[discord.Member] = None):
+        if member is None:
+            member = ctx.author
+        embed = await fetch_assets_embed(member)
+        await ctx.send(embed=embed)
+
+    @app_commands.command(
+        name="profile",
+        description="Show a user's Discord profile with badges, roles, and simulated effects"
+    )
+    async def assets_slash(self, interaction: discord.Interaction, member: Optional[discord.Member] = None):
+        if member is None:
+            member = await resolve_member(interaction.guild, interaction.user)
+        embed = await fetch_assets_embed(member)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(ProfileCommands(bot), guild=bot.home_guild)
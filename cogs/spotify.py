@@ -0,0 +1,402 @@
+import asyncio
+import io
+import logging
+from typing import Literal, Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from member_cache import resolve_member
+from metrics import timed, EVENT_SECONDS, COMMAND_SECONDS, COMMAND_ERRORS
+from np_card import CARD_AVATAR_SIZE, NowPlayingCard
+
+log = logging.getLogger("kwakinji.spotify")
+
+NP_CARD_FILENAME = "np.jpg"
+
+# -----------------------------
+# Spotify NP helpers
+# -----------------------------
+def create_progress_bar(progress, duration, length=10):
+    filled_blocks = int(progress / duration * length)
+    if filled_blocks > length - 1:
+        filled_blocks = length - 1
+    bar = "▬" * filled_blocks + "🔘" + "▬" * (length - filled_blocks - 1)
+    return bar
+
+
+class NowPlaying:
+    """The lookups behind one /np embed, kept per live embed so updates only redo them on a new track."""
+    __slots__ = ("member", "track_id", "profile_url", "artist")
+
+    def __init__(self, member, track_id: str, profile_url: Optional[str], artist):
+        self.member = member
+        self.track_id = track_id
+        self.profile_url = profile_url
+        self.artist = artist  # (name, url) from the Spotify API, or None to fall back to the activity
+
+
+# -----------------------------
+# Guild-wide "who's listening" helpers
+# -----------------------------
+LISTENING_TRACKS_PER_PAGE = 5  # Keeps a page well under the 4096-char description limit
+LISTENING_NAMES_PER_TRACK = 5
+
+
+class PageView(discord.ui.View):
+    """Previous/next buttons flipping through a list of embeds."""
+
+    def __init__(self, embeds, timeout: float = 180):
+        super().__init__(timeout=timeout)
+        self.embeds = embeds
+        self.page = 0
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page == len(self.embeds) - 1
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embeds[self.page], view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+
+PROFILE_LINK_PREFIX = "https://open.spotify.com/user/"
+INVALID_PROFILE_LINK = "❌ Please provide a valid Spotify profile link.\nExample: `https://open.spotify.com/user/yourid`"
+
+
+def listener_name(guild: discord.Guild, member_id: int, profile_url: Optional[str]) -> str:
+    # Uncached members (lean member cache mode) are shown as mentions, which Discord renders as
+    # names inside embeds without pinging anyone
+    member = guild.get_member(member_id)
+    if member is None:
+        return f"<@{member_id}> [🔗]({profile_url})" if profile_url else f"<@{member_id}>"
+    return f"[{member.display_name}]({profile_url})" if profile_url else member.display_name
+
+
+class SpotifyCommands(commands.Cog, name="Spotify"):
+    """Spotify profiles, /np and /listening, plus the presence listeners that keep the listener index current."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.spotify = bot.spotify
+        self.profiles = bot.profiles
+        self.listener_index = bot.listener_index
+        self.live_embeds = bot.live_embeds
+        self.np_cards = bot.np_cards
+
+    # --- Presence tracking ---
+    async def index_guild(self, g: discord.Guild):
+        """Index the members already listening in `g` and preload their Spotify profiles."""
+        self.listener_index.rebuild(g)
+        try:
+            found = await self.profiles.preload([m.id for m in g.members])
+            log.info("Preloaded %d Spotify profiles", found, extra={"guild_id": g.id})
+        except Exception:
+            log.exception("Error preloading Spotify profiles", extra={"guild_id": g.id})
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.bot.lean_members:
+            return  # No member cache to index or preload from; both fill in as members show up
+        for g in self.bot.guilds:
+            await self.index_guild(g)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        # Guilds joined (or back from an outage) after startup; the ones there at startup are
+        # dispatched before on_ready, which indexes them all at once
+        if self.bot.is_ready() and not self.bot.lean_members:
+            await self.index_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        await self.on_guild_join(guild)
+
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        # Presence updates may have been missed while disconnected; lean mode catches up from the
+        # next presence updates instead
+        if self.bot.lean_members:
+            return
+        for g in self.bot.guilds:
+            self.listener_index.rebuild(g)
+
+    @commands.Cog.listener()
+    @timed(EVENT_SECONDS, event="on_presence_update")
+    async def on_presence_update(self, before, after):
+        if not after.bot:
+            self.listener_index.update(after)
+            self.live_embeds.notify(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    @timed(EVENT_SECONDS, event="on_raw_presence_update")
+    async def on_raw_presence_update(self, payload):
+        # Only dispatched in lean member cache mode, where on_presence_update never fires
+        if payload.guild_id is not None and payload.user_id != self.bot.user.id:
+            self.listener_index.update_activities(payload.guild_id, payload.user_id, payload.activities)
+            self.live_embeds.notify(payload.guild_id, payload.user_id)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        self.listener_index.remove(payload.guild_id, payload.user.id)
+
+    # --- Embeds ---
+    async def lookup_np(self, member, record) -> NowPlaying:
+        profile_url = await self.profiles.get(member.id)
+        artist = await self.spotify.get_artist_from_track(record.track_id)
+        return NowPlaying(member, record.track_id, profile_url, artist)
+
+    def build_np_embed(self, np: NowPlaying, record, live: bool = False, card: bool = False) -> discord.Embed:
+        """With `card`, the embed shows the attached card image instead of album art and a progress bar."""
+        member = np.member
+        track_url = f"https://open.spotify.com/track/{record.track_id}"
+        artist_name, artist_url = np.artist or (record.artist, track_url)
+        progress = min((discord.utils.utcnow() - record.start).total_seconds(), record.duration.total_seconds())
+        duration = record.duration.total_seconds()
+        progress_bar = create_progress_bar(progress, duration)
+        progress_time = f"{int(progress)//60}:{int(progress)%60:02d}"
+        duration_time = f"{int(duration)//60}:{int(duration)%60:02d}"
+        timestamps = f"`{progress_time}/{duration_time}`"
+
+        description = f"[**{record.title}**]({track_url})\n\n[**{artist_name}**]({artist_url}) • {record.album}"
+        embed = discord.Embed(
+            description=description if card else f"{description}\n\n{progress_bar} {timestamps}",
+            color=0x1DB954
+        )
+        if card:
+            embed.set_image(url=f"attachment://{NP_CARD_FILENAME}")
+        else:
+            embed.set_thumbnail(url=record.album_cover_url)
+        embed.set_author(
+            name=f"Now Playing – {member.display_name}",
+            url=np.profile_url or track_url,
+            icon_url=member.avatar.url if member.avatar else member.default_avatar.url
+        )
+        others = self.listener_index.count_track(member.guild.id, record.track_id) - 1
+        footer = f"Requested by {member.display_name}"
+        if others:
+            footer += f" • 🎧 {others} other{'s' if others != 1 else ''} listening"
+        if live:
+            footer += " • 🔴 Live"
+        embed.set_footer(text=footer)
+        return embed
+
+    # --- Live /np ---
+    async def render_live_np(self, live) -> discord.Embed:
+        """LiveEmbedScheduler renderer: progress from the listener index, lookups only on a new track."""
+        np = live.data
+        record = self.listener_index.record(live.guild_id, live.member_id)
+        if record is None:
+            live.final = True
+            return discord.Embed(description=f"⏹️ {np.member.display_name} stopped listening.", color=0x1DB954)
+        if record.track_id != np.track_id:
+            # Only mark the track handled once its artist is in; a failed lookup is retried next edit
+            artist = await self.spotify.get_artist_from_track(record.track_id)
+            np.track_id, np.artist = record.track_id, artist
+        return self.build_np_embed(np, record, live=not live.final)
+
+    async def render_card(self, member, record) -> Optional[discord.File]:
+        """The /np card image, or None (and the plain embed is sent) if rendering failed.
+
+        Needs only the presence, so it runs alongside the profile and artist lookups.
+        """
+        progress = min((discord.utils.utcnow() - record.start).total_seconds(), record.duration.total_seconds())
+        card = NowPlayingCard(
+            record.title, ", ".join(record.artists), record.album, progress, record.duration.total_seconds(),
+            member.display_name, record.album_cover_url, member.display_avatar.with_size(CARD_AVATAR_SIZE).url,
+        )
+        try:
+            data = await self.np_cards.render(card)
+        except Exception:
+            log.exception("Error rendering /np card")
+            return None
+        return discord.File(io.BytesIO(data), filename=NP_CARD_FILENAME)
+
+    async def send_np(self, member, send, live: bool, card: bool = False):
+        """Shared by !np and /np; `send(embed, file)` posts the embed and returns the message to keep live.
+
+        Card images are a snapshot, so a card is never live.
+        """
+        record = self.listener_index.record(member.guild.id, member.id)
+        if record is None:
+            return False
+        if card:
+            np, file = await asyncio.gather(self.lookup_np(member, record), self.render_card(member, record))
+        else:
+            np, file = await self.lookup_np(member, record), None
+        live = live and not card and self.live_embeds.has_room
+        message = await send(self.build_np_embed(np, record, live=live, card=file is not None), file)
+        if live:
+            self.live_embeds.register(message, member.guild.id, member.id, self.render_live_np, np)
+        return True
+
+    def group_listeners(self, guild: discord.Guild):
+        """Read the listener index; returns [(record, [member_ids])] with the most listened track first."""
+        groups = [
+            (self.listener_index.record(guild.id, next(iter(member_ids))), list(member_ids))
+            for _, member_ids in self.listener_index.tracks(guild.id)
+        ]
+        return sorted(groups, key=lambda group: len(group[1]), reverse=True)
+
+    async def generate_listening_embeds(self, guild: discord.Guild) -> list:
+        groups = self.group_listeners(guild)
+        if not groups:
+            return []
+
+        # One batched Spotify lookup for every distinct track and one profile query for every listener
+        tracks, links = await asyncio.gather(
+            self.spotify.get_tracks(record.track_id for record, _ in groups),
+            self.profiles.get_many(member_id for _, member_ids in groups for member_id in member_ids),
+        )
+
+        total_listeners = sum(len(member_ids) for _, member_ids in groups)
+        pages = [groups[i:i + LISTENING_TRACKS_PER_PAGE] for i in range(0, len(groups), LISTENING_TRACKS_PER_PAGE)]
+        embeds = []
+        for page_number, page in enumerate(pages, start=1):
+            lines = []
+            for record, member_ids in page:
+                track_url = f"https://open.spotify.com/track/{record.track_id}"
+                artist = self.spotify.artist_of(tracks.get(record.track_id))
+                artist_name, artist_url = artist or (record.artist, track_url)
+
+                names = [listener_name(guild, member_id, links.get(member_id)) for member_id in member_ids[:LISTENING_NAMES_PER_TRACK]]
+                if len(member_ids) > LISTENING_NAMES_PER_TRACK:
+                    names.append(f"+{len(member_ids) - LISTENING_NAMES_PER_TRACK} more")
+                lines.append(
+                    f"[**{record.title}**]({track_url}) • [{artist_name}]({artist_url})\n"
+                    f"🎧 {len(member_ids)} — {', '.join(names)}"
+                )
+
+            embed = discord.Embed(
+                title=f"🎶 Listening now in {guild.name}",
+                description="\n\n".join(lines),
+                color=0x1DB954
+            )
+            embed.set_footer(text=f"{total_listeners} listening • {len(groups)} tracks • Page {page_number}/{len(pages)}")
+            embeds.append(embed)
+        return embeds
+
+    # --- Spotify profile commands ---
+    @commands.command(name="setspotify")
+    async def set_spotify(self, ctx, link: str):
+        if not link.startswith(PROFILE_LINK_PREFIX):
+            await ctx.send(INVALID_PROFILE_LINK)
+            return
+        await self.profiles.set(ctx.author.id, link)
+        await ctx.send(f"✅ Saved your Spotify profile link, {ctx.author.display_name}!")
+
+    @app_commands.command(name="setspotify", description="Register your Spotify profile")
+    async def setspotify_slash(self, interaction: discord.Interaction, link: str):
+        if not link.startswith(PROFILE_LINK_PREFIX):
+            await interaction.response.send_message(INVALID_PROFILE_LINK, ephemeral=True)
+            return
+        await self.profiles.set(interaction.user.id, link)
+        await interaction.response.send_message(f"✅ Saved your Spotify profile link, {interaction.user.display_name}!", ephemeral=True)
+
+    @commands.command(name="removespotify")
+    async def remove_spotify(self, ctx):
+        if await self.profiles.delete(ctx.author.id):
+            await ctx.send(f"🗑️ Removed your Spotify profile link, {ctx.author.display_name}.")
+        else:
+            await ctx.send("❌ You don't have a Spotify profile link saved.")
+
+    @app_commands.command(name="removespotify", description="Remove your Spotify profile")
+    async def removespotify_slash(self, interaction: discord.Interaction):
+        if await self.profiles.delete(interaction.user.id):
+            await interaction.response.send_message(f"🗑️ Removed your Spotify profile link, {interaction.user.display_name}.", ephemeral=True)
+        else:
+            await interaction.response.send_message("❌ You don't have a Spotify profile link saved.", ephemeral=True)
+
+    @commands.command(name="myspotify")
+    async def my_spotify(self, ctx):
+        link = await self.profiles.get(ctx.author.id)
+        if link:
+            await ctx.send(f"🎶 Your Spotify profile link: {link}")
+        else:
+            await ctx.send("❌ You haven't registered a Spotify profile link yet. Use `!setspotify <link>`.")
+
+    @app_commands.command(name="myspotify", description="View your registered Spotify profile")
+    async def myspotify_slash(self, interaction: discord.Interaction):
+        link = await self.profiles.get(interaction.user.id)
+        if link:
+            await interaction.response.send_message(f"🎶 Your Spotify profile link: {link}", ephemeral=True)
+        else:
+            await interaction.response.send_message("❌ You haven't registered a Spotify profile link yet. Use `/setspotify <link>`.", ephemeral=True)
+
+    # --- Now Playing ---
+    @commands.command(name="np")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="np")
+    async def now_playing(self, ctx, member: Optional[discord.Member] = None,
+                          mode: Optional[Literal["live", "card"]] = None):
+        if member is None:
+            member = await resolve_member(ctx.guild, ctx.author)
+
+        async def send(embed, file):
+            return await ctx.send(embed=embed, file=file)
+
+        if not await self.send_np(member, send, live=mode == "live", card=mode == "card"):
+            await ctx.send(f"❌ {member.display_name} is not listening to Spotify right now.")
+
+    @app_commands.command(name="np", description="Show what someone is listening to on Spotify")
+    @app_commands.describe(live="Keep the progress bar and track up to date for a few minutes",
+                           card="Show it as an image card with album art (not live)")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="np")
+    async def now_playing_slash(self, interaction: discord.Interaction, member: Optional[discord.Member] = None,
+                                live: bool = False, card: bool = False):
+        member = await resolve_member(interaction.guild, member or interaction.user)
+        if card and self.listener_index.record(member.guild.id, member.id) is not None:
+            # A cold card downloads art and an avatar, which can outlast the 3s to respond
+            await interaction.response.defer()
+
+        async def send(embed, file):
+            if interaction.response.is_done():
+                return await interaction.followup.send(embed=embed, **({"file": file} if file else {}))
+            await interaction.response.send_message(embed=embed)
+            return await interaction.original_response() if live else None
+
+        if not await self.send_np(member, send, live, card):
+            message = f"❌ {member.display_name} is not listening to Spotify right now."
+            if interaction.response.is_done():
+                await interaction.followup.send(message, ephemeral=True)
+            else:
+                await interaction.response.send_message(message, ephemeral=True)
+
+    # --- Listening ---
+    @commands.command(name="listening")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="listening")
+    async def listening(self, ctx):
+        if ctx.guild is None:
+            return
+        embeds = await self.generate_listening_embeds(ctx.guild)
+        if not embeds:
+            await ctx.send("❌ Nobody is listening to Spotify right now.")
+            return
+        await ctx.send(embed=embeds[0], view=PageView(embeds) if len(embeds) > 1 else None)
+
+    @app_commands.command(name="listening", description="See what everyone in the server is listening to on Spotify")
+    @timed(COMMAND_SECONDS, COMMAND_ERRORS, command="listening")
+    async def listening_slash(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        embeds = await self.generate_listening_embeds(interaction.guild)
+        if not embeds:
+            await interaction.followup.send("❌ Nobody is listening to Spotify right now.")
+            return
+        if len(embeds) > 1:
+            await interaction.followup.send(embed=embeds[0], view=PageView(embeds))
+        else:
+            await interaction.followup.send(embed=embeds[0])
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(SpotifyCommands(bot), guild=bot.home_guild)
@@ -0,0 +1,46 @@
+import hashlib
+import json
+import os
+
+# -----------------------------
+# Fingerprinted command-tree sync
+# -----------------------------
+# tree.sync() is rate limited and slow, and the commands only change when we deploy new code, so we
+# keep a hash of what was last synced and skip the call when nothing changed.
+COMMAND_TREE_HASH_FILE = os.environ.get("COMMAND_TREE_HASH_FILE", "./.command_tree_hash.json")
+
+
+def tree_fingerprint(tree, guild=None) -> str:
+    """sha256 of the payload Discord would receive for `guild` (or the global commands)."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+                     key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _load_hashes(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_hashes(path: str, hashes: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+async def sync_if_changed(tree, guild=None, path: str = COMMAND_TREE_HASH_FILE, force: bool = False):
+    """Sync `tree` unless it matches the last successful sync; returns the synced commands, or None if skipped."""
+    key = f"{tree.client.application_id}:{guild.id if guild else 'global'}"
+    fingerprint = tree_fingerprint(tree, guild)
+    hashes = _load_hashes(path)
+    if not force and hashes.get(key) == fingerprint:
+        return None
+
+    synced = await tree.sync(guild=guild)
+    hashes[key] = fingerprint
+    _save_hashes(path, hashes)
+    return synced
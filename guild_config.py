@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from typing import NamedTuple
+
+from metrics import EXTERNAL_SECONDS, timed
+from profile_store import SupabaseTable
+
+# -----------------------------
+# Per-guild configuration
+# -----------------------------
+CONFIG_REFRESH_INTERVAL = 5 * 60  # Picks up changes made by other shard processes
+CONFIG_CHUNK_SIZE = 200
+
+log = logging.getLogger("kwakinji.supabase")
+
+
+class GuildConfig(NamedTuple):
+    welcome_channel_id: int | None = None  # No welcome message when unset
+    link_providers: frozenset | None = None  # LinkRule names to fix; None means all of them
+    gif_max_bytes: int | None = None  # Further caps the guild's upload limit for /gif output
+
+    @classmethod
+    def from_row(cls, row: dict) -> "GuildConfig":
+        providers = row.get("link_providers")
+        return cls(
+            welcome_channel_id=int(row["welcome_channel_id"]) if row.get("welcome_channel_id") else None,
+            link_providers=frozenset(providers) if providers is not None else None,
+            gif_max_bytes=row.get("gif_max_bytes"),
+        )
+
+    def to_row(self) -> dict:
+        return {
+            "welcome_channel_id": self.welcome_channel_id,
+            "link_providers": sorted(self.link_providers) if self.link_providers is not None else None,
+            "gif_max_bytes": self.gif_max_bytes,
+        }
+
+
+DEFAULT_CONFIG = GuildConfig()
+
+
+class ConfigUnavailable(Exception):
+    pass
+
+
+class SupabaseGuildConfigBackend(SupabaseTable):
+    """guild_configs table access (guild_id bigint primary key, welcome_channel_id bigint,
+    link_providers text[], gif_max_bytes bigint).
+    """
+
+    table = "guild_configs"
+
+    def _fetch_many(self, guild_ids):
+        response = self.supabase.table(self.table).select("*").in_("guild_id", guild_ids).execute()
+        return {int(row['guild_id']): GuildConfig.from_row(row) for row in response.data}
+
+    def _upsert(self, guild_id, config):
+        self.supabase.table(self.table).upsert({"guild_id": guild_id, **config.to_row()}).execute()
+
+    @timed(EXTERNAL_SECONDS, service="supabase", call="select_guild_config")
+    async def fetch_many(self, guild_ids) -> dict:
+        return await asyncio.to_thread(self._fetch_many, list(guild_ids))
+
+    @timed(EXTERNAL_SECONDS, service="supabase", call="upsert_guild_config")
+    async def upsert(self, guild_id: int, config: GuildConfig):
+        await asyncio.to_thread(self._upsert, guild_id, config)
+
+
+class MemoryGuildConfigBackend:
+    """Offline stand-in for SupabaseGuildConfigBackend."""
+
+    def __init__(self, rows: dict | None = None):
+        self.rows = dict(rows or {})
+        self.queries = 0
+
+    async def fetch_many(self, guild_ids) -> dict:
+        self.queries += 1
+        return {guild_id: self.rows[guild_id] for guild_id in guild_ids if guild_id in self.rows}
+
+    async def upsert(self, guild_id: int, config: GuildConfig):
+        self.queries += 1
+        self.rows[guild_id] = config
+
+
+class GuildConfigStore:
+    """In-memory copy of every connected guild's config.
+
+    `get` is a plain dict lookup for the hot paths (every message, every join): configs are loaded in
+    bulk on ready/guild join and refreshed in the background, never on demand. A guild that isn't
+    loaded yet gets its default until its background load lands.
+    """
+
+    def __init__(self, backend, defaults: dict | None = None):
+        self.backend = backend
+        self.defaults = dict(defaults or {})  # guild_id -> GuildConfig used when the guild has no row
+        self._configs = {}
+        self._loading = set()
+        self._update_lock = asyncio.Lock()
+        self._writes = 0
+        self._written = {}  # guild_id -> self._writes after its last update, so older loads don't undo it
+
+    def get(self, guild_id: int | None) -> GuildConfig:
+        config = self._configs.get(guild_id)
+        if config is not None:
+            return config
+        if guild_id is not None and guild_id not in self._loading:
+            self._loading.add(guild_id)
+            asyncio.get_running_loop().create_task(self._load_one(guild_id))
+        return self.defaults.get(guild_id, DEFAULT_CONFIG)
+
+    async def _load_one(self, guild_id: int):
+        try:
+            await self.load([guild_id])
+        except Exception as e:
+            # Serve the default until the next refresh rather than retrying on every message
+            self._configs.setdefault(guild_id, self.defaults.get(guild_id, DEFAULT_CONFIG))
+            log.warning("Error loading guild config: %s", e, extra={"guild_id": guild_id})
+        finally:
+            self._loading.discard(guild_id)
+
+    async def load(self, guild_ids) -> int:
+        """Bulk-(re)load configs for `guild_ids`; returns how many guilds have a stored config."""
+        guild_ids = list(dict.fromkeys(guild_ids))
+        found = 0
+        for i in range(0, len(guild_ids), CONFIG_CHUNK_SIZE):
+            chunk = guild_ids[i:i + CONFIG_CHUNK_SIZE]
+            started = self._writes
+            rows = await self.backend.fetch_many(chunk)
+            found += len(rows)
+            for guild_id in chunk:
+                if self._written.get(guild_id, 0) > started:
+                    continue  # Updated while this read was in flight; the update is newer
+                self._configs[guild_id] = rows.get(guild_id) or self.defaults.get(guild_id, DEFAULT_CONFIG)
+        return found
+
+    async def update(self, guild_id: int, **changes) -> GuildConfig:
+        """Apply `changes` to the guild's stored config and save it.
+
+        The stored row is read first rather than trusting the in-memory copy, which is the default
+        while the guild's load is pending or after it failed; saving that would wipe every other
+        setting. A change may be a callable taking the stored value and returning the new one.
+        Raises ConfigUnavailable, and saves nothing, if the stored row can't be read.
+        """
+        async with self._update_lock:
+            try:
+                rows = await self.backend.fetch_many([guild_id])
+            except Exception as e:
+                log.warning("Error loading guild config for update: %s", e, extra={"guild_id": guild_id})
+                raise ConfigUnavailable("Couldn't load this server's settings, so nothing was changed. "
+                                        "Try again in a minute.") from e
+            config = rows.get(guild_id) or self.defaults.get(guild_id, DEFAULT_CONFIG)
+            config = config._replace(**{
+                field: change(getattr(config, field)) if callable(change) else change
+                for field, change in changes.items()
+            })
+            await self.backend.upsert(guild_id, config)
+            self._writes += 1
+            self._written[guild_id] = self._writes
+            self._configs[guild_id] = config
+            return config
+
+    def forget(self, guild_id: int):
+        self._configs.pop(guild_id, None)
+        self._written.pop(guild_id, None)
+
+    def __len__(self):
+        return len(self._configs)
+
+    async def refresh_forever(self, guild_ids, interval: float = CONFIG_REFRESH_INTERVAL):
+        """Reload the configs of `guild_ids()` every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load(guild_ids())
+            except Exception as e:
+                log.warning("Error refreshing guild configs: %s", e)
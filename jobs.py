@@ -0,0 +1,131 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# -----------------------------
+# Media job scheduler
+# -----------------------------
+MEDIA_WORKERS = int(os.environ.get("MEDIA_WORKERS", max(1, min(2, os.cpu_count() or 1))))
+MEDIA_QUEUE_SIZE = 20
+MEDIA_JOBS_PER_USER = 2
+MEDIA_JOBS_PER_GUILD = 6
+
+
+class QueueFull(Exception):
+    pass
+
+
+class MediaJob:
+    __slots__ = ("user_id", "guild_id", "func", "args", "future", "task")
+
+    def __init__(self, user_id, guild_id, func, args):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.func = func
+        self.args = args
+        self.future = asyncio.get_running_loop().create_future()
+        self.task = None
+
+
+class MediaJobScheduler:
+    """Runs at most `workers` media jobs at once, queueing the rest FIFO with per-user/per-guild caps.
+
+    A job is a coroutine function; CPU-heavy steps inside it should go through `run_cpu`, which uses a
+    process pool sized to the worker count so each running job gets one process and the GIL is
+    never the bottleneck.
+    """
+
+    def __init__(self, workers: int = MEDIA_WORKERS, max_queue: int = MEDIA_QUEUE_SIZE,
+                 per_user: int = MEDIA_JOBS_PER_USER, per_guild: int = MEDIA_JOBS_PER_GUILD):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.per_guild = per_guild
+        self._pool = None
+        self._pending = deque()
+        self._running = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def active(self) -> int:
+        return len(self._running)
+
+    def _count(self, attr, value) -> int:
+        return sum(1 for job in (*self._pending, *self._running) if getattr(job, attr) == value)
+
+    def position(self, job: MediaJob) -> int:
+        """1-based place in line, or 0 once the job is running or finished."""
+        try:
+            return self._pending.index(job) + 1
+        except ValueError:
+            return 0
+
+    def submit(self, user_id, guild_id, func, *args) -> MediaJob:
+        if len(self._pending) >= self.max_queue:
+            raise QueueFull("The media queue is full, please try again in a minute.")
+        if self._count("user_id", user_id) >= self.per_user:
+            raise QueueFull(f"You already have {self.per_user} conversions in progress.")
+        if guild_id is not None and self._count("guild_id", guild_id) >= self.per_guild:
+            raise QueueFull("This server has too many conversions in progress, please try again soon.")
+
+        job = MediaJob(user_id, guild_id, func, args)
+        self._pending.append(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, job: MediaJob):
+        if job in self._pending:
+            self._pending.remove(job)
+        if job.task is not None:
+            job.task.cancel()
+        job.future.cancel()
+
+    def _dispatch(self):
+        while self._pending and len(self._running) < self.workers:
+            job = self._pending.popleft()
+            self._running.add(job)
+            job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: MediaJob):
+        try:
+            result = await job.func(*job.args)
+        except asyncio.CancelledError:
+            job.future.cancel()
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running.discard(job)
+            self._dispatch()
+
+    async def run(self, user_id, guild_id, func, *args, on_queued=None, timeout: float | None = None):
+        """Submit a job and wait for it; `on_queued(position)` is awaited if it has to wait in line."""
+        job = self.submit(user_id, guild_id, func, *args)
+        try:
+            position = self.position(job)
+            if position and on_queued is not None:
+                await on_queued(position)
+            return await asyncio.wait_for(asyncio.shield(job.future), timeout)
+        except BaseException:
+            self.cancel(job)
+            raise
+
+    async def run_cpu(self, func, *args):
+        """Run a picklable sync function in the worker process pool."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    def shutdown(self):
+        for job in list(self._pending):
+            self.cancel(job)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -1,18 +1,67 @@
-from flask import Flask
-from threading import Thread
+from aiohttp import web
 import os
+from metrics import registry
 
-app = Flask(__name__)
+# -----------------------------
+# In-loop health / metrics server
+# -----------------------------
+# Runs on the bot's own event loop, so a wedged loop means these endpoints stop answering and the
+# host's health check fails, which is exactly when we want to be restarted.
 
-@app.route('/')
-def home():
-    return "Bot is running!"
 
-def run():
-    port = int(os.environ.get("PORT", 10000))  # 🔥 required
-    app.run(host='0.0.0.0', port=port)
+class HealthServer:
+    """aiohttp server for `/`, `/metrics`, `/healthz` (liveness) and `/readyz` (readiness).
 
-def keep_alive():
-    t = Thread(target=run)
-    t.daemon = True  # 🔥 required
-    t.start()
+    Checks are callables returning `(ok, detail)`; every check must pass for a 200.
+    """
+
+    def __init__(self, port: int | None = None, live_checks: dict | None = None, ready_checks: dict | None = None):
+        self.port = port if port is not None else int(os.environ.get("PORT", 10000))  # 🔥 required
+        self.live_checks = live_checks or {}
+        self.ready_checks = ready_checks or {}
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get("/", self.home),
+            web.get("/metrics", self.metrics),
+            web.get("/healthz", self.healthz),
+            web.get("/readyz", self.readyz),
+        ])
+
+    async def home(self, request):
+        return web.Response(text="Bot is running!")
+
+    async def metrics(self, request):
+        return web.Response(body=registry.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    @staticmethod
+    def _report(checks: dict):
+        results = {}
+        healthy = True
+        for name, check in checks.items():
+            try:
+                ok, detail = check()
+            except Exception as e:
+                ok, detail = False, f"check raised {e!r}"
+            results[name] = {"ok": ok, "detail": detail}
+            healthy = healthy and ok
+        body = {"status": "ok" if healthy else "fail", "checks": results}
+        return web.json_response(body, status=200 if healthy else 503)
+
+    async def healthz(self, request):
+        return self._report(self.live_checks)
+
+    async def readyz(self, request):
+        return self._report({**self.live_checks, **self.ready_checks})
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "0.0.0.0", self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+from cache import TTLCache
+from logs import debug_sampled
+
+# -----------------------------
+# Per-channel outbound queue for link fixer replies
+# -----------------------------
+LINK_BATCH_WINDOW = 0.75  # Seconds to collect links from a channel before replying
+LINK_DEDUPE_TTL = 10 * 60  # A link fixed in a channel isn't fixed again there for this long
+LINK_DEDUPE_SIZE = 5000
+LINK_RETRIES = 3
+LINK_DEFAULT_RETRY_AFTER = 1.0
+MAX_MESSAGE_LENGTH = 2000
+
+log = logging.getLogger("kwakinji.links")
+
+
+def retry_after(error: discord.HTTPException) -> float:
+    """Seconds to wait after a 429, from the rate-limit headers Discord sent with it."""
+    headers = getattr(error.response, "headers", None) or {}
+    for header in ("Retry-After", "X-RateLimit-Reset-After"):
+        try:
+            return max(0.0, float(headers[header]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return LINK_DEFAULT_RETRY_AFTER
+
+
+def split_reply(lines, limit: int = MAX_MESSAGE_LENGTH) -> list:
+    """Join `lines` into as few messages as fit under Discord's length limit."""
+    chunks, current = [], ""
+    for line in lines:
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit and current:
+            chunks.append(current)
+            candidate = line
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ChannelQueue:
+    __slots__ = ("pending", "task", "blocked_until")
+
+    def __init__(self):
+        self.pending = []  # (message, [FixedLink]) waiting for the next flush
+        self.task = None
+        self.blocked_until = 0.0
+
+
+class LinkReplyQueue:
+    """Replies to fixed links per channel, in order and in batches.
+
+    The first message with links in an idle channel starts that channel's flusher. It waits
+    `window` seconds, then suppresses the embeds of every message collected so far while sending one
+    combined reply to the first of them. Links that arrive during a flush or a 429 backoff go into
+    the next batch, so a busy channel costs one reply per window instead of one per message.
+    Links already fixed in the channel within `dedupe_ttl` seconds are dropped from replies.
+    """
+
+    def __init__(self, *, window: float = LINK_BATCH_WINDOW, dedupe_ttl: float = LINK_DEDUPE_TTL,
+                 clock=time.monotonic, sleep=asyncio.sleep):
+        self.window = window
+        self.clock = clock
+        self.sleep = sleep
+        self._recent = TTLCache(maxsize=LINK_DEDUPE_SIZE, ttl=dedupe_ttl, clock=clock)  # (channel id, url)
+        self._channels = {}  # channel id -> ChannelQueue, only while it has work
+
+        self.replies = 0
+        self.duplicates = 0
+        self.rate_limited = 0
+
+    def submit(self, message: discord.Message, fixed_links) -> list:
+        """Queue a reply for `fixed_links` and the embed suppression; returns the links that weren't duplicates."""
+        channel_id = message.channel.id
+        fresh = []
+        for link in fixed_links:
+            if (channel_id, link.url) in self._recent:
+                self.duplicates += 1
+                continue
+            self._recent.set((channel_id, link.url), True)
+            fresh.append(link)
+
+        queue = self._channels.get(channel_id)
+        if queue is None:
+            self._channels[channel_id] = queue = ChannelQueue()
+        # Duplicates still get their embed suppressed; they just aren't replied to again
+        queue.pending.append((message, fresh))
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._run(channel_id, queue))
+        return fresh
+
+    async def _run(self, channel_id: int, queue: ChannelQueue):
+        try:
+            while queue.pending:
+                await self.sleep(self.window)
+                blocked_for = queue.blocked_until - self.clock()
+                if blocked_for > 0:
+                    await self.sleep(blocked_for)
+                batch, queue.pending = queue.pending, []
+                await self._flush(queue, batch)
+        finally:
+            queue.task = None
+            if self._channels.get(channel_id) is queue:
+                del self._channels[channel_id]
+
+    async def _flush(self, queue: ChannelQueue, batch: list):
+        links = [link for _, message_links in batch for link in message_links]
+        calls = [self._suppress(queue, message) for message, _ in batch]
+        if links:
+            reply_to = next(message for message, message_links in batch if message_links)
+            calls.append(self._reply(queue, reply_to, links))
+        await asyncio.gather(*calls)
+
+    async def _call(self, queue: ChannelQueue, request):
+        """Await `request()`, waiting out and retrying 429s; other errors propagate."""
+        for attempt in range(LINK_RETRIES):
+            try:
+                return await request()
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt == LINK_RETRIES - 1:
+                    raise
+                self.rate_limited += 1
+                delay = retry_after(e)
+                queue.blocked_until = max(queue.blocked_until, self.clock() + delay)
+                await self.sleep(delay)
+
+    async def _suppress(self, queue: ChannelQueue, message: discord.Message):
+        try:
+            await self._call(queue, lambda: message.edit(suppress=True))
+            debug_sampled(log, "links.suppress", "Suppressed embeds", message_id=message.id)
+        except discord.Forbidden:
+            log.warning("No permission to suppress embeds; check 'Manage Messages'", extra={"channel_id": message.channel.id})
+        except discord.NotFound:
+            log.info("Message deleted before its embeds were suppressed", extra={"message_id": message.id})
+        except Exception:
+            log.exception("Error suppressing embeds", extra={"message_id": message.id})
+
+    async def _reply(self, queue: ChannelQueue, message: discord.Message, links: list):
+        for n, content in enumerate(split_reply(link.markdown() for link in links)):
+            try:
+                if n == 0:
+                    await self._call(queue, lambda: message.reply(content, mention_author=False))
+                else:
+                    await self._call(queue, lambda: message.channel.send(content))
+                self.replies += 1
+            except Exception:
+                log.exception("Could not send fixed links", extra={"channel_id": message.channel.id})
+                return
+
+    async def drain(self):
+        """Wait until every queued reply has been sent."""
+        while self._channels:
+            await asyncio.gather(*(queue.task for queue in list(self._channels.values()) if queue.task))
+
+    def close(self):
+        for queue in self._channels.values():
+            if queue.task is not None:
+                queue.task.cancel()
+        self._channels.clear()
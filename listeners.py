@@ -0,0 +1,151 @@
+import discord
+
+# -----------------------------
+# Presence-driven Spotify listener index
+# -----------------------------
+class ListenerRecord:
+    """What one member is playing right now.
+
+    Only the fields the embeds use are copied out of the discord.Spotify activity, so the index
+    doesn't pin the raw presence payload; in lean member cache mode this is all we keep per member.
+    """
+    __slots__ = ("member_id", "track_id", "title", "artists", "album", "album_cover_url", "start", "end")
+
+    def __init__(self, member_id: int, activity: discord.Spotify):
+        self.member_id = member_id
+        self.track_id = activity.track_id
+        self.title = activity.title
+        self.artists = tuple(activity.artists)
+        self.album = activity.album
+        self.album_cover_url = activity.album_cover_url
+        self.set_timestamps(activity)
+
+    def set_timestamps(self, activity: discord.Spotify):
+        self.start = activity.start
+        self.end = activity.end
+
+    @property
+    def artist(self) -> str:
+        return "; ".join(self.artists)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class GuildListeners:
+    __slots__ = ("records", "by_track", "by_artist", "by_album")
+
+    def __init__(self):
+        self.records = {}  # member_id -> ListenerRecord
+        self.by_track = {}  # track_id -> {member_id}
+        self.by_artist = {}  # artist name -> {member_id}
+        self.by_album = {}  # album name -> {member_id}
+
+
+def _add(index: dict, key, member_id: int):
+    members = index.get(key)
+    if members is None:
+        index[key] = members = set()
+    members.add(member_id)
+
+
+def _discard(index: dict, key, member_id: int):
+    members = index.get(key)
+    if members is not None:
+        members.discard(member_id)
+        if not members:
+            del index[key]
+
+
+class ListenerIndex:
+    """Maps track, artist and album to the members listening right now, per guild.
+
+    Kept current from presence updates so "who else is listening" is a dict lookup instead of a
+    scan over every member.
+    """
+
+    def __init__(self):
+        self._guilds = {}  # guild_id -> GuildListeners
+        self.updates = 0
+
+    def _guild(self, guild_id: int) -> GuildListeners:
+        listeners = self._guilds.get(guild_id)
+        if listeners is None:
+            self._guilds[guild_id] = listeners = GuildListeners()
+        return listeners
+
+    def remove(self, guild_id: int, member_id: int):
+        listeners = self._guilds.get(guild_id)
+        if listeners is None:
+            return
+        record = listeners.records.pop(member_id, None)
+        if record is None:
+            return
+        _discard(listeners.by_track, record.track_id, member_id)
+        for artist in record.artists:
+            _discard(listeners.by_artist, artist, member_id)
+        _discard(listeners.by_album, record.album, member_id)
+
+    def update(self, member: discord.Member):
+        """Apply a member's current activities (call from on_presence_update)."""
+        self.update_activities(member.guild.id, member.id, member.activities)
+
+    def update_activities(self, guild_id: int, member_id: int, activities):
+        """Apply a member's current activities by ID (call from on_raw_presence_update)."""
+        self.updates += 1
+        activity = next((a for a in activities if isinstance(a, discord.Spotify)), None)
+        listeners = self._guild(guild_id)
+        record = listeners.records.get(member_id)
+
+        if activity is None:
+            if record is not None:
+                self.remove(guild_id, member_id)
+            return
+        if record is not None and record.track_id == activity.track_id:
+            record.set_timestamps(activity)  # Same song, e.g. seek or pause; only the timestamps change
+            return
+
+        if record is not None:
+            self.remove(guild_id, member_id)
+        record = ListenerRecord(member_id, activity)
+        listeners.records[member_id] = record
+        _add(listeners.by_track, record.track_id, member_id)
+        for artist in record.artists:
+            _add(listeners.by_artist, artist, member_id)
+        _add(listeners.by_album, record.album, member_id)
+
+    def rebuild(self, guild: discord.Guild):
+        self._guilds.pop(guild.id, None)
+        for member in guild.members:
+            if not member.bot:
+                self.update(member)
+
+    def record(self, guild_id: int, member_id: int) -> ListenerRecord | None:
+        listeners = self._guilds.get(guild_id)
+        return listeners.records.get(member_id) if listeners else None
+
+    def _lookup(self, guild_id: int, index: str, key) -> frozenset:
+        listeners = self._guilds.get(guild_id)
+        if listeners is None:
+            return frozenset()
+        return frozenset(getattr(listeners, index).get(key, ()))
+
+    def listeners_of_track(self, guild_id: int, track_id: str) -> frozenset:
+        return self._lookup(guild_id, "by_track", track_id)
+
+    def listeners_of_artist(self, guild_id: int, artist: str) -> frozenset:
+        return self._lookup(guild_id, "by_artist", artist)
+
+    def listeners_of_album(self, guild_id: int, album: str) -> frozenset:
+        return self._lookup(guild_id, "by_album", album)
+
+    def count_track(self, guild_id: int, track_id: str) -> int:
+        listeners = self._guilds.get(guild_id)
+        return len(listeners.by_track.get(track_id, ())) if listeners else 0
+
+    def tracks(self, guild_id: int):
+        """Yield (track_id, member_ids) for every track someone in the guild is playing."""
+        listeners = self._guilds.get(guild_id)
+        if listeners is not None:
+            yield from listeners.by_track.items()
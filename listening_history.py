@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import discord
+
+from metrics import EXTERNAL_SECONDS, timed
+from profile_store import SupabaseTable
+
+# -----------------------------
+# Spotify listening history
+# -----------------------------
+HISTORY_DB = os.environ.get("HISTORY_DB", "./listening_history.sqlite3")
+HISTORY_FLUSH_INTERVAL = 10.0
+HISTORY_BATCH_SIZE = 1000  # Flush early once this many plays are buffered
+HISTORY_REPEAT_TOLERANCE = 15  # A track starting again within this many seconds of its end is a new play
+HISTORY_IDLE_EXPIRY = 60 * 60  # Forget a member's current play this long after it ended
+HISTORY_BACKLOG = 100_000  # Plays kept for retrying while storage is failing; oldest are dropped first
+HISTORY_REMOTE_CHUNK = 500
+TOP_LIMIT = 10
+
+log = logging.getLogger("kwakinji.spotify")
+
+
+class Play(NamedTuple):
+    user_id: int
+    guild_id: int
+    track_id: str
+    title: str
+    artists: tuple
+    started_at: float
+    first: bool  # First guild this play was seen in; only these count toward the member's own totals
+
+
+class CurrentPlay:
+    __slots__ = ("track_id", "end", "guilds")
+
+    def __init__(self, track_id: str, end: float, guild_id: int):
+        self.track_id = track_id
+        self.end = end
+        self.guilds = {guild_id}
+
+
+class SQLiteHistoryStore:
+    """Append-only play log plus per-member and per-guild play counters in one SQLite file.
+
+    The counters are updated in the same transaction as the log. A top list is therefore one
+    indexed read, however many plays there are. Calls block; ListeningHistory runs them in a
+    worker thread.
+    """
+
+    SCHEMA = """
+        PRAGMA journal_mode = WAL;
+        PRAGMA synchronous = NORMAL;
+        CREATE TABLE IF NOT EXISTS plays (
+            user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL, track_id TEXT NOT NULL,
+            started_at REAL NOT NULL, first INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tracks (track_id TEXT PRIMARY KEY, title TEXT, artist TEXT);
+        CREATE TABLE IF NOT EXISTS user_tracks (
+            user_id INTEGER, track_id TEXT, plays INTEGER, PRIMARY KEY (user_id, track_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS user_artists (
+            user_id INTEGER, artist TEXT, plays INTEGER, PRIMARY KEY (user_id, artist)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS guild_tracks (
+            guild_id INTEGER, track_id TEXT, plays INTEGER, PRIMARY KEY (guild_id, track_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS guild_artists (
+            guild_id INTEGER, artist TEXT, plays INTEGER, PRIMARY KEY (guild_id, artist)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS user_tracks_top ON user_tracks (user_id, plays DESC);
+        CREATE INDEX IF NOT EXISTS user_artists_top ON user_artists (user_id, plays DESC);
+        CREATE INDEX IF NOT EXISTS guild_tracks_top ON guild_tracks (guild_id, plays DESC);
+        CREATE INDEX IF NOT EXISTS guild_artists_top ON guild_artists (guild_id, plays DESC);
+    """
+    # (rollup table, owner column, key column)
+    ROLLUPS = (
+        ("user_tracks", "user_id", "track_id"),
+        ("user_artists", "user_id", "artist"),
+        ("guild_tracks", "guild_id", "track_id"),
+        ("guild_artists", "guild_id", "artist"),
+    )
+
+    def __init__(self, path: str = HISTORY_DB):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Shard processes share the file; WAL lets them read while one writes
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def write(self, plays):
+        """Append `plays` to the log and add them to the counters, in one transaction."""
+        counts = {table: Counter() for table, _, _ in self.ROLLUPS}
+        tracks = {}
+        for play in plays:
+            tracks[play.track_id] = (play.title, "; ".join(play.artists))
+            counts["guild_tracks"][play.guild_id, play.track_id] += 1
+            for artist in play.artists:
+                counts["guild_artists"][play.guild_id, artist] += 1
+            if play.first:
+                counts["user_tracks"][play.user_id, play.track_id] += 1
+                for artist in play.artists:
+                    counts["user_artists"][play.user_id, artist] += 1
+
+        with self._lock, self.conn as conn:
+            conn.executemany(
+                "INSERT INTO plays VALUES (?, ?, ?, ?, ?)",
+                [(p.user_id, p.guild_id, p.track_id, p.started_at, p.first) for p in plays],
+            )
+            conn.executemany(
+                "INSERT INTO tracks VALUES (?, ?, ?) ON CONFLICT (track_id) DO UPDATE "
+                "SET title = excluded.title, artist = excluded.artist",
+                [(track_id, title, artist) for track_id, (title, artist) in tracks.items()],
+            )
+            for table, owner, key in self.ROLLUPS:
+                conn.executemany(
+                    f"INSERT INTO {table} VALUES (?, ?, ?) ON CONFLICT ({owner}, {key}) DO UPDATE "
+                    "SET plays = plays + excluded.plays",
+                    [(owner_id, value, n) for (owner_id, value), n in counts[table].items()],
+                )
+
+    def top_tracks(self, *, user_id: int | None = None, guild_id: int | None = None,
+                   limit: int = TOP_LIMIT) -> list:
+        """[(title, artist, plays)] for a member (across guilds) or a guild, most played first."""
+        table, owner_id = ("user_tracks", user_id) if user_id is not None else ("guild_tracks", guild_id)
+        owner = "user_id" if user_id is not None else "guild_id"
+        with self._lock:
+            return self.conn.execute(
+                f"SELECT t.title, t.artist, r.plays FROM {table} r JOIN tracks t USING (track_id) "
+                f"WHERE r.{owner} = ? ORDER BY r.plays DESC LIMIT ?",
+                (owner_id, limit),
+            ).fetchall()
+
+    def top_artists(self, *, user_id: int | None = None, guild_id: int | None = None,
+                    limit: int = TOP_LIMIT) -> list:
+        """[(artist, plays)] for a member (across guilds) or a guild, most played first."""
+        table, owner_id = ("user_artists", user_id) if user_id is not None else ("guild_artists", guild_id)
+        owner = "user_id" if user_id is not None else "guild_id"
+        with self._lock:
+            return self.conn.execute(
+                f"SELECT artist, plays FROM {table} WHERE {owner} = ? ORDER BY plays DESC LIMIT ?",
+                (owner_id, limit),
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SupabaseHistoryBackend(SupabaseTable):
+    """Optional mirror of the play log in a spotify_plays table (user_id bigint, guild_id bigint,
+    track_id text, title text, artists text[], started_at timestamptz, primary key (user_id,
+    guild_id, started_at)); the primary key makes retried batches harmless.
+    """
+
+    table = "spotify_plays"
+
+    def _upsert_many(self, plays):
+        rows = [{
+            "user_id": p.user_id,
+            "guild_id": p.guild_id,
+            "track_id": p.track_id,
+            "title": p.title,
+            "artists": list(p.artists),
+            "started_at": datetime.fromtimestamp(p.started_at, timezone.utc).isoformat(),
+        } for p in plays]
+        for i in range(0, len(rows), HISTORY_REMOTE_CHUNK):
+            self.supabase.table(self.table).upsert(
+                rows[i:i + HISTORY_REMOTE_CHUNK], on_conflict="user_id,guild_id,started_at"
+            ).execute()
+
+    @timed(EXTERNAL_SECONDS, service="supabase", call="upsert_plays")
+    async def upsert_many(self, plays):
+        await asyncio.to_thread(self._upsert_many, plays)
+
+
+class ListeningHistory:
+    """Records Spotify plays from presence updates and answers top artist/track queries.
+
+    A member sends a presence update for every seek, pause and restart, once per guild the bot
+    shares with them. All of those collapse into one play. A play only counts again once the
+    previous one has (nearly) ended. Plays are buffered and written in one batch every
+    `flush_interval` seconds, sooner once `batch_size` pile up, so presence traffic never waits on
+    storage. With a `remote` backend each batch is also bulk-upserted there.
+    """
+
+    def __init__(self, store: SQLiteHistoryStore, remote: SupabaseHistoryBackend | None = None, *,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL, batch_size: int = HISTORY_BATCH_SIZE,
+                 repeat_tolerance: float = HISTORY_REPEAT_TOLERANCE, clock=time.time):
+        self.store = store
+        self.remote = remote
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.repeat_tolerance = repeat_tolerance
+        self.clock = clock
+        self._current = {}  # user_id -> CurrentPlay
+        self._pending = []  # Plays not written to the store yet
+        self._remote_pending = []  # Plays written locally but not to the remote yet
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        self.plays = 0
+        self.duplicates = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def observe(self, guild_id: int, user_id: int, activities):
+        """Apply a member's current activities (call from the presence listeners)."""
+        activity = next((a for a in activities if isinstance(a, discord.Spotify)), None)
+        if activity is None:
+            return  # Pausing clears the activity; resuming the same track continues the same play
+        now = self.clock()
+        start = activity.start.timestamp() if activity.start else now
+        end = activity.end.timestamp() if activity.end else start
+        self.record(guild_id, user_id, activity.track_id, activity.title, tuple(activity.artists), start, end)
+
+    def record(self, guild_id: int, user_id: int, track_id: str, title: str, artists: tuple,
+               start: float, end: float):
+        current = self._current.get(user_id)
+        if current is not None and current.track_id == track_id and start < current.end - self.repeat_tolerance:
+            # A seek, pause, restart, or the same play seen from another guild
+            current.end = max(current.end, end)
+            if guild_id in current.guilds:
+                self.duplicates += 1
+                return
+            current.guilds.add(guild_id)
+            first = False
+        else:
+            self._current[user_id] = CurrentPlay(track_id, end, guild_id)
+            first = True
+
+        self.plays += first
+        self._pending.append(Play(user_id, guild_id, track_id, title, artists, start, first))
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    def _requeue(self, backlog: list, plays: list) -> list:
+        backlog = plays + backlog
+        if len(backlog) > HISTORY_BACKLOG:
+            self.dropped += len(backlog) - HISTORY_BACKLOG
+            backlog = backlog[-HISTORY_BACKLOG:]
+        return backlog
+
+    async def flush(self) -> int:
+        """Write buffered plays to the store (and remote); returns how many were written locally."""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            self._full.clear()
+            if batch:
+                try:
+                    await asyncio.to_thread(self.store.write, batch)
+                except Exception:
+                    self._pending = self._requeue(self._pending, batch)
+                    raise
+                if self.remote is not None:
+                    self._remote_pending.extend(batch)
+
+            if self.remote is not None and self._remote_pending:
+                remote, self._remote_pending = self._remote_pending, []
+                try:
+                    await self.remote.upsert_many(remote)
+                except Exception as e:
+                    self._remote_pending = self._requeue(self._remote_pending, remote)
+                    logging.getLogger("kwakinji.supabase").warning(
+                        "Error uploading listening history: %s", e, extra={"pending": len(self._remote_pending)})
+
+            now = self.clock()
+            expired = [user_id for user_id, current in self._current.items() if current.end < now - HISTORY_IDLE_EXPIRY]
+            for user_id in expired:
+                del self._current[user_id]
+            return len(batch)
+
+    async def run_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Error writing listening history")
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            self.store.close()
+
+    async def _catch_up(self):
+        """Write the buffer before a query so it includes plays from the last few seconds."""
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("Error writing listening history")
+
+    async def top_tracks(self, *, user_id: int | None = None, guild_id: int | None = None,
+                         limit: int = TOP_LIMIT) -> list:
+        await self._catch_up()
+        return await asyncio.to_thread(self.store.top_tracks, user_id=user_id, guild_id=guild_id, limit=limit)
+
+    async def top_artists(self, *, user_id: int | None = None, guild_id: int | None = None,
+                          limit: int = TOP_LIMIT) -> list:
+        await self._catch_up()
+        return await asyncio.to_thread(self.store.top_artists, user_id=user_id, guild_id=guild_id, limit=limit)
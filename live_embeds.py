@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+
+import discord
+
+# -----------------------------
+# Live-updating embeds
+# -----------------------------
+LIVE_TICK = 1.0  # Seconds between scheduler passes
+LIVE_UPDATE_INTERVAL = 15  # Seconds between progress updates of one embed
+LIVE_LIFETIME = 10 * 60  # Interaction tokens expire after 15 minutes, so stop well before that
+LIVE_MAX = 500
+LIVE_EDITS_PER_TICK = 20  # Stays well under Discord's global 50 requests/s
+LIVE_CHANNEL_INTERVAL = 1.0  # Message edits share a 5 per 5s bucket per channel
+LIVE_ERROR_BACKOFF = 30.0
+LIVE_MAX_FAILURES = 3  # Consecutive failed edits before an embed is given up on (e.g. its token expired)
+IN_FLIGHT = math.inf  # due_at while an edit is running, so a notify during it schedules another
+
+log = logging.getLogger("kwakinji.spotify")
+
+
+class LiveEmbed:
+    """One message kept up to date by the scheduler.
+
+    `render(live)` is awaited for every edit and returns the new embed; it may set `live.final` to
+    make that edit the last one. `data` belongs to the renderer (e.g. lookups cached per track).
+    """
+    __slots__ = ("message", "channel_id", "guild_id", "member_id", "render", "data",
+                 "expires_at", "due_at", "final", "edits", "failures")
+
+    def __init__(self, message, guild_id: int, member_id: int, render, data, expires_at: float):
+        self.message = message
+        self.channel_id = message.channel.id
+        self.guild_id = guild_id
+        self.member_id = member_id
+        self.render = render
+        self.data = data
+        self.expires_at = expires_at
+        self.due_at = None
+        self.final = False
+        self.edits = 0
+        self.failures = 0  # Consecutive failed edits
+
+
+class LiveEmbedScheduler:
+    """Edits every live embed from a single task.
+
+    Embeds wait in a heap ordered by when they are next due. Each pass edits at most
+    `edits_per_tick` of them, at most one per channel every `channel_interval` seconds; anything
+    over budget stays due and goes first next pass, so bursts are spread out rather than dropped.
+    `notify` pulls an embed forward (e.g. on a track change) and repeated notifies before its edit
+    coalesce into one. Embeds get a final edit when they expire or their renderer says so, and are
+    dropped after `max_failures` failed edits in a row or a failed edit past their lifetime.
+    """
+
+    def __init__(self, *, interval: float = LIVE_UPDATE_INTERVAL, lifetime: float = LIVE_LIFETIME,
+                 max_live: int = LIVE_MAX, edits_per_tick: int = LIVE_EDITS_PER_TICK,
+                 channel_interval: float = LIVE_CHANNEL_INTERVAL, tick: float = LIVE_TICK,
+                 max_failures: int = LIVE_MAX_FAILURES, clock=time.monotonic, sleep=asyncio.sleep):
+        self.interval = interval
+        self.lifetime = lifetime
+        self.max_live = max_live
+        self.edits_per_tick = edits_per_tick
+        self.channel_interval = channel_interval
+        self.tick_interval = tick
+        self.max_failures = max_failures
+        self.clock = clock
+        self.sleep = sleep
+        self._live = {}  # message id -> LiveEmbed
+        self._by_member = {}  # (guild_id, member_id) -> {message id}
+        self._heap = []  # (due_at, seq, LiveEmbed); entries whose due_at no longer matches are stale
+        self._seq = itertools.count()
+        self._channel_ready = {}  # channel id -> earliest time of its next edit
+
+        self.edits = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self._live)
+
+    @property
+    def has_room(self) -> bool:
+        return len(self._live) < self.max_live
+
+    def register(self, message, guild_id: int, member_id: int, render, data=None) -> LiveEmbed | None:
+        """Start updating `message`; returns None when already tracking `max_live` embeds."""
+        now = self.clock()
+        # One live embed per member per channel: a newer /np replaces the older one
+        for message_id in list(self._by_member.get((guild_id, member_id), ())):
+            old = self._live[message_id]
+            if old.channel_id == message.channel.id:
+                self.finish(old)
+        if len(self._live) >= self.max_live:
+            return None
+
+        live = LiveEmbed(message, guild_id, member_id, render, data, now + self.lifetime)
+        self._live[message.id] = live
+        self._by_member.setdefault((guild_id, member_id), set()).add(message.id)
+        self._schedule(live, now + self.interval)
+        return live
+
+    def notify(self, guild_id: int, member_id: int):
+        """The member's activity changed; refresh their live embeds as soon as the limits allow."""
+        message_ids = self._by_member.get((guild_id, member_id))
+        if not message_ids:
+            return
+        now = self.clock()
+        for message_id in message_ids:
+            live = self._live[message_id]
+            if live.due_at > now:
+                self._schedule(live, now)
+
+    def finish(self, live: LiveEmbed):
+        """Give `live` one last edit (render sees `final` set) and stop tracking it."""
+        live.final = True
+        self._schedule(live, self.clock())
+
+    def _schedule(self, live: LiveEmbed, due_at: float):
+        live.due_at = due_at
+        heapq.heappush(self._heap, (due_at, next(self._seq), live))
+
+    def _drop(self, live: LiveEmbed):
+        if self._live.pop(live.message.id, None) is None:
+            return
+        live.due_at = None
+        key = (live.guild_id, live.member_id)
+        message_ids = self._by_member[key]
+        message_ids.discard(live.message.id)
+        if not message_ids:
+            del self._by_member[key]
+
+    async def tick(self) -> int:
+        """One pass: make every edit that is due and allowed; returns how many were made."""
+        now = self.clock()
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.edits_per_tick:
+            due_at, _, live = heapq.heappop(self._heap)
+            if live.due_at != due_at:
+                continue  # Rescheduled or dropped since this entry was pushed
+            if now >= live.expires_at:
+                live.final = True
+            ready_at = self._channel_ready.get(live.channel_id, 0)
+            if ready_at > now:
+                self._schedule(live, ready_at)
+                continue
+            self._channel_ready[live.channel_id] = now + self.channel_interval
+            live.due_at = IN_FLIGHT
+            batch.append(live)
+
+        if batch:
+            await asyncio.gather(*(self._edit(live) for live in batch))
+        if len(self._channel_ready) > 2 * len(self._live) + 100:
+            self._channel_ready = {k: v for k, v in self._channel_ready.items() if v > now}
+        return len(batch)
+
+    async def _edit(self, live: LiveEmbed):
+        done = False
+        try:
+            embed = await live.render(live)
+            done = live.final  # Expired, finished, or the renderer decided this is the last edit
+            await live.message.edit(embed=embed)
+            live.edits += 1
+            live.failures = 0
+            self.edits += 1
+        except (discord.NotFound, discord.Forbidden):
+            done = True  # Message deleted or channel locked; nothing left to update
+        except Exception as e:
+            self.errors += 1
+            live.failures += 1
+            now = self.clock()
+            self._channel_ready[live.channel_id] = now + LIVE_ERROR_BACKOFF
+            # A 401 once the interaction token expires never clears up, and retrying an expired
+            # embed only keeps it counting against max_live
+            done = live.failures >= self.max_failures or now >= live.expires_at
+            log.warning("Error updating live embed: %s", e,
+                        extra={"message_id": live.message.id, "failures": live.failures, "dropped": done})
+
+        if done:
+            self._drop(live)
+        elif live.due_at == IN_FLIGHT:
+            self._schedule(live, min(self.clock() + self.interval, live.expires_at))
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                log.exception("Error in live embed scheduler")
+            await self.sleep(self.tick_interval)
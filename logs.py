@@ -0,0 +1,207 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from metrics import LOG_RECORDS_DROPPED
+
+# -----------------------------
+# Queued, sampled structured logging
+# -----------------------------
+# Handlers only put records on a queue. One listener thread formats them and does the actual
+# writes, so a slow or blocked stderr never stalls the event loop. When the queue is full, records
+# are dropped and counted in bot_log_records_dropped_total; handlers never wait.
+#
+# Loggers are per subsystem under "kwakinji": kwakinji.links, .spotify, .media and .supabase, plus
+# "kwakinji" itself for the bot core. Structured fields go in `extra=` and are written as
+# key=value pairs, or as JSON keys with LOG_FORMAT=json.
+#
+#   LOG_LEVEL=INFO                        # the default
+#   LOG_LEVEL=INFO,links=DEBUG            # per logger; short names are under "kwakinji."
+#   LOG_LEVEL=DEBUG,discord=WARNING
+#   LOG_SAMPLE=message=100,links.suppress=1   # keep one in N of these debug events
+#
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "text" or "json"
+LOG_SAMPLE = os.environ.get("LOG_SAMPLE", "")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10_000))
+# High-volume debug events and how many of each to skip between kept records; LOG_SAMPLE overrides
+DEFAULT_SAMPLE_RATES = {"message": 100, "links.found": 10, "links.suppress": 10}
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+
+def parse_levels(spec: str) -> dict:
+    """"INFO,links=DEBUG" -> {"": INFO, "kwakinji.links": DEBUG}; "" is the root logger."""
+    levels = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, level = part.rpartition("=")
+        if name and name != "discord" and not name.startswith(("discord.", "kwakinji")):
+            name = f"kwakinji.{name}"
+        levels[name] = logging.getLevelName(level.upper())
+        if not isinstance(levels[name], int):
+            raise ValueError(f"unknown log level {level!r} in {spec!r}")
+    return levels
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """"message=100,links.found=1" -> {"message": 100, "links.found": 1}, over the defaults."""
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        event, _, every = part.partition("=")
+        rates[event] = max(1, int(every))
+    return rates
+
+
+def record_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRIBUTES}
+
+
+class TextFormatter(logging.Formatter):
+    """discord.py's layout, with the record's structured fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__("[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            first, newline, rest = line.partition("\n")  # Keep tracebacks below the fields
+            line = first + "".join(f" {k}={v}" for k, v in fields.items()) + newline + rest
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, the structured fields, and exc if any."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Puts records on a queue as they are and drops them once `max_size` are waiting.
+
+    The stock QueueHandler formats the message and copies the record before queueing it, so
+    records can cross a process boundary. This queue stays in-process, so all formatting
+    is left to the listener thread. Log immutable values (ids, numbers, strings), not objects
+    that may change before the record is written.
+    """
+
+    def __init__(self, max_size: int = LOG_QUEUE_SIZE):
+        super().__init__(queue.SimpleQueue())
+        self.max_size = max_size
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        # A SimpleQueue is several times cheaper to put to than a locking queue.Queue; bound it by hand
+        if self.queue.qsize() < self.max_size:
+            self.queue.put_nowait(record)
+        else:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class Sampler:
+    """Keeps the first of every `rates[event]` calls per event; events without a rate are all kept."""
+
+    def __init__(self, rates: dict):
+        self.rates = rates
+        self._counts = {}
+
+    def __call__(self, event: str) -> int:
+        """The rate if this call should be logged, else 0."""
+        every = self.rates.get(event, 1)
+        if every == 1:
+            return 1
+        n = self._counts.get(event, 0)
+        self._counts[event] = n + 1 if n + 1 < every else 0
+        return every if n == 0 else 0
+
+
+sampler = Sampler(parse_sample_rates(LOG_SAMPLE))
+
+
+def debug_sampled(logger: logging.Logger, event: str, msg: str, *args, **fields):
+    """Log a high-volume debug event, keeping one in every LOG_SAMPLE[event] calls.
+
+    Costs one level check while DEBUG is off. Kept records carry `event` and `sample` (the rate),
+    so counts can be scaled back up.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    every = sampler(event)
+    if every:
+        logger.debug(msg, *args, extra={"event": event, "sample": every, **fields})
+
+
+# -----------------------------
+# Setup
+# -----------------------------
+_listener: QueueListener | None = None
+_handler: DroppingQueueHandler | None = None
+_levels: dict = {}
+
+
+def setup_logging(levels: str = LOG_LEVEL, *, fmt: str = LOG_FORMAT, stream=None,
+                  sample: str | None = None, queue_size: int = LOG_QUEUE_SIZE) -> QueueListener:
+    """Route every logger through the queue to `stream` (stderr by default).
+
+    Calling it again replaces the previous setup, after writing out what that one had queued.
+    """
+    global _listener, _handler, _levels, sampler
+    stop_logging()
+    if sample is not None:
+        sampler = Sampler(parse_sample_rates(sample))
+
+    # Neither formatter writes the caller, thread or process, so skip collecting them for every
+    # record (the "Optimization" table in the logging HOWTO); about a third of a record's cost
+    logging._srcfile = None
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+    output = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    output.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    _handler = DroppingQueueHandler(queue_size)
+    _listener = QueueListener(_handler.queue, output)
+
+    for name in _levels:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    _levels = parse_levels(levels)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(_levels.get("", logging.INFO))
+    # discord.py's DEBUG output is every gateway payload; only show it when asked for by name
+    logging.getLogger("discord").setLevel(max(root.level, logging.INFO))
+    for name, level in _levels.items():
+        if name:
+            logging.getLogger(name).setLevel(level)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+# -----------------------------
+# Event-loop blocking detector
+# -----------------------------
+# A loop task bumps a heartbeat every `interval`; a watchdog thread notices when the heartbeat goes
+# stale, grabs the loop thread's stack while it is still blocked and attributes the stall to the
+# outermost bot handler on that stack.
+WATCHDOG_INTERVAL = 0.05
+WATCHDOG_THRESHOLD = float(os.environ.get("LOOP_WATCHDOG_THRESHOLD_MS", 250)) / 1000
+WATCHDOG_HISTORY = 50
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Project frames that only wrap handlers, so they're never "the" handler
+_WRAPPER_FILES = {os.path.join(_PROJECT_DIR, name) for name in ("metrics.py", "loop_watchdog.py")}
+
+
+class Stall:
+    """One period where the loop didn't run; `stack` is the innermost few frames at detection time."""
+    __slots__ = ("started", "duration", "handler", "blocking_frame", "stack")
+
+    def __init__(self, started: float, handler: str, blocking_frame: str, stack: list):
+        self.started = started
+        self.duration = 0.0
+        self.handler = handler
+        self.blocking_frame = blocking_frame
+        self.stack = stack
+
+
+def _describe(summary: traceback.FrameSummary) -> str:
+    if summary.filename.startswith(_PROJECT_DIR):
+        filename = os.path.relpath(summary.filename, _PROJECT_DIR)
+    else:
+        filename = os.path.basename(summary.filename)
+    return f"{filename}:{summary.lineno} in {summary.name}"
+
+
+class LoopWatchdog:
+    """Opt-in stall detector; costs one short sleep per `interval` on the loop and in one thread."""
+
+    def __init__(self, threshold: float = WATCHDOG_THRESHOLD, interval: float = WATCHDOG_INTERVAL,
+                 history: int = WATCHDOG_HISTORY):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=history)
+        self.by_handler = Counter()  # handler -> total stalled seconds
+        self.count_by_handler = Counter()
+
+        self._beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _capture(self, started: float) -> Stall | None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        stack = traceback.extract_stack(frame)
+        # Only look above the callback the loop is running, or `client.run()` in main.py would match
+        start = 0
+        for i, summary in enumerate(stack):
+            if summary.name == "_run" and summary.filename.endswith(os.path.join("asyncio", "events.py")):
+                start = i + 1
+        handler = "unknown"
+        for summary in stack[start:]:  # Outermost first
+            if summary.filename.startswith(_PROJECT_DIR) and summary.filename not in _WRAPPER_FILES:
+                handler = summary.name
+                break
+        return Stall(started, handler, _describe(stack[-1]), [_describe(s) for s in stack[-8:]])
+
+    def _watch(self):
+        stall = None
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            stale_for = time.monotonic() - beat
+            if stale_for >= self.threshold:
+                if stall is None:
+                    stall = self._capture(beat)
+            elif stall is not None:
+                # The heartbeat ran again; the stall lasted until just before it
+                stall.duration = max(0.0, beat - stall.started - self.interval)
+                self._record(stall)
+                stall = None
+
+    def _record(self, stall: Stall):
+        self.stalls.append(stall)
+        self.by_handler[stall.handler] += stall.duration
+        self.count_by_handler[stall.handler] += 1
+
+    def report(self, limit: int = 5) -> dict:
+        return {
+            "handlers": [
+                (handler, self.count_by_handler[handler], total)
+                for handler, total in self.by_handler.most_common(limit)
+            ],
+            "recent": list(self.stalls)[-limit:][::-1],
+        }
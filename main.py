@@ -1,26 +1,42 @@
+import time
+PROCESS_START = time.perf_counter()  # Before the other imports, so startup timings include them
+
 import discord
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
-from keep_alive import keep_alive
-import re
-import requests
-import base64
-import time
+from keep_alive import HealthServer
 from typing import Optional
-from supabase import create_client, Client as SupabaseClient
-from discord import Embed, Color, Member
-import io
-from moviepy.editor import VideoFileClip, ImageSequenceClip
-from PIL import Image,ImageSequence
 import asyncio
-import aiohttp
+import logging
+from cogs import EXTENSIONS
+from command_sync import sync_if_changed
+from guild_config import GuildConfig, GuildConfigStore, SupabaseGuildConfigBackend
+from sharding import parse_shard_ids, recommended_shard_count, run_shard_processes
+from spotify_api import SpotifyClient
+from profile_store import SpotifyProfileStore, SupabaseProfileBackend
+from jobs import MediaJobScheduler
+from result_cache import MediaResultCache
+from listeners import ListenerIndex
+from live_embeds import LiveEmbedScheduler
+from np_card import CardRenderer
+from listening_history import ListeningHistory, SQLiteHistoryStore, SupabaseHistoryBackend
+from member_cache import cache_options
+from loop_watchdog import LoopWatchdog
+from logs import debug_sampled, setup_logging
+from metrics import registry, timed, monitor_loop_lag, EVENT_SECONDS, LOOP_LAG_LAST, STARTUP_SECONDS
 
 # -----------------------------
 # Load environment variables
 # -----------------------------
 load_dotenv()
 
+# -----------------------------
+# Logging (see logs.py for LOG_LEVEL, LOG_FORMAT and LOG_SAMPLE)
+# -----------------------------
+setup_logging()
+log = logging.getLogger("kwakinji")
+
 # -----------------------------
 # Intents setup
 # -----------------------------
@@ -30,71 +46,108 @@ intents.members = True
 intents.presences = True  # Required for Spotify presence
 
 # -----------------------------
-# Twitter/X, Instagram, Reddit and Tiktok regex
-# -----------------------------
-twitter_regex = re.compile(r"https?://(?:www\.)?(x\.com|twitter\.com)/(\w+)/status/(\d+)")
-instagram_regex = re.compile(r"(https?://(www\.)?instagram\.com/\S+)")
-reddit_regex = re.compile(r"(https?://(www\.)?reddit\.com/\S+)")
-tiktok_regex = re.compile(r"https?://(?:www\.)?tiktok\.com/\S+")
-
-
-# -----------------------------
-# Supabase setup
+# Deployment mode
 # -----------------------------
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-supabase: SupabaseClient = create_client(url, key)
-
-# -----------------------------
-# Spotify API helper
-# -----------------------------
-SPOTIFY_TOKEN = None
-SPOTIFY_TOKEN_EXP = 0
-
-def get_spotify_token():
-    global SPOTIFY_TOKEN, SPOTIFY_TOKEN_EXP
-    if SPOTIFY_TOKEN and time.time() < SPOTIFY_TOKEN_EXP - 60:
-        return SPOTIFY_TOKEN
-
-    client_id = os.getenv("SPOTIFY_CLIENT_ID")
-    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-
-    auth_str = f"{client_id}:{client_secret}"
-    b64_auth = base64.b64encode(auth_str.encode()).decode()
-
-    headers = {"Authorization": f"Basic {b64_auth}"}
-    data = {"grant_type": "client_credentials"}
-
-    r = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
-    r.raise_for_status()
-    res = r.json()
-    SPOTIFY_TOKEN = res["access_token"]
-    SPOTIFY_TOKEN_EXP = time.time() + res["expires_in"]
-    return SPOTIFY_TOKEN
-
-def get_artist_from_track(track_id):
-    token = get_spotify_token()
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.get(f"https://api.spotify.com/v1/tracks/{track_id}", headers=headers)
-    r.raise_for_status()
-    res = r.json()
-    artist = res['artists'][0]
-    return artist['name'], artist['external_urls']['spotify']
+# By default the bot serves one home guild with guild-scoped commands. MULTI_GUILD=1 registers
+# commands globally and relies on per-guild config; SHARD_COUNT/SHARD_IDS switch to AutoShardedBot
+# and SHARD_PROCESSES>1 runs shard ranges in separate processes (see sharding.py).
+MULTI_GUILD = bool(os.getenv("MULTI_GUILD"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0)) or None
+SHARD_IDS = parse_shard_ids(os.getenv("SHARD_IDS"))
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", 1))
+SHARDED = bool(SHARD_COUNT or SHARD_IDS or SHARD_PROCESSES > 1)
+# Keep no discord.py member cache, only the Spotify listener index (see member_cache.py)
+LEAN_MEMBERS = bool(os.getenv("LEAN_MEMBER_CACHE"))
 
 # -----------------------------
 # Custom Bot Class
 # -----------------------------
-class Client(commands.Bot):
+class Client(commands.AutoShardedBot if SHARDED else commands.Bot):
+    """The bot core: lifecycle, welcome messages and the services the cogs in `cogs/` share.
+
+    Commands and feature listeners live in the extensions listed in `cogs.EXTENSIONS`. With no
+    `home_guild`, app commands are registered globally.
+    """
+    disconnected_since: Optional[float] = None
+
+    def __init__(self, *, home_guild: Optional[discord.abc.Snowflake], guild_configs: GuildConfigStore,
+                 spotify: SpotifyClient, profiles: SpotifyProfileStore, listener_index: ListenerIndex,
+                 live_embeds: LiveEmbedScheduler, history: ListeningHistory, np_cards: CardRenderer,
+                 media_jobs: MediaJobScheduler, gif_cache: MediaResultCache,
+                 loop_watchdog: Optional[LoopWatchdog] = None, lean_members: bool = False, **options):
+        super().__init__(**options, **cache_options(lean_members))
+        self.home_guild = home_guild
+        self.lean_members = lean_members
+        self.guild_configs = guild_configs
+        self.spotify = spotify
+        self.profiles = profiles
+        self.listener_index = listener_index
+        self.live_embeds = live_embeds
+        self.history = history
+        self.np_cards = np_cards
+        self.media_jobs = media_jobs
+        self.gif_cache = gif_cache
+        self.loop_watchdog = loop_watchdog
+
+    def mark_startup(self, stage: str):
+        """Record how long after process start `stage` was first reached."""
+        if STARTUP_SECONDS.get(-1, stage=stage) < 0:
+            elapsed = time.perf_counter() - PROCESS_START
+            STARTUP_SECONDS.set(elapsed, stage=stage)
+            log.info("Startup: %s after %.2fs", stage, elapsed)
+
+    async def load_extensions(self):
+        for extension in EXTENSIONS:
+            await self.load_extension(extension)
+
+    async def setup_hook(self):
+        self.lag_monitor = asyncio.create_task(monitor_loop_lag())
+        self.live_embed_ticker = asyncio.create_task(self.live_embeds.run_forever())
+        self.history_writer = asyncio.create_task(self.history.run_forever())
+        if self.loop_watchdog is not None:
+            self.loop_watchdog.start()
+        self.np_cards.start()
+        await health_server.start()
+        await self.load_extensions()
+
+        # setup_hook runs once per process (on_ready runs again on every reconnect), and the
+        # fingerprint skips the rate-limited sync entirely when no command definitions changed.
+        # Commands are per application, so only the process running shard 0 syncs them.
+        shard_ids = getattr(self, "shard_ids", None)
+        if shard_ids is None or 0 in shard_ids:
+            target = f"guild {self.home_guild.id}" if self.home_guild else "all guilds"
+            try:
+                synced = await sync_if_changed(self.tree, guild=self.home_guild, force=bool(os.getenv("FORCE_COMMAND_SYNC")))
+                if synced is None:
+                    log.info("Commands unchanged, skipped sync to %s", target)
+                else:
+                    log.info("Synced %d commands to %s", len(synced), target)
+            except Exception:
+                log.exception("Error syncing commands")
+        self.mark_startup("setup")
+
+    async def on_connect(self):
+        self.disconnected_since = None
+
+    async def on_disconnect(self):
+        if self.disconnected_since is None:
+            self.disconnected_since = time.monotonic()
+
     async def on_ready(self):
-        print(f'✅ Logged on as {self.user}!')
+        log.info("Logged on as %s", self.user)
+        self.mark_startup("ready")
         try:
-            guild = discord.Object(id=1379088766265856010)
-            synced = await self.tree.sync(guild=guild)
-            print(f'Synced {len(synced)} commands to guild {guild.id}')
-        except Exception as e:
-            print(f'Error syncing commands: {e}')
+            found = await self.guild_configs.load(g.id for g in self.guilds)
+            log.info("Loaded config for %d guilds (%d customised)", len(self.guilds), found)
+        except Exception:
+            log.exception("Error loading guild configs")
+        if not hasattr(self, "config_refresher"):
+            self.config_refresher = asyncio.create_task(
+                self.guild_configs.refresh_forever(lambda: [g.id for g in self.guilds])
+            )
         await self.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name="tripleS - Are you Alive"))
-        
+
+    @timed(EVENT_SECONDS, event="on_message")
     async def on_message(self, message):
         if message.author == self.user or message.author.bot:
             return
@@ -102,62 +155,46 @@ class Client(commands.Bot):
         if not message.content:
             return
 
-        print(f"DEBUG: Reading message from {message.author}: '{message.content}'")
+        self.mark_startup("first_event")
+        # Never the content itself; one in LOG_SAMPLE["message"] is kept at DEBUG
+        debug_sampled(log, "message", "Message received", guild_id=message.guild.id if message.guild else None,
+                      channel_id=message.channel.id, author_id=message.author.id, length=len(message.content))
 
         # --- Link processing ---
-        link_found = False
-        markdown_message = ""
-        
-        twitter_match = twitter_regex.search(message.content)
-        if twitter_match:
-            link_found = True
-            username = twitter_match.group(2)
-            original_link = twitter_match.group(0)
-            fixed_link = original_link.replace("x.com", "fixupx.com").replace("twitter.com", "fixupx.com")
-            markdown_message = f"[Twitter • @{username}]({fixed_link})"
-
-        insta_match = instagram_regex.search(message.content)
-        if not link_found and insta_match:
-            link_found = True
-            original_link = insta_match.group(1)
-            clean_link = original_link.split("?")[0]
-            fixed_link = clean_link.replace("instagram.com", "kkinstagram.com")
-            markdown_message = f"[Instagram]({fixed_link})"
-
-        reddit_match = reddit_regex.search(message.content)
-        if not link_found and reddit_match:
-            link_found = True
-            original_link = reddit_match.group(1)
-            fixed_link = original_link.replace("reddit.com", "rxddit.com")
-            markdown_message = f"[Reddit]({fixed_link})"
-
-        tiktok_match = tiktok_regex.search(message.content)
-        if not link_found and tiktok_match:
-            link_found = True
-            original_link = tiktok_match.group(0)
-            fixed_link = original_link.replace("tiktok.com", "tnktok.com")
-            markdown_message = f"[TikTok]({fixed_link})"
-
-        # --- Action Phase ---
-        if link_found:
-            print(f"DEBUG: Found link. Preparing to fix and reply.")
-            try:
-                await message.edit(suppress=True)
-                print(f"DEBUG: Successfully suppressed embed for message {message.id}")
-            except discord.Forbidden:
-                print(f"ERROR: No permission to suppress embeds in channel '{message.channel.name}'. Check 'Manage Messages' permission.")
-            except discord.NotFound:
-                print(f"ERROR: Could not find the message {message.id} to edit.")
-            except Exception as e:
-                print(f"ERROR: An unexpected error occurred while trying to edit message: {e}")
-
-            await message.reply(markdown_message, mention_author=False)
+        links = self.get_cog("Links")
+        if links is not None and await links.fix_links(message):
             return
 
         await self.process_commands(message)
 
+    async def on_interaction(self, interaction):
+        self.mark_startup("first_event")
+
+    async def on_resumed(self):
+        self.disconnected_since = None
+
+    async def on_guild_join(self, guild):
+        await self.guild_configs.load([guild.id])
+
+    async def on_guild_remove(self, guild):
+        self.guild_configs.forget(guild.id)
+
+    async def close(self):
+        if self.loop_watchdog is not None:
+            self.loop_watchdog.stop()
+        self.media_jobs.shutdown()
+        try:
+            await self.history.close()
+        except Exception:
+            logging.getLogger("kwakinji.spotify").exception("Error writing listening history")
+        await health_server.stop()
+        await self.spotify.close()
+        await self.np_cards.close()
+        await super().close()
+
     async def on_member_join(self, member):
-        channel = self.get_channel(1379088767004049550)
+        channel_id = self.guild_configs.get(member.guild.id).welcome_channel_id
+        channel = self.get_channel(channel_id) if channel_id else None
         if channel:
             embed = discord.Embed(
                 title="🎉 Welcome!",
@@ -167,476 +204,146 @@ class Client(commands.Bot):
             embed.set_image(
                 url="https://cdn.discordapp.com/attachments/996799825939005463/1408902538308354191/kpop-triples.gif"
             )
-            embed.set_footer(text=f"Member #{len(member.guild.members)}")
+            embed.set_footer(text=f"Member #{member.guild.member_count}")
             await channel.send(embed=embed)
 
 # -----------------------------
 # Bot Setup
 # -----------------------------
-client = Client(command_prefix="!", intents=intents, help_command=None)
-GUILD_ID = discord.Object(id=1379088766265856010)
-
-# -----------------------------
-# Spotify NP helpers
-# -----------------------------
-def create_progress_bar(progress, duration, length=10):
-    filled_blocks = int(progress / duration * length)
-    if filled_blocks > length - 1:
-        filled_blocks = length - 1
-    bar = "▬" * filled_blocks + "🔘" + "▬" * (length - filled_blocks - 1)
-    return bar
-
-async def generate_np_embed(member):
-    for activity in member.activities:
-        if isinstance(activity, discord.Spotify):
-            track_url = f"https://open.spotify.com/track/{activity.track_id}"
-            
-            db_response = supabase.table("spotify_profiles").select("profile_link").eq("user_id", member.id).execute()
-            profile_url = track_url  # Default value
-            if db_response.data:
-                profile_url = db_response.data[0]['profile_link']
-
-            artist_name, artist_url = get_artist_from_track(activity.track_id)
-            progress = (discord.utils.utcnow() - activity.start).total_seconds()
-            duration = (activity.end - activity.start).total_seconds()
-            progress_bar = create_progress_bar(progress, duration)
-            progress_time = f"{int(progress)//60}:{int(progress)%60:02d}"
-            duration_time = f"{int(duration)//60}:{int(duration)%60:02d}"
-            timestamps = f"`{progress_time}/{duration_time}`"
-
-            embed = discord.Embed(
-                description=f"[**{activity.title}**]({track_url})\n\n[**{artist_name}**]({artist_url}) • {activity.album}\n\n{progress_bar} {timestamps}",
-                color=0x1DB954
-            )
-            embed.set_thumbnail(url=activity.album_cover_url)
-            embed.set_author(
-                name=f"Now Playing – {member.display_name}",
-                url=profile_url,
-                icon_url=member.avatar.url if member.avatar else member.default_avatar.url
-            )
-            embed.set_footer(text=f"Requested by {member.display_name}")
-            return embed
-    return None
-
-
-# Badge emojis for visual flair
-BADGE_EMOJIS = {
-    "Discord Staff": "🛡️",
-    "Partnered Server Owner": "🤝",
-    "Bug Hunter": "🐛",
-    "HypeSquad Bravery": "🦁",
-    "HypeSquad Brilliance": "💡",
-    "HypeSquad Balance": "⚖️",
-    "Early Supporter": "🌟",
-    "Verified Bot": "🤖",
-    "Early Verified Bot Developer": "👨‍💻"
-}
-
-def get_user_badges(member: Member):
-    badges = []
-    flags = member.public_flags
-
-    # Use getattr to avoid AttributeErrors if flag doesn't exist
-    if getattr(flags, "staff", False): badges.append("Discord Staff")
-    if getattr(flags, "partner", False): badges.append("Partnered Server Owner")
-    if getattr(flags, "bug_hunter", False): badges.append("Bug Hunter")
-    if getattr(flags, "hypesquad_bravery", False): badges.append("HypeSquad Bravery")
-    if getattr(flags, "hypesquad_brilliance", False): badges.append("HypeSquad Brilliance")
-    if getattr(flags, "hypesquad_balance", False): badges.append("HypeSquad Balance")
-    if getattr(flags, "early_supporter", False): badges.append("Early Supporter")
-    if getattr(flags, "verified_bot", False): badges.append("Verified Bot")
-    if getattr(flags, "verified_developer", False): badges.append("Early Verified Bot Developer")
-
-    return badges if badges else ["None"]
-
-async def fetch_assets_embed(member: Member) -> Embed:
-    embed = Embed(
-        title=f"✨ Profile Assets — {member.display_name}",
-        color=Color.blurple()
-    )
-    embed.set_thumbnail(url=member.display_avatar.url)
-
-    # Avatar Decoration (simulate using top role color)
-    deco_color = member.top_role.color if member.top_role.name != "@everyone" else Color.default()
-    embed.add_field(name="Avatar Decoration", value=f"Role Color: {deco_color}", inline=False)
-
-    # Profile Effects (simulated using badges)
-    badges = get_user_badges(member)
-    badge_display = " ".join([BADGE_EMOJIS.get(b, b) for b in badges])
-    embed.add_field(name="HypeSquad House", value=badge_display, inline=False)
-
-    # Nameplate (simulated using top role name)
-    nameplate = member.top_role.name if member.top_role.name != "@everyone" else "No Pronouns"
-    embed.add_field(name="Pronouns", value=nameplate, inline=False)
-
-    # Roles
-    roles = [r.mention for r in member.roles if r.name != "@everyone"]
-    embed.add_field(name="Roles", value=", ".join(roles) if roles else "None", inline=False)
-
-    # Account creation date
-    embed.add_field(name="Account Created", value=member.created_at.strftime("%d %b %Y, %H:%M:%S UTC"), inline=False)
-
-    return embed
-
-
-import ffmpeg
-import os
-from PIL import Image, ImageSequence
-import asyncio
-
-MAX_SIZE = 25 * 1024 * 1024  # 25MB limit
-
-async def compress_gif_until_fit(input_path: str, max_attempts: int = 10) -> str:
-    """Compress GIF iteratively until it fits Discord's limit."""
-    loop = asyncio.get_event_loop()
-    current_path = input_path
-
-    for attempt in range(max_attempts):
-        if os.path.getsize(current_path) <= MAX_SIZE:
-            return current_path
-
-        base, ext = os.path.splitext(current_path)
-        if base.endswith("_compressed"):
-            base = base.rsplit("_compressed", 1)[0]
-        output_path = f"{base}_compressed.gif"
-
-        success = await loop.run_in_executor(None, compress_gif_sync, current_path, output_path, 0.85)
-        if not success:
-            break
-
-        if current_path != input_path:
-            os.remove(current_path)
-        current_path = output_path
-
-    return current_path
-
-
-def compress_gif_sync(input_path: str, output_path: str, scale_factor: float) -> bool:
-    """Sync helper for compressing GIF."""
-    try:
-        with Image.open(input_path) as img:
-            frames = []
-            duration = img.info.get('duration', 100)
-            loop_val = img.info.get('loop', 0)
-            for frame in ImageSequence.Iterator(img):
-                frame = frame.convert("RGBA")
-                new_size = (int(frame.width * scale_factor), int(frame.height * scale_factor))
-                frames.append(frame.resize(new_size, Image.Resampling.LANCZOS))
-            frames[0].save(output_path, save_all=True, append_images=frames[1:], optimize=True,
-                           duration=duration, loop=loop_val, disposal=2)
-        return True
-    except Exception as e:
-        print(f"Error compressing GIF: {e}")
-        return False
-
-
-
-
-# -----------------------------
-# Commands
-# -----------------------------
-@client.command()
-async def hello(ctx):
-    await ctx.send("Hi there!")
-
-@client.tree.command(name="hello", description="Say hello!", guild=GUILD_ID)
-async def hello_slash(interaction: discord.Interaction):
-    await interaction.response.send_message("Hi there!")
-
-@client.command()
-async def ping(ctx):
-    await ctx.send(f"Pong! Latency is {round(client.latency * 1000)}ms")
-
-@client.tree.command(name="ping", description="Check bot latency", guild=GUILD_ID)
-async def ping_slash(interaction: discord.Interaction):
-    await interaction.response.send_message(f"Pong! Latency is {round(client.latency * 1000)}ms")
-
-# --- Spotify commands ---
-@client.command(name="setspotify")
-async def set_spotify(ctx, link: str):
-    if not link.startswith("https://open.spotify.com/user/"):
-        await ctx.send("❌ Please provide a valid Spotify profile link.\nExample: `https://open.spotify.com/user/yourid`")
-        return
-    supabase.table("spotify_profiles").upsert({
-        "user_id": ctx.author.id,
-        "profile_link": link
-    }).execute()
-    await ctx.send(f"✅ Saved your Spotify profile link, {ctx.author.display_name}!")
-
-@client.tree.command(name="setspotify", description="Register your Spotify profile", guild=GUILD_ID)
-async def setspotify_slash(interaction: discord.Interaction, link: str):
-    if not link.startswith("https://open.spotify.com/user/"):
-        await interaction.response.send_message(
-            "❌ Please provide a valid Spotify profile link.\nExample: `https://open.spotify.com/user/yourid`",
-            ephemeral=True
-        )
-        return
-    supabase.table("spotify_profiles").upsert({
-        "user_id": interaction.user.id,
-        "profile_link": link
-    }).execute()
-    await interaction.response.send_message(f"✅ Saved your Spotify profile link, {interaction.user.display_name}!", ephemeral=True)
-
-@client.command(name="removespotify")
-async def remove_spotify(ctx):
-    user_id = ctx.author.id
-    data, count = supabase.table("spotify_profiles").delete().eq("user_id", user_id).execute()
-    if count[1] > 0:
-        await ctx.send(f"🗑️ Removed your Spotify profile link, {ctx.author.display_name}.")
-    else:
-        await ctx.send("❌ You don't have a Spotify profile link saved.")
-
-@client.tree.command(name="removespotify", description="Remove your Spotify profile", guild=GUILD_ID)
-async def removespotify_slash(interaction: discord.Interaction):
-    user_id = interaction.user.id
-    data, count = supabase.table("spotify_profiles").delete().eq("user_id", user_id).execute()
-    if count[1] > 0:
-        await interaction.response.send_message(f"🗑️ Removed your Spotify profile link, {interaction.user.display_name}.", ephemeral=True)
-    else:
-        await interaction.response.send_message("❌ You don't have a Spotify profile link saved.", ephemeral=True)
-
-@client.command(name="myspotify")
-async def my_spotify(ctx):
-    user_id = ctx.author.id
-    response = supabase.table("spotify_profiles").select("profile_link").eq("user_id", user_id).execute()
-    link = None
-    if response.data:
-        link = response.data[0]['profile_link']
-    
-    if link:
-        await ctx.send(f"🎶 Your Spotify profile link: {link}")
-    else:
-        await ctx.send("❌ You haven't registered a Spotify profile link yet. Use `!setspotify <link>`.")
-
-@client.tree.command(name="myspotify", description="View your registered Spotify profile", guild=GUILD_ID)
-async def myspotify_slash(interaction: discord.Interaction):
-    user_id = interaction.user.id
-    response = supabase.table("spotify_profiles").select("profile_link").eq("user_id", user_id).execute()
-    link = None
-    if response.data:
-        link = response.data[0]['profile_link']
-    
-    if link:
-        await interaction.response.send_message(f"🎶 Your Spotify profile link: {link}", ephemeral=True)
-    else:
-        await interaction.response.send_message("❌ You haven't registered a Spotify profile link yet. Use `/setspotify <link>`.", ephemeral=True)
-
-# Now Playing
-@client.command(name="np")
-async def now_playing(ctx, member: Optional[discord.Member] = None):
-    if member is None:
-        member = ctx.author
-    embed = await generate_np_embed(member)
-    if embed:
-        await ctx.send(embed=embed)
-    else:
-        await ctx.send(f"❌ {member.display_name} is not listening to Spotify right now.")
-
-@client.tree.command(name="np", description="Show what someone is listening to on Spotify", guild=GUILD_ID)
-async def now_playing_slash(interaction: discord.Interaction, member: Optional[discord.Member] = None):
-    if member is None:
-        member = interaction.guild.get_member(interaction.user.id)
-    else:
-        member = interaction.guild.get_member(member.id)
-
-    embed = await generate_np_embed(member)
-    if embed:
-        await interaction.response.send_message(embed=embed)
-    else:
-        await interaction.response.send_message(f"❌ {member.display_name} is not listening to Spotify right now.", ephemeral=True)
-
-# -----------------------------
-# Custom Help Command
-# -----------------------------
-client.remove_command("help")
-
-@client.command(name="help")
-async def help_command(ctx):
-    embed = discord.Embed(
-        title="🤖 Bot Help — Commands",
-        description="Here are all the commands you can use:",
-        color=discord.Color.green()
-    )
-    embed.add_field(name="👋 Hello", value="`!hello` or `/hello` — Say hello to the bot.", inline=False)
-    embed.add_field(name="🏓 Ping", value="`!ping` or `/ping` — Check the bot latency.", inline=False)
-    embed.add_field(
-        name="🎵 Spotify Profiles",
-        value=(
-            "`!setspotify <link>` or `/setspotify <link>` — Save your Spotify profile.\n"
-            "`!removespotify` or `/removespotify` — Remove your saved profile.\n"
-            "`!myspotify` or `/myspotify` — Show your saved profile."
-        ),
-        inline=False
-    )
-    embed.add_field(name="🎶 Now Playing", value="`!np [@member]` or `/np [member]` — Show what you or someone else is listening to on Spotify.", inline=False)
-    embed.add_field(name="🔗 Link Fixer", value="Posting Twitter/X, Instagram, or Reddit links will automatically be fixed.", inline=False)
-    embed.set_footer(text="Use the slash (/) versions for cleaner interactions!")
-    await ctx.send(embed=embed)
-
-@client.tree.command(name="help", description="Show the help menu", guild=GUILD_ID)
-async def help_slash(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title="🤖 Bot Help — Commands",
-        description="Here are all the commands you can use:",
-        color=discord.Color.green()
-    )
-    embed.add_field(name="👋 Hello", value="`/hello` or `!hello` — Say hello to the bot.", inline=False)
-    embed.add_field(name="🏓 Ping", value="`/ping` or `!ping` — Check the bot latency.", inline=False)
-    embed.add_field(
-        name="🎵 Spotify Profiles",
-        value=(
-            "`/setspotify <link>` or `!setspotify <link>` — Save your Spotify profile.\n"
-            "`/removespotify` or `!removespotify` — Remove your saved profile.\n"
-            "`/myspotify` or `!myspotify` — Show your saved profile."
-        ),
-        inline=False
-    )
-    embed.add_field(name="🎶 Now Playing", value="`/np [member]` or `!np [@member]` — Show what you or someone else is listening to on Spotify.", inline=False)
-    embed.add_field(name="🔗 Link Fixer", value="Posting Twitter/X, Instagram, or Reddit links will automatically be fixed.", inline=False)
-    embed.set_footer(text="Use the slash (/) versions for cleaner interactions!")
-    await interaction.response.send_message(embed=embed, ephemeral=True)
-# -----------------------------
-# Assets Command
-# -----------------------------    
-@client.command(name="profile")
-async def assets(ctx, member: Optional[discord.Member] = None):
-    if member is None:
-        member = ctx.author
-    embed = await fetch_assets_embed(member)
-    await ctx.send(embed=embed)
-
-@client.tree.command(
-    name="profile",
-    description="Show a user's Discord profile with badges, roles, and simulated effects",
-    guild=GUILD_ID
+GUILD_ID = discord.Object(id=int(os.getenv("GUILD_ID", 1379088766265856010)))
+WELCOME_CHANNEL_ID = 1379088767004049550  # The home guild's welcome channel before configs existed
+
+client = Client(
+    command_prefix="!",
+    intents=intents,
+    help_command=None,
+    **({"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARDED else {}),
+    home_guild=None if MULTI_GUILD else GUILD_ID,
+    lean_members=LEAN_MEMBERS,
+    guild_configs=GuildConfigStore(
+        SupabaseGuildConfigBackend(url=os.environ.get("SUPABASE_URL"), key=os.environ.get("SUPABASE_KEY")),
+        defaults={GUILD_ID.id: GuildConfig(welcome_channel_id=WELCOME_CHANNEL_ID)},
+    ),
+    # Spotify API helper
+    spotify=SpotifyClient(os.getenv("SPOTIFY_CLIENT_ID"), os.getenv("SPOTIFY_CLIENT_SECRET")),
+    # Supabase-backed profile links; the supabase client is created on first query
+    profiles=SpotifyProfileStore(
+        SupabaseProfileBackend(url=os.environ.get("SUPABASE_URL"), key=os.environ.get("SUPABASE_KEY"))
+    ),
+    listener_index=ListenerIndex(),
+    # One task keeps every `/np live` embed current
+    live_embeds=LiveEmbedScheduler(),
+    # Plays behind /topartists and /toptracks, written in batches; HISTORY_SUPABASE=1 mirrors them to Supabase
+    history=ListeningHistory(
+        SQLiteHistoryStore(),
+        SupabaseHistoryBackend(url=os.environ.get("SUPABASE_URL"), key=os.environ.get("SUPABASE_KEY"))
+        if os.getenv("HISTORY_SUPABASE") else None,
+    ),
+    # /np card images, rendered in their own worker process
+    np_cards=CardRenderer(),
+    media_jobs=MediaJobScheduler(),
+    gif_cache=MediaResultCache(),
+    # Event-loop stall watchdog (opt-in, set LOOP_WATCHDOG=1)
+    loop_watchdog=LoopWatchdog() if os.getenv("LOOP_WATCHDOG") else None,
 )
-async def assets_slash(interaction: discord.Interaction, member: Optional[discord.Member] = None):
-    if member is None:
-        member = interaction.guild.get_member(interaction.user.id)
-    embed = await fetch_assets_embed(member)
-    await interaction.response.send_message(embed=embed, ephemeral=True)
 
-import discord
-from discord.ext import commands
-from discord import app_commands
-import os
-from moviepy.editor import VideoFileClip
-from PIL import Image
 
 # -----------------------------
-# !gif Command (prefix)
+# Metrics (served by the health server at /metrics)
 # -----------------------------
-@client.command(name="gif")
-async def gif_prefix(ctx):
-    if not ctx.message.attachments:
-        await ctx.send("❌ Please attach a video or image to convert.")
-        return
-
-    attachment = ctx.message.attachments[0]
-    processing_msg = await ctx.send("⏳ Processing your file, please wait...")
-
-    base_path = f"./{ctx.author.id}_{attachment.filename}"
-    output_path = f"./{ctx.author.id}_output.gif"
-
-    try:
-        await attachment.save(base_path)
-
-        if attachment.content_type and attachment.content_type.startswith('video'):
-            # Use ffmpeg to convert video to GIF with scale + fps
-            ffmpeg.input(base_path).output(
-                output_path, vf="fps=15,scale=320:-1:flags=lanczos"
-            ).run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
-        elif attachment.content_type and attachment.content_type.startswith('image'):
-            with Image.open(base_path) as img:
-                img.save(output_path, save_all=True, duration=200, loop=0)
-        else:
-            await processing_msg.edit(content="❌ Unsupported file type.")
-            return
-
-        # Compress GIF iteratively
-        final_path = await compress_gif_until_fit(output_path)
-
-        if os.path.getsize(final_path) > MAX_SIZE:
-            await processing_msg.edit(content="❌ The final GIF is still too large to upload to Discord.")
-        else:
-            await processing_msg.delete()
-            await ctx.send(file=discord.File(final_path))
-
-    except Exception as e:
-        try:
-            await processing_msg.edit(content=f"❌ An error occurred: {e}")
-        except discord.NotFound:
-            await ctx.send(f"❌ An error occurred: {e}")
-
-    finally:
-        # Cleanup all temp files
-        for path in [base_path, output_path, final_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                except Exception as e:
-                    print(f"Cleanup error: {e}")
-
+def cache_stats():
+    values = {}
+    for name, cache in (("spotify_tracks", client.spotify.track_cache), ("spotify_profiles", client.profiles.cache), ("gif_results", client.gif_cache),
+                        ("np_card_images", client.np_cards.images)):
+        for stat, value in cache.stats().items():
+            values[(("cache", name), ("stat", stat))] = value
+    return values
+
+registry.gauge("bot_gateway_latency_seconds", "Discord gateway heartbeat latency.", lambda: client.latency)
+registry.gauge("bot_guilds", "Guilds served by this process.", lambda: len(client.guilds))
+registry.gauge("bot_live_embeds", "Live /np embeds being updated.", lambda: len(client.live_embeds))
+registry.gauge("bot_history_buffered_plays", "Spotify plays waiting to be written.", lambda: len(client.history))
+registry.gauge("bot_history_plays", "Spotify plays recorded since start.", lambda: client.history.plays)
+registry.gauge("bot_guild_configs_cached", "Guild configs held in memory.", lambda: len(client.guild_configs))
+registry.gauge("bot_media_queue_depth", "Media jobs waiting for a worker.", lambda: client.media_jobs.queue_depth)
+registry.gauge("bot_media_jobs_active", "Media jobs currently running.", lambda: client.media_jobs.active)
+registry.gauge("bot_cache", "Cache counters and sizes.", cache_stats)
 
 
 # -----------------------------
-# /gif Command (slash)
+# Health checks (served at /healthz and /readyz)
 # -----------------------------
-@client.tree.command(name="gif", description="Convert an image or video to GIF", guild=GUILD_ID)
-async def gif_slash(interaction: discord.Interaction, file: discord.Attachment):
-    await interaction.response.defer()
-    base_path = f"./{interaction.user.id}_{file.filename}"
-    output_path = f"./{interaction.user.id}_output.gif"
-
-    try:
-        await file.save(base_path)
-
-        if file.content_type.startswith('video'):
-            ffmpeg.input(base_path).output(
-                output_path, vf="fps=15,scale=320:-1:flags=lanczos"
-            ).run(overwrite_output=True, capture_stdout=True, capture_stderr=True)
-        elif file.content_type.startswith('image'):
-            with Image.open(base_path) as img:
-                img.save(output_path, save_all=True, duration=200, loop=0)
-        else:
-            await interaction.edit_original_response(content="❌ Unsupported file type.")
-            return
-
-        final_path = await compress_gif_until_fit(output_path)
-
-        if os.path.getsize(final_path) > MAX_SIZE:
-            await interaction.edit_original_response(content="❌ The final GIF is still too large to upload to Discord.")
-        else:
-            await interaction.edit_original_response(content=None, attachments=[discord.File(final_path)])
-
-    except Exception as e:
-        await interaction.edit_original_response(content=f"❌ An error occurred: {e}")
+MAX_LOOP_LAG = 2.0  # seconds
+MAX_DISCONNECTED = 5 * 60  # discord.py reconnects on its own; this long means we're stuck
+
+def check_event_loop():
+    lag = LOOP_LAG_LAST.get()
+    return lag < MAX_LOOP_LAG, f"lag {lag * 1000:.0f}ms"
+
+def check_gateway_connection():
+    if client.disconnected_since is None:
+        return True, "connected"
+    down_for = time.monotonic() - client.disconnected_since
+    return down_for < MAX_DISCONNECTED, f"disconnected for {down_for:.0f}s"
+
+def check_gateway_ready():
+    return client.is_ready() and not client.is_closed(), "ready" if client.is_ready() else "not ready"
+
+def gateway_sockets():
+    if SHARDED:
+        return {shard_id: getattr(shard._parent, "ws", None) for shard_id, shard in client.shards.items()}
+    return {None: client.ws}
+
+def check_heartbeat():
+    # discord.py doesn't expose the last ACK publicly, so read it defensively
+    sockets = gateway_sockets()
+    if not sockets:
+        return False, "no shards yet"
+    details = []
+    healthy = True
+    for shard_id, ws in sockets.items():
+        prefix = f"shard {shard_id}: " if shard_id is not None else ""
+        keep_alive = getattr(ws, "_keep_alive", None)
+        last_ack = getattr(keep_alive, "_last_ack", None)
+        interval = getattr(keep_alive, "interval", None)
+        if last_ack is None or not interval:
+            healthy = False
+            details.append(f"{prefix}no heartbeat yet")
+            continue
+        age = time.perf_counter() - last_ack
+        healthy = healthy and age < interval * 2 + 5
+        details.append(f"{prefix}last ack {age:.0f}s ago")
+    return healthy, ", ".join(details)
+
+def check_media_queue():
+    media_jobs = client.media_jobs
+    return media_jobs.queue_depth < media_jobs.max_queue, f"{media_jobs.queue_depth}/{media_jobs.max_queue} queued"
+
+health_server = HealthServer(
+    live_checks={"event_loop": check_event_loop, "gateway_connection": check_gateway_connection},
+    ready_checks={"gateway_ready": check_gateway_ready, "heartbeat": check_heartbeat, "media_queue": check_media_queue},
+)
 
-    finally:
-        for path in [base_path, output_path, final_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                except Exception as e:
-                    print(f"Cleanup error: {e}")
+client.mark_startup("imports")
 
 
 # -----------------------------
 # Run the Bot
 # -----------------------------
 if __name__ == "__main__":
-    keep_alive()
-
     token = os.getenv("DISCORD_TOKEN")
-    print("TOKEN LOADED:", bool(token))  # Debug check
-
     if not token:
-        print("❌ Bot token not found. Set the DISCORD_TOKEN environment variable.")
+        log.critical("Bot token not found. Set the DISCORD_TOKEN environment variable.")
         exit(1)
 
+    if SHARD_PROCESSES > 1 and SHARD_IDS is None:
+        # Supervisor mode: this process only starts and watches one child per shard range
+        shard_count = SHARD_COUNT or asyncio.run(recommended_shard_count(token))
+        run_shard_processes(__file__, shard_count, SHARD_PROCESSES, health_server.port)
+        exit(0)
+
     try:
-        client.run(token)
-    except Exception as e:
-        print("BOT CRASHED:", e)
-        import time
+        client.run(token, log_handler=None)  # Already logging through setup_logging
+    except Exception:
+        log.exception("Bot crashed")
         time.sleep(5)  # Prevent rapid restart loop
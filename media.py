@@ -0,0 +1,433 @@
+import asyncio
+import io
+import json
+import math
+import os
+import struct
+import time
+
+from PIL import GifImagePlugin, Image, ImageChops, ImageSequence
+
+from media_io import MediaInput
+
+# -----------------------------
+# ffmpeg video -> GIF / WebP / MP4 conversion
+# -----------------------------
+FFMPEG = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+FFPROBE = os.environ.get("FFPROBE_BINARY", "ffprobe")
+
+GIF_MAX_WIDTH = 480
+GIF_MIN_WIDTH = 160
+GIF_MAX_FPS = 15
+GIF_MIN_FPS = 6
+GIF_BYTES_PER_PIXEL = 0.12  # Initial guess of GIF bytes per pixel per frame, refined after the first encode
+# The same guess per output format; WebP and H.264 only store what changed, and lossily
+BYTES_PER_PIXEL = {"gif": GIF_BYTES_PER_PIXEL, "webp": 0.03, "mp4": 0.01}
+WEBP_QUALITY = 75
+MP4_MAX_BITRATE = 2_000_000
+GIF_TARGET_HEADROOM = 0.92  # Aim a little under the limit so the prediction error rarely overshoots
+FFMPEG_TIMEOUT = 120
+
+GIF_FIT_TOLERANCE = 0.06  # The WebP fitter aims for 94% of the budget
+GIF_FIT_MIN_FILL = 0.5  # The first GIF that fits is kept unless it uses less than half the budget
+GIF_FIT_SECONDS = 60.0  # No new GIF encode is started once another would likely run past this
+GIF_MIN_SCALE = 0.15
+# (frame_step, palette colors) in order of how much they hurt; the next one is only tried
+# when the scale needed at the current one would drop below GIF_MIN_SCALE
+GIF_FIT_LEVELS = ((1, 256), (2, 256), (2, 128), (3, 64))
+# Fast octree palettes (what Pillow's own GIF writer uses for RGBA) LZW-compress about 3x better than
+# median cut, at slightly lower per-pixel fidelity, so the fitter can keep a much larger scale
+GIF_QUANTIZE = Image.Quantize.FASTOCTREE
+
+
+class MediaError(Exception):
+    pass
+
+
+async def _run(args, data: bytes | None = None, timeout: float = FFMPEG_TIMEOUT) -> bytes:
+    """Run a command with `data` piped to stdin and return its stdout."""
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE if data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(data), timeout)
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        detail = stderr.decode(errors="replace").strip().splitlines()
+        raise MediaError(detail[-1] if detail else f"{args[0]} exited with {proc.returncode}")
+    return stdout
+
+
+class VideoSource:
+    """An attachment plus how ffmpeg should read it.
+
+    Spooled inputs are read from their file in the job directory. In-memory ones stream over a
+    pipe, except MP4/MOV files with the index at the end: those need seeking, so they get spooled.
+    """
+
+    def __init__(self, media: MediaInput):
+        self.media = media
+        self.width = self.height = 0
+        self.duration = 0.0
+        self.fps = 0.0
+
+    @property
+    def input_args(self):
+        return ["-i", self.media.path] if self.media.path else ["-i", "pipe:0"]
+
+    @property
+    def stdin(self):
+        return self.media.data
+
+    async def probe(self):
+        args = [FFPROBE, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "stream=width,height,avg_frame_rate,duration:format=duration",
+                "-of", "json"]
+        try:
+            info = json.loads(await _run(args + self.input_args, self.stdin))
+            if not info.get("streams"):
+                raise MediaError("no video stream")
+        except MediaError:
+            if self.media.path:
+                raise MediaError("No video stream found in the file.")
+            await self.media.spool()
+            info = json.loads(await _run(args + self.input_args))
+            if not info.get("streams"):
+                raise MediaError("No video stream found in the file.")
+
+        stream = info["streams"][0]
+        self.width = int(stream.get("width") or 0)
+        self.height = int(stream.get("height") or 0)
+        num, _, den = (stream.get("avg_frame_rate") or "0/1").partition("/")
+        self.fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+        duration = stream.get("duration") or info.get("format", {}).get("duration")
+        self.duration = float(duration) if duration not in (None, "N/A") else 0.0
+        return self
+
+
+def plan_encode(width: int, height: int, duration: float, source_fps: float, target_size: int,
+             bytes_per_pixel: float = GIF_BYTES_PER_PIXEL):
+    """Pick (width, fps) so the predicted output size lands just under `target_size`."""
+    fps = min(GIF_MAX_FPS, source_fps) if source_fps > 0 else GIF_MAX_FPS
+    out_width = min(width or GIF_MAX_WIDTH, GIF_MAX_WIDTH)
+    aspect = (height / width) if width and height else 9 / 16
+    duration = duration or 10.0
+    budget = target_size * GIF_TARGET_HEADROOM
+
+    def predicted(w, f):
+        return w * w * aspect * f * duration * bytes_per_pixel
+
+    # Size scales with area, so shrink width by the square root of the overshoot first...
+    if predicted(out_width, fps) > budget:
+        out_width = max(GIF_MIN_WIDTH, int(out_width * math.sqrt(budget / predicted(out_width, fps))))
+    # ...then trade frame rate once the width floor is reached
+    if predicted(out_width, fps) > budget:
+        fps = max(GIF_MIN_FPS, fps * budget / predicted(out_width, fps))
+
+    # GIF palettes and yuv420p both want even dimensions
+    return out_width - out_width % 2, round(fps, 2)
+
+
+async def encode_video(source: VideoSource, fmt: str, width: int, fps: float, target_size: int) -> bytes:
+    """One encode of `source` as `fmt` ("gif", "webp" or "mp4") at `width` and `fps`."""
+    scale = f"fps={fps},scale={width}:-2:flags=lanczos"
+    args = [FFMPEG, "-hide_banner", "-loglevel", "error", *source.input_args]
+    if fmt == "gif":
+        graph = (
+            f"{scale},split[a][b];"
+            "[a]palettegen=stats_mode=diff[p];"
+            "[b][p]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle"
+        )
+        return await _run(args + ["-filter_complex", graph, "-loop", "0", "-f", "gif", "pipe:1"], source.stdin)
+    if fmt == "webp":
+        args += ["-vf", scale, "-an", "-c:v", "libwebp", "-lossless", "0", "-q:v", str(WEBP_QUALITY),
+                 "-loop", "0", "-f", "webp", "pipe:1"]
+        return await _run(args, source.stdin)
+
+    # MP4 needs a seekable output for the index at the front, so it goes through the job directory
+    bitrate = int(min(MP4_MAX_BITRATE, target_size * 8 * GIF_TARGET_HEADROOM / (source.duration or 10.0)))
+    files = source.media.files
+    path = files.path(f"output-{width}-{fps}.mp4")
+    args += ["-vf", scale, "-an", "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+             "-b:v", str(bitrate), "-maxrate", str(bitrate), "-bufsize", str(bitrate * 2),
+             "-movflags", "+faststart", "-y", path]
+    await _run(args, source.stdin)
+    with open(path, "rb") as f:
+        data = f.read()
+    files.bytes_written += len(data)
+    os.remove(path)
+    return data
+
+
+async def convert_video(source: VideoSource, fmt: str, target_size: int, max_encodes: int = 2) -> bytes:
+    """Convert a probed video to `fmt` under `target_size`, usually in one encode and at most `max_encodes`.
+
+    Several formats can be converted from one source at the same time.
+    """
+    bytes_per_pixel = BYTES_PER_PIXEL[fmt]
+    out = b""
+    last_plan = None
+    for _ in range(max_encodes):
+        plan = plan_encode(source.width, source.height, source.duration, source.fps,
+                        target_size, bytes_per_pixel)
+        if plan == last_plan:
+            break  # Already at the width/fps floor; re-encoding won't change anything
+        last_plan = width, fps = plan
+        out = await encode_video(source, fmt, width, fps, target_size)
+        if len(out) <= target_size:
+            return out
+
+        # Calibrate the model on what this clip actually produced and try again
+        height = width * (source.height / source.width) if source.width else width
+        pixels = width * height * fps * (source.duration or 10.0)
+        bytes_per_pixel = len(out) / pixels if pixels else bytes_per_pixel * 2
+    return out
+
+
+# -----------------------------
+# Pillow helpers (run in the media process pool)
+# -----------------------------
+def image_to_animation_sync(source: bytes | str, fmt: str = "gif") -> bytes:
+    """Re-save an image as a GIF or animated WebP; `source` is the bytes or, for spooled uploads, its path.
+
+    A GIF asked for as a GIF comes back as it is. Other images become GIFs through reencode_gif, one
+    frame at a time: Pillow's own GIF writer keeps every frame in memory until it's done.
+    """
+    buf = io.BytesIO()
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        if fmt == "webp":
+            img.save(buf, "WEBP", save_all=True, duration=200, loop=0, quality=WEBP_QUALITY)
+            return buf.getvalue()
+        is_gif = img.format == "GIF"
+    if is_gif:
+        if isinstance(source, bytes):
+            return source
+        with open(source, "rb") as f:
+            return f.read()
+    reencode_gif(io.BytesIO(source) if isinstance(source, bytes) else source, buf)
+    return buf.getvalue()
+
+
+def _gif_header(size, loop) -> bytes:
+    # Logical screen descriptor without a global color table; every frame carries its own palette
+    header = b"GIF89a" + struct.pack("<HHBBB", size[0], size[1], 0, 0, 0)
+    if loop is not None:
+        header += b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00"
+    return header
+
+
+def _quantize(rgb, alpha, colors: int):
+    """Reduce an RGB image to a paletted one; returns (image, transparent index or None)."""
+    if alpha is None or alpha.getextrema()[0] >= 128:
+        return rgb.quantize(colors, GIF_QUANTIZE), None
+
+    # Reserve the last palette slot for transparency
+    transparent = colors - 1
+    paletted = rgb.quantize(transparent, GIF_QUANTIZE)
+    palette = paletted.getpalette()[:transparent * 3]
+    paletted.putpalette(palette + [0] * (transparent * 3 - len(palette)) + [0, 0, 0])
+    paletted.paste(transparent, mask=alpha.point(lambda a: 255 if a < 128 else 0))
+    return paletted, transparent
+
+
+def reencode_gif(src, dst, scale_factor: float = 1.0, frame_step: int = 1, colors: int = 256):
+    """Re-encode a GIF one frame at a time, so memory stays at roughly one frame whatever the length.
+
+    `src`/`dst` may be paths or binary file objects. Every `frame_step`-th frame is kept and the
+    dropped frames' durations are folded into it, lowering fps without changing playback speed.
+    Opaque GIFs only store the region that changed since the previous frame.
+    """
+    with Image.open(src) as img:
+        size = (max(1, int(img.width * scale_factor)), max(1, int(img.height * scale_factor)))
+        default_duration = img.info.get('duration', 100)
+        loop_val = img.info.get('loop', 0)
+        transparent_gif = "transparency" in img.info or img.mode in ("RGBA", "LA", "PA")
+
+        out = open(dst, "wb") if isinstance(dst, (str, os.PathLike)) else dst
+        try:
+            out.write(_gif_header(size, loop_val))
+            # A kept frame is written once the next kept frame arrives and its final duration is known
+            pending = None
+            previous = None  # Last kept opaque frame, to diff against
+            for index, frame in enumerate(ImageSequence.Iterator(img)):
+                duration = frame.info.get('duration', default_duration)
+                if index % frame_step:
+                    pending[2] += duration
+                    continue
+
+                rgba = frame.convert("RGBA")
+                if rgba.size != size:
+                    rgba = rgba.resize(size, Image.Resampling.LANCZOS)
+                rgb = rgba.convert("RGB")
+                alpha = rgba.getchannel("A") if transparent_gif else None
+
+                box = (0, 0) + size
+                if previous is not None:
+                    box = ImageChops.difference(rgb, previous).getbbox()
+                    if box is None:
+                        pending[2] += duration  # Nothing changed, just hold the last frame longer
+                        continue
+                if not transparent_gif:
+                    previous = rgb
+
+                if pending is not None:
+                    _write_gif_frame(out, *pending)
+                paletted, transparent = _quantize(rgb.crop(box), None if alpha is None else alpha.crop(box), colors)
+                # Transparent frames are drawn on a cleared canvas; opaque ones are drawn over the last frame
+                pending = [paletted, box[:2], duration, transparent, 2 if transparent_gif else 1]
+            if pending is not None:
+                _write_gif_frame(out, *pending)
+            out.write(b";")
+        finally:
+            if out is not dst:
+                out.close()
+
+
+def _write_gif_frame(out, paletted, offset, duration, transparent, disposal):
+    params = {"include_color_table": True, "duration": duration, "disposal": disposal}
+    if transparent is not None:
+        params["transparency"] = transparent
+    for chunk in GifImagePlugin.getdata(paletted, offset, **params):
+        out.write(chunk)
+
+
+def fit_gif_sync(data: bytes, target_size: int, max_encodes: int = 3,
+                 max_seconds: float = GIF_FIT_SECONDS) -> bytes | None:
+    """Shrink a GIF to under `target_size` bytes, entirely in memory.
+
+    Output size is modelled as `size = k * scale^a` (a ≈ 2 for a plain area reduction). The first
+    encode that fits is kept unless it's far under the budget (GIF_FIT_MIN_FILL); otherwise the
+    model is refitted through the last two samples and the next scale solved from it, falling back
+    to bisection between the largest fitting and smallest overshooting scale. Returns the best fit
+    so far, or None, once `max_encodes` encodes are done or another would run past `max_seconds`.
+    """
+    if len(data) <= target_size:
+        return data
+
+    budget = target_size * GIF_TARGET_HEADROOM
+    start = time.monotonic()
+    encodes = 0
+    best = None
+    # Until the first encode, assume full scale costs about what the source does
+    last, exponent = (1.0, len(data)), 2.0
+    last_step, last_colors = GIF_FIT_LEVELS[0]
+
+    for frame_step, colors in GIF_FIT_LEVELS:
+        # Carry the model over: fewer frames and fewer palette bits shrink the output roughly linearly
+        ratio = (last_step / frame_step) * (math.log2(colors) / math.log2(last_colors))
+        last = (last[0], last[1] * ratio)
+        last_step, last_colors = frame_step, colors
+
+        fits, overshoots = 0.0, 1.0
+        scale = min(1.0, last[0] * (budget / last[1]) ** (1 / exponent))
+
+        while encodes < max_encodes and scale >= GIF_MIN_SCALE:
+            elapsed = time.monotonic() - start
+            if encodes and elapsed * (encodes + 1) / encodes > max_seconds:
+                return best
+            out = io.BytesIO()
+            reencode_gif(io.BytesIO(data), out, scale, frame_step, colors)
+            encodes += 1
+            size = out.tell()
+
+            if size <= target_size:
+                if best is None or size > len(best):
+                    best = out.getvalue()
+                if size >= target_size * GIF_FIT_MIN_FILL:
+                    return best
+                fits = max(fits, scale)
+            else:
+                overshoots = min(overshoots, scale)
+
+            if encodes > 1 and last[0] != scale and last[1] != size:
+                exponent = min(3.0, max(0.5, math.log(last[1] / size) / math.log(last[0] / scale)))
+            last = (scale, size)
+
+            guess = scale * (budget / size) ** (1 / exponent)
+            scale = guess if fits < guess < overshoots else (fits + overshoots) / 2
+            if overshoots - fits < 0.01:
+                break
+
+        if best is not None:
+            return best
+    return best
+
+
+class _ScaledFrames:
+    """The frames of an open animation from `start` on, each resized only when it's seeked to.
+
+    Passed in `append_images`, it lets Pillow's WebP writer (which seeks through each appended
+    image's `n_frames`) pull one resized frame at a time instead of needing them all in a list.
+    Each frame is pasted into one canvas made with Image.new, and everything else the writer asks
+    for is the canvas's, so only public Image API is used.
+    """
+
+    def __init__(self, source: Image.Image, size: tuple, start: int = 1):
+        self._source = source
+        self._start = start
+        self._frame = 0
+        self._canvas = Image.new("RGBA", size)
+        self.n_frames = source.n_frames - start
+        self.seek(0)
+
+    def __getattr__(self, name):
+        return getattr(self._canvas, name)
+
+    def seek(self, frame: int):
+        self._source.seek(self._start + frame)
+        self._canvas.paste(self._source.convert("RGBA").resize(self._canvas.size, Image.Resampling.LANCZOS))
+        self._frame = frame
+
+    def tell(self) -> int:
+        return self._frame
+
+
+def fit_webp_sync(data: bytes, target_size: int, max_encodes: int = 3) -> bytes | None:
+    """Shrink an animated WebP to under `target_size` bytes by scaling it down.
+
+    WebP size tracks area closely, so the first guess from the square root of the overshoot
+    usually fits. Frames are decoded and resized one at a time as the encoder asks for them, so
+    memory stays at about one frame plus the encoded output. Returns None if nothing fit within
+    `max_encodes` encodes.
+    """
+    if len(data) <= target_size:
+        return data
+
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+        durations = []
+        for frame in ImageSequence.Iterator(img):
+            frame.load()  # WebP only reads a frame's duration when decoding it
+            durations.append(frame.info.get("duration", 100))
+        scale, size = 1.0, len(data)
+        for _ in range(max_encodes):
+            scale *= math.sqrt(target_size * (1 - GIF_FIT_TOLERANCE) / size)
+            if scale < GIF_MIN_SCALE:
+                break
+            dims = (max(1, int(width * scale)), max(1, int(height * scale)))
+            img.seek(0)
+            first = img.convert("RGBA").resize(dims, Image.Resampling.LANCZOS)
+            rest = [_ScaledFrames(img, dims)] if len(durations) > 1 else []
+            buf = io.BytesIO()
+            first.save(buf, "WEBP", save_all=True, append_images=rest, duration=durations, loop=0,
+                       quality=WEBP_QUALITY)
+            size = buf.tell()
+            if size <= target_size:
+                return buf.getvalue()
+    return None
+
+
+def fit_animation_sync(data: bytes, fmt: str, target_size: int) -> bytes | None:
+    """Shrink a GIF or animated WebP to under `target_size`; None if it can't be done."""
+    if fmt == "webp":
+        return fit_webp_sync(data, target_size)
+    if fmt == "gif":
+        return fit_gif_sync(data, target_size)
+    return data if len(data) <= target_size else None
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+
+# -----------------------------
+# Per-job media buffers and scratch space
+# -----------------------------
+MEDIA_SPOOL_THRESHOLD = int(os.environ.get("MEDIA_SPOOL_THRESHOLD", 8 * 1024 * 1024))
+MEDIA_TMP_DIR = os.environ.get("MEDIA_TMP_DIR") or None  # None = the system temp directory
+MEDIA_READ_CHUNK = 1024 * 1024
+
+
+class JobFiles:
+    """Scratch space for one media job, removed when the job ends however it ends.
+
+    The directory is created on first use with a unique name and mode 0700. Jobs never share a
+    path, even two jobs from the same user converting files that have the same name. Jobs that stay
+    in memory never touch the disk. `bytes_written` counts what the job spooled to disk.
+    """
+
+    def __init__(self, root: str | None = MEDIA_TMP_DIR, prefix: str = "kwakinji-media-"):
+        self.root = root
+        self.prefix = prefix
+        self._dir = None
+        self.bytes_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+    @property
+    def dir(self) -> str:
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+        return self._dir
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, os.path.basename(name) or "file")
+
+    def open(self, name: str):
+        """A new file in the job directory, opened for writing; writes through it aren't counted."""
+        return open(self.path(name), "xb")
+
+    def write(self, name: str, data) -> str:
+        """Write a bytes-like object to a new file in the job directory and return its path."""
+        with self.open(name) as f:
+            f.write(data)
+        self.bytes_written += len(data)
+        return f.name
+
+    def cleanup(self):
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+
+class MediaInput:
+    """An attachment's bytes, kept in memory up to `threshold` and spooled to the job's directory above it.
+
+    Stages read `source` (the bytes, or the path once spooled) instead of copying it. ffmpeg gets
+    the path as its input or the bytes on stdin. Pool workers open the path themselves, so large
+    uploads aren't pickled across processes.
+    """
+    __slots__ = ("files", "name", "data", "path", "size")
+
+    def __init__(self, files: JobFiles, name: str, data: bytes | None = None):
+        self.files = files
+        self.name = name
+        self.data = data
+        self.path = None
+        self.size = len(data) if data is not None else 0
+
+    @classmethod
+    async def fetch(cls, attachment, files: JobFiles, threshold: int = MEDIA_SPOOL_THRESHOLD, session=None):
+        """Read `attachment`, streaming it straight to disk when it's over `threshold` and a session is given."""
+        media = cls(files, f"input-{attachment.filename}")
+        if session is not None and attachment.size > threshold:
+            await media._download(session, attachment.url)
+            return media
+        media.data = await attachment.read()
+        media.size = len(media.data)
+        if media.size > threshold:
+            # Don't hold a big upload in RAM for the whole conversion
+            await media.spool()
+        return media
+
+    async def _download(self, session, url: str):
+        with self.files.open(self.name) as f:
+            async with session.get(url, raise_for_status=True) as response:
+                async for chunk in response.content.iter_chunked(MEDIA_READ_CHUNK):
+                    await asyncio.to_thread(f.write, chunk)
+                    self.size += len(chunk)
+            self.path = f.name
+        self.files.bytes_written += self.size
+
+    @property
+    def source(self) -> bytes | str:
+        return self.path if self.path is not None else self.data
+
+    async def spool(self) -> str:
+        """Move the bytes into the job directory (e.g. for readers that need to seek) and return the path."""
+        if self.path is None:
+            self.path = await asyncio.to_thread(self.files.write, self.name, self.data)
+            self.data = None
+        return self.path
+
+    def open(self):
+        """A binary file object over the input; in memory it shares the bytes rather than copying them."""
+        return open(self.path, "rb") if self.path is not None else io.BytesIO(self.data)
+
+
+# -----------------------------
+# Output formats
+# -----------------------------
+OUTPUT_FORMATS = ("gif", "webp", "mp4")
+AUTOPLAY_FORMATS = ("webp", "gif")  # Discord animates these inline; MP4 uploads get a click-to-play player
+
+
+def sniff_format(data: bytes) -> str:
+    """Which of OUTPUT_FORMATS `data` is, from its magic bytes (for results read back from the cache)."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[4:8] == b"ftyp":
+        return "mp4"
+    return "gif"
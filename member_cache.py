@@ -0,0 +1,29 @@
+import discord
+
+# -----------------------------
+# Member cache modes
+# -----------------------------
+# By default discord.py chunks every guild at startup and keeps each member, with their full
+# activity list, in memory. Lean mode keeps no members at all: Spotify listeners live only in the
+# ListenerIndex (fed from raw presence updates) and members are fetched when a command needs one.
+LEAN_CACHE_OPTIONS = {
+    "member_cache_flags": discord.MemberCacheFlags.none(),
+    "chunk_guilds_at_startup": False,
+    # Presence updates for uncached members are otherwise dropped before on_presence_update
+    "enable_raw_presences": True,
+}
+
+
+def cache_options(lean: bool) -> dict:
+    """Client options for the chosen member cache mode."""
+    return dict(LEAN_CACHE_OPTIONS) if lean else {}
+
+
+async def resolve_member(guild: discord.Guild, user: discord.abc.User) -> discord.Member:
+    """The cached member for `user`, falling back to what Discord sent with the command, then the API."""
+    member = guild.get_member(user.id)
+    if member is not None:
+        return member
+    if isinstance(user, discord.Member):
+        return user
+    return await guild.fetch_member(user.id)
@@ -0,0 +1,206 @@
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+
+# -----------------------------
+# Minimal Prometheus-style metrics
+# -----------------------------
+# Recording is a dict lookup plus an add, so it is safe to leave on in hot paths like on_message.
+# Exposition is served on the event loop by HealthServer (keep_alive.py). It still reads snapshots of
+# the dicts, because some counters (e.g. dropped log records) are bumped from other threads.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+def _format_value(value) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield self.name, key, value
+
+
+class Gauge:
+    """A gauge that is either set directly or read from a callback at scrape time."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(labels)] = value
+
+    def get(self, default: float = 0.0, **labels) -> float:
+        return self._values.get(_label_key(labels), default)
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                return
+            if not isinstance(values, dict):
+                values = {(): values}
+            for key, value in values.items():
+                yield self.name, key, value
+        for key, value in list(self._values.items()):
+            yield self.name, key, value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+
+    def labels(self, **labels) -> _HistogramChild:
+        """Bind label values once and keep the child around to skip the lookup on every observation."""
+        key = _label_key(labels)
+        child = self._children.get(key)
+        if child is None:
+            self._children[key] = child = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            counts = list(child.counts)
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield self.name + "_bucket", key + (("le", _format_value(float(bound))),), cumulative
+            yield self.name + "_sum", key, child.sum
+            yield self.name + "_count", key, child.count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation):
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name, documentation, callback=None):
+        return self.register(Gauge(name, documentation, callback))
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# -----------------------------
+# Bot metrics
+# -----------------------------
+EVENT_SECONDS = registry.histogram("bot_event_seconds", "Time spent handling gateway events.")
+COMMAND_SECONDS = registry.histogram("bot_command_seconds", "Time spent handling commands.")
+COMMAND_ERRORS = registry.counter("bot_command_errors_total", "Commands that raised.")
+EXTERNAL_SECONDS = registry.histogram("bot_external_call_seconds", "Latency of Spotify and Supabase calls.")
+LINK_REWRITES = registry.counter("bot_link_rewrites_total", "Links rewritten, by provider.")
+LOG_RECORDS_DROPPED = registry.counter("bot_log_records_dropped_total", "Log records dropped because the log queue was full.")
+LOOP_LAG = registry.histogram("bot_event_loop_lag_seconds", "How late the event loop ran a timer.")
+LOOP_LAG_LAST = registry.gauge("bot_event_loop_lag_last_seconds", "Most recent event-loop lag sample.")
+STARTUP_SECONDS = registry.gauge("bot_startup_seconds", "Seconds from process start to each startup stage.")
+MEDIA_JOB_SECONDS = registry.histogram("bot_media_job_seconds", "Time from reading an upload to having its result.")
+MEDIA_OUTPUTS = registry.counter("bot_media_outputs_total", "Media job results, by output format.")
+NP_CARD_SECONDS = registry.histogram("bot_np_card_seconds", "Time to render a /np card, image downloads included.")
+MEDIA_DISK_BYTES = registry.histogram(
+    "bot_media_job_disk_bytes", "Scratch bytes a media job wrote to disk.",
+    buckets=(0, 1 << 20, 4 << 20, 16 << 20, 64 << 20, 256 << 20),
+)
+
+
+def timed(histogram: Histogram, errors: Counter | None = None, **labels):
+    """Decorator recording how long a coroutine function takes (and, optionally, when it raises)."""
+    child = histogram.labels(**labels)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**labels)
+                raise
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+async def monitor_loop_lag(interval: float = 1.0):
+    """Sleep `interval` repeatedly and record how much later than asked the loop woke us."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
@@ -0,0 +1,306 @@
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+
+import aiohttp
+
+from cache import TTLCache
+from metrics import EXTERNAL_SECONDS, NP_CARD_SECONDS, timed
+
+# -----------------------------
+# /np card images
+# -----------------------------
+# A card is built from three layers. Each one is cached in the worker process that renders it:
+#   static  per template: background, label, empty progress bar, loaded fonts
+#   track   per template + album art + title/artist/album: the static layer with those drawn on
+#   render  per call: the track layer plus avatar, name, progress and times, encoded as JPEG
+# The bot process only downloads art and avatars, caching the bytes by URL, and sends them along
+# with the card. A worker that already has a URL's decoded image or the track layer ignores them.
+CARD_TEMPLATE = os.environ.get("CARD_TEMPLATE", "dark")
+CARD_WORKERS = int(os.environ.get("CARD_WORKERS", 1))
+CARD_IMAGE_CACHE_SIZE = 256  # Downloaded art and avatars (bytes) kept in the bot process
+CARD_IMAGE_TTL = 24 * 60 * 60
+CARD_IMAGE_FAILED_TTL = 60  # Don't refetch a broken URL on every /np, but retry soon
+CARD_MAX_IMAGE_BYTES = 2 * 1024 * 1024
+CARD_READ_CHUNK = 64 * 1024
+CARD_FETCH_TIMEOUT = 5
+CARD_WORKER_CACHE_SIZE = 128  # Decoded images and track layers kept per worker process
+CARD_AVATAR_SIZE = 128  # Requested from Discord; drawn at the template's avatar size
+# JPEG rather than PNG: a 900x300 PNG takes 12ms+ to encode even uncompressed, JPEG about 2ms. Full
+# chroma resolution keeps the text sharp. Discord rounds the corners of embed images itself.
+CARD_JPEG_QUALITY = 90
+
+log = logging.getLogger("kwakinji.spotify")
+
+
+class CardTemplate(NamedTuple):
+    name: str
+    size: tuple = (900, 300)
+    background: tuple = ((18, 18, 18), (24, 56, 38))  # Top-left and bottom-right of the gradient
+    accent: tuple = (29, 185, 84)
+    text: tuple = (255, 255, 255)
+    subtext: tuple = (179, 179, 179)
+    track: tuple = (83, 83, 83)
+    font: str = "DejaVuSans.ttf"
+    bold_font: str = "DejaVuSans-Bold.ttf"
+
+
+CARD_TEMPLATES = {
+    "dark": CardTemplate("dark"),
+    "light": CardTemplate("light", background=((250, 250, 250), (214, 240, 222)), accent=(20, 140, 62),
+                          text=(24, 24, 24), subtext=(90, 90, 90), track=(200, 200, 200)),
+}
+
+
+class NowPlayingCard(NamedTuple):
+    """What a card shows; the URLs double as the workers' cache keys for the images."""
+    title: str
+    artist: str
+    album: str
+    progress: float  # seconds
+    duration: float
+    member_name: str
+    art_url: str | None
+    avatar_url: str | None
+
+
+# -----------------------------
+# Layout (900x300 templates)
+# -----------------------------
+PAD = 30
+ART = 240
+TEXT_X = PAD + ART + 30
+AVATAR = 44
+BAR_Y = 246
+BAR_HEIGHT = 8
+
+
+# -----------------------------
+# Worker side: layers and rendering
+# -----------------------------
+_worker_images = TTLCache(maxsize=CARD_WORKER_CACHE_SIZE)  # (url, size, radius) -> (image, mask)
+_worker_tracks = TTLCache(maxsize=CARD_WORKER_CACHE_SIZE)  # (template, art, title, artist, album) -> image
+
+
+@lru_cache(maxsize=None)
+def _font(name: str, size: int):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=None)
+def _mask(size: tuple, radius: int):
+    """An antialiased rounded-square mask (a circle when radius is half the size), drawn 4x and shrunk."""
+    from PIL import Image, ImageDraw
+    big = Image.new("L", (size[0] * 4, size[1] * 4), 0)
+    ImageDraw.Draw(big).rounded_rectangle((0, 0, big.width - 1, big.height - 1), radius * 4, fill=255)
+    return big.resize(size, Image.LANCZOS)
+
+
+def _fit_text(text: str, font, width: int) -> str:
+    if font.getlength(text) <= width:
+        return text
+    while text and font.getlength(text + "…") > width:
+        text = text[:-1]
+    return text.rstrip() + "…"
+
+
+def _clock(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+@lru_cache(maxsize=None)
+def _static_layer(template: CardTemplate):
+    from PIL import Image, ImageDraw
+    width, height = template.size
+    # Diagonal gradient: a 2x2 image of the corner colours, stretched with bilinear filtering
+    (r1, g1, b1), (r2, g2, b2) = template.background
+    middle = ((r1 + r2) // 2, (g1 + g2) // 2, (b1 + b2) // 2)
+    corners = Image.new("RGB", (2, 2))
+    corners.putdata([template.background[0], middle, middle, template.background[1]])
+    card = corners.resize(template.size, Image.BILINEAR)
+    draw = ImageDraw.Draw(card)
+    draw.text((TEXT_X, PAD + 4), "NOW PLAYING", font=_font(template.bold_font, 16), fill=template.accent)
+    draw.rounded_rectangle((TEXT_X, BAR_Y, width - PAD, BAR_Y + BAR_HEIGHT), BAR_HEIGHT // 2, fill=template.track)
+    return card
+
+
+def _image(url: str | None, data: bytes | None, size: int, radius: int):
+    """(image, mask): the image at `url` cropped to a `size` square and a mask rounding its corners.
+
+    None if there is no image.
+    """
+    if url is None:
+        return None
+    key = (url, size, radius)
+    image = _worker_images.get(key)
+    if image is not None or data is None:
+        return image
+    from PIL import Image, ImageOps
+    try:
+        source = Image.open(io.BytesIO(data))
+        source.draft("RGB", (size, size))  # JPEG decodes straight at 1/2, 1/4 or 1/8 scale when that's enough
+        image = ImageOps.fit(source.convert("RGB"), (size, size), Image.LANCZOS), _mask((size, size), radius)
+    except Exception:
+        return None  # Not an image; the card gets a placeholder
+    _worker_images.set(key, image)
+    return image
+
+
+def _track_layer(template: CardTemplate, card: NowPlayingCard, art_data: bytes | None):
+    art = _image(card.art_url, art_data, ART, 16)
+    # A placeholder layer is replaced once the art downloads
+    key = (template.name, card.art_url, art is not None, card.title, card.artist, card.album)
+    layer = _worker_tracks.get(key)
+    if layer is not None:
+        return layer
+    from PIL import ImageDraw
+    layer = _static_layer(template).copy()
+    draw = ImageDraw.Draw(layer)
+    if art is not None:
+        image, mask = art
+        layer.paste(image, (PAD, PAD), mask)
+    else:
+        draw.rounded_rectangle((PAD, PAD, PAD + ART, PAD + ART), 16, fill=template.track)
+        draw.text((PAD + ART // 2, PAD + ART // 2), "♪", font=_font(template.font, 96), fill=template.subtext,
+                  anchor="mm")
+
+    text_width = template.size[0] - TEXT_X - PAD
+    title_font = _font(template.bold_font, 36)
+    draw.text((TEXT_X, PAD + 30), _fit_text(card.title, title_font, text_width), font=title_font, fill=template.text)
+    artist_font = _font(template.font, 24)
+    draw.text((TEXT_X, PAD + 80), _fit_text(card.artist, artist_font, text_width), font=artist_font,
+              fill=template.subtext)
+    album_font = _font(template.font, 18)
+    draw.text((TEXT_X, PAD + 114), _fit_text(card.album, album_font, text_width), font=album_font,
+              fill=template.subtext)
+    _worker_tracks.set(key, layer)
+    return layer
+
+
+def render_card_sync(template_name: str, card: NowPlayingCard, art_data: bytes | None,
+                     avatar_data: bytes | None) -> bytes:
+    """Draw `card` with the named template and return it as JPEG; runs in a worker process."""
+    from PIL import ImageDraw
+    template = CARD_TEMPLATES[template_name]
+    image = _track_layer(template, card, art_data).copy()
+    draw = ImageDraw.Draw(image)
+    width = template.size[0]
+
+    avatar_y = BAR_Y - AVATAR - 20
+    avatar = _image(card.avatar_url, avatar_data, AVATAR, AVATAR // 2)
+    if avatar is not None:
+        image.paste(avatar[0], (TEXT_X, avatar_y), avatar[1])
+    else:
+        image.paste(template.track, (TEXT_X, avatar_y), _mask((AVATAR, AVATAR), AVATAR // 2))
+    name_font = _font(template.bold_font, 18)
+    name_x = TEXT_X + AVATAR + 12
+    draw.text((name_x, avatar_y + AVATAR // 2), _fit_text(card.member_name, name_font, width - PAD - name_x),
+              font=name_font, fill=template.text, anchor="lm")
+
+    fraction = min(max(card.progress / card.duration, 0.0), 1.0) if card.duration > 0 else 0.0
+    bar_end = TEXT_X + round((width - PAD - TEXT_X) * fraction)
+    if bar_end > TEXT_X + BAR_HEIGHT:
+        draw.rounded_rectangle((TEXT_X, BAR_Y, bar_end, BAR_Y + BAR_HEIGHT), BAR_HEIGHT // 2, fill=template.accent)
+    knob = 2 * BAR_HEIGHT
+    image.paste(template.text, (bar_end - knob // 2, BAR_Y + (BAR_HEIGHT - knob) // 2), _mask((knob, knob), knob // 2))
+    time_font = _font(template.font, 15)
+    draw.text((TEXT_X, BAR_Y + 16), _clock(card.progress), font=time_font, fill=template.subtext)
+    draw.text((width - PAD, BAR_Y + 16), _clock(card.duration), font=time_font, fill=template.subtext, anchor="ra")
+
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=CARD_JPEG_QUALITY, subsampling=0)
+    return out.getvalue()
+
+
+def warm_worker(template_name: str) -> bool:
+    """Import Pillow, load the fonts and draw the static layer before the first /np card needs them."""
+    _static_layer(CARD_TEMPLATES[template_name])
+    return True
+
+
+# -----------------------------
+# Bot side: image fetching and the worker pool
+# -----------------------------
+class CardRenderer:
+    """Renders /np cards in a small process pool of its own, so cards never wait behind /gif jobs.
+
+    Album art and avatars are downloaded through one keep-alive session. Their bytes are cached by
+    URL in a bounded LRU, and concurrent cards needing the same URL share one download. A URL
+    that fails to download gets a placeholder in the card and is retried after a minute.
+    """
+
+    def __init__(self, template: str = CARD_TEMPLATE, *, workers: int = CARD_WORKERS,
+                 images: TTLCache | None = None, max_image_bytes: int = CARD_MAX_IMAGE_BYTES,
+                 timeout: float = CARD_FETCH_TIMEOUT, max_connections: int = 10):
+        if template not in CARD_TEMPLATES:
+            raise ValueError(f"unknown card template {template!r}; expected one of {', '.join(CARD_TEMPLATES)}")
+        self.template = template
+        self.workers = workers
+        self.images = images or TTLCache(maxsize=CARD_IMAGE_CACHE_SIZE, ttl=CARD_IMAGE_TTL,
+                                         negative_ttl=CARD_IMAGE_FAILED_TTL)
+        self.max_image_bytes = max_image_bytes
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self._session: aiohttp.ClientSession | None = None
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def start(self):
+        """Start the workers and have them prepare the template, so the first card isn't a cold one."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            for _ in range(self.workers):
+                self._pool.submit(warm_worker, self.template)
+
+    async def fetch(self, url: str | None) -> bytes | None:
+        if url is None:
+            return None
+        return await self.images.get_or_load(url, lambda: self._download(url))
+
+    @timed(EXTERNAL_SECONDS, service="cdn", call="card_image")
+    async def _download(self, url: str) -> bytes | None:
+        try:
+            async with self._get_session().get(url) as response:
+                if response.status != 200 or (response.content_length or 0) > self.max_image_bytes:
+                    return None
+                # content.read(n) only returns what's buffered so far; read to EOF under the cap
+                chunks, size = [], 0
+                async for chunk in response.content.iter_chunked(CARD_READ_CHUNK):
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        return None
+                    chunks.append(chunk)
+                return b"".join(chunks)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.warning("Couldn't fetch card image: %s", e, extra={"url": url})
+            return None
+
+    @timed(NP_CARD_SECONDS)
+    async def render(self, card: NowPlayingCard) -> bytes:
+        """The card as JPEG bytes."""
+        art, avatar = await asyncio.gather(self.fetch(card.art_url), self.fetch(card.avatar_url))
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, render_card_sync, self.template, card, art, avatar
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+
+from cache import TTLCache
+from metrics import EXTERNAL_SECONDS, timed
+
+# -----------------------------
+# Spotify profile link storage
+# -----------------------------
+PROFILE_CACHE_SIZE = 50_000
+PROFILE_CACHE_TTL = 60 * 60
+PRELOAD_CHUNK_SIZE = 200  # Keeps `in_` filters well inside PostgREST URL limits
+_MISSING = object()
+
+
+class SupabaseTable:
+    """Base of the Supabase table backends; the supabase client is sync, so calls run in a worker thread.
+
+    Pass a client, or `url` and `key` to create one on first use; importing supabase takes a few
+    hundred milliseconds that would otherwise sit on the startup path.
+    """
+
+    table: str
+
+    def __init__(self, supabase=None, *, url: str | None = None, key: str | None = None):
+        self._supabase = supabase
+        self.url = url
+        self.key = key
+        self._lock = threading.Lock()
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            with self._lock:
+                if self._supabase is None:
+                    from supabase import create_client
+                    self._supabase = create_client(self.url, self.key)
+        return self._supabase
+
+
+class SupabaseProfileBackend(SupabaseTable):
+    """spotify_profiles table access."""
+
+    table = "spotify_profiles"
+
+    def _fetch_many(self, user_ids):
+        response = self.supabase.table(self.table).select("user_id, profile_link").in_("user_id", user_ids).execute()
+        return {int(row['user_id']): row['profile_link'] for row in response.data}
+
+    def _upsert(self, user_id, link):
+        self.supabase.table(self.table).upsert({"user_id": user_id, "profile_link": link}).execute()
+
+    def _delete(self, user_id):
+        response = self.supabase.table(self.table).delete().eq("user_id", user_id).execute()
+        return bool(response.data)
+
+    @timed(EXTERNAL_SECONDS, service="supabase", call="select")
+    async def fetch_many(self, user_ids) -> dict:
+        return await asyncio.to_thread(self._fetch_many, list(user_ids))
+
+    @timed(EXTERNAL_SECONDS, service="supabase", call="upsert")
+    async def upsert(self, user_id: int, link: str):
+        await asyncio.to_thread(self._upsert, user_id, link)
+
+    @timed(EXTERNAL_SECONDS, service="supabase", call="delete")
+    async def delete(self, user_id: int) -> bool:
+        return await asyncio.to_thread(self._delete, user_id)
+
+
+class MemoryProfileBackend:
+    """Offline stand-in for SupabaseProfileBackend."""
+
+    def __init__(self, rows: dict | None = None):
+        self.rows = dict(rows or {})
+        self.queries = 0
+
+    async def fetch_many(self, user_ids) -> dict:
+        self.queries += 1
+        return {user_id: self.rows[user_id] for user_id in user_ids if user_id in self.rows}
+
+    async def upsert(self, user_id: int, link: str):
+        self.queries += 1
+        self.rows[user_id] = link
+
+    async def delete(self, user_id: int) -> bool:
+        self.queries += 1
+        return self.rows.pop(user_id, None) is not None
+
+
+class SpotifyProfileStore:
+    """Read-through, write-through cache over a profile backend. Users without a link are cached as None."""
+
+    def __init__(self, backend, cache: TTLCache | None = None):
+        self.backend = backend
+        self.cache = cache or TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+        self._writes = 0
+        self._written = {}  # user_id -> (self._writes after its last set/delete, link), so older loads don't undo it
+
+    def _written_since(self, user_id: int, started: int):
+        """The link set or deleted for `user_id` after write `started`, else _MISSING."""
+        written = self._written.get(user_id)
+        return written[1] if written is not None and written[0] > started else _MISSING
+
+    def _record(self, user_id: int, link: str | None):
+        self._writes += 1
+        self._written[user_id] = (self._writes, link)
+        self.cache.set(user_id, link)
+
+    async def get(self, user_id: int) -> str | None:
+        async def load():
+            started = self._writes
+            rows = await self.backend.fetch_many([user_id])
+            written = self._written_since(user_id, started)
+            return rows.get(user_id) if written is _MISSING else written
+        return await self.cache.get_or_load(user_id, load)
+
+    async def set(self, user_id: int, link: str):
+        await self.backend.upsert(user_id, link)
+        self._record(user_id, link)
+
+    async def delete(self, user_id: int) -> bool:
+        removed = await self.backend.delete(user_id)
+        self._record(user_id, None)
+        return removed
+
+    async def get_many(self, user_ids) -> dict:
+        """Return {user_id: link} for those of `user_ids` with a link; only uncached ids hit the backend."""
+        links = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            if user_id in self.cache:
+                link = self.cache.get(user_id)
+                if link is not None:
+                    links[user_id] = link
+            else:
+                missing.append(user_id)
+
+        for i in range(0, len(missing), PRELOAD_CHUNK_SIZE):
+            chunk = missing[i:i + PRELOAD_CHUNK_SIZE]
+            started = self._writes
+            rows = await self.backend.fetch_many(chunk)
+            for user_id in chunk:
+                link = self._written_since(user_id, started)
+                if link is _MISSING:
+                    link = rows.get(user_id)
+                    self.cache.set(user_id, link)
+                if link is not None:
+                    links[user_id] = link
+        return links
+
+    async def preload(self, user_ids) -> int:
+        """Bulk-load profiles for `user_ids` (e.g. a guild's members); returns how many links were found."""
+        return len(await self.get_many(user_ids))
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+
+from media_io import OUTPUT_FORMATS
+
+# -----------------------------
+# Content-addressed media result cache
+# -----------------------------
+GIF_CACHE_DIR = os.environ.get("GIF_CACHE_DIR", "./.gif_cache")
+GIF_CACHE_MAX_BYTES = int(os.environ.get("GIF_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+
+class MediaResultCache:
+    """On-disk cache of conversion results keyed by sha256(input bytes + parameters), LRU-evicted by size.
+
+    Each result is stored as `<key>.<format>`, so WebP and MP4 results aren't named as GIFs.
+    """
+
+    def __init__(self, directory: str = GIF_CACHE_DIR, max_bytes: int = GIF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = None  # key -> (size, format), least recently used first; loaded on first use
+        self._total = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # Input bytes that skipped conversion thanks to a hit
+
+    @staticmethod
+    def key(data: bytes | str, **params) -> str:
+        """Cache key for `data`, or for the file at that path, read in chunks."""
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                digest = hashlib.file_digest(f, "sha256")
+        else:
+            digest = hashlib.sha256(data)
+        for name in sorted(params):
+            digest.update(f"\0{name}={params[name]}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def _load_index(self):
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    key, _, fmt = name.rpartition(".")
+                    if key and fmt in OUTPUT_FORMATS:
+                        st = os.stat(os.path.join(root, name))
+                        entries.append((st.st_mtime, key, st.st_size, fmt))
+        entries.sort()
+        self._entries = OrderedDict((key, (size, fmt)) for _, key, size, fmt in entries)
+        self._total = sum(size for size, _ in self._entries.values())
+
+    def _read(self, key: str, fmt: str) -> bytes | None:
+        path = self._path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # Keeps recency across restarts
+        return data
+
+    def _write(self, key: str, fmt: str, data: bytes):
+        path = self._path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _remove(self, entries: list):
+        for old, fmt in entries:
+            try:
+                os.remove(self._path(old, fmt))
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str, input_size: int = 0) -> bytes | None:
+        if self._entries is None:
+            await asyncio.to_thread(self._load_index)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        data = await asyncio.to_thread(self._read, key, entry[1])
+        if data is None:
+            # Removed behind our back
+            self._forget(key)
+            self.misses += 1
+            return None
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += input_size
+        return data
+
+    def _forget(self, key: str) -> tuple | None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total -= entry[0]
+        return entry
+
+    async def put(self, key: str, data: bytes, fmt: str = "gif"):
+        if len(data) > self.max_bytes:
+            return
+        if self._entries is None:
+            await asyncio.to_thread(self._load_index)
+
+        # Only index the entry once the file is fully in place
+        await asyncio.to_thread(self._write, key, fmt, data)
+        old = self._forget(key)
+        evict = [(key, old[1])] if old is not None and old[1] != fmt else []
+        self._entries[key] = (len(data), fmt)
+        self._total += len(data)
+
+        while self._total > self.max_bytes:
+            old, (size, old_fmt) = self._entries.popitem(last=False)
+            self._total -= size
+            evict.append((old, old_fmt))
+        if evict:
+            await asyncio.to_thread(self._remove, evict)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries or ()),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
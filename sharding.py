@@ -0,0 +1,102 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+# -----------------------------
+# Shard configuration and multi-process launcher
+# -----------------------------
+# SHARD_COUNT / SHARD_IDS pick the shards one process runs; SHARD_PROCESSES > 1 makes `python main.py`
+# a supervisor that splits the shards into contiguous ranges, one child process per range.
+DISCORD_GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+RESTART_DELAY = 5  # seconds; also keeps a crash-looping child from spinning
+SHARD_START_INTERVAL = 5  # Discord allows one IDENTIFY per 5s per bucket
+
+log = logging.getLogger("kwakinji")
+
+
+def parse_shard_ids(spec: str | None) -> list | None:
+    """"0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]; empty means every shard."""
+    if not spec:
+        return None
+    shard_ids = []
+    for part in spec.split(","):
+        start, _, end = part.strip().partition("-")
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(shard_ids))
+
+
+def format_shard_ids(shard_ids) -> str:
+    shard_ids = list(shard_ids)
+    return f"{shard_ids[0]}-{shard_ids[-1]}" if len(shard_ids) > 1 else str(shard_ids[0])
+
+
+def split_shards(shard_count: int, processes: int) -> list:
+    """Split shards 0..shard_count-1 into at most `processes` contiguous, near-equal ranges."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(range(start, end))
+        start = end
+    return ranges
+
+
+async def recommended_shard_count(token: str) -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(DISCORD_GATEWAY_BOT_URL, headers={"Authorization": f"Bot {token}"}) as r:
+            r.raise_for_status()
+            return (await r.json())["shards"]
+
+
+def run_shard_processes(script: str, shard_count: int, processes: int, base_port: int):
+    """Run `script` once per shard range, restarting children that exit, until SIGINT/SIGTERM."""
+    ranges = split_shards(shard_count, processes)
+    children = {}
+    stopping = False
+
+    def spawn(index: int):
+        env = dict(
+            os.environ,
+            SHARD_COUNT=str(shard_count),
+            SHARD_IDS=format_shard_ids(ranges[index]),
+            SHARD_PROCESSES="1",
+            PORT=str(base_port + index),  # One health/metrics server per process
+        )
+        children[index] = subprocess.Popen([sys.executable, script], env=env)
+        log.info("Started shards %s of %d (pid %d, port %s)", env["SHARD_IDS"], shard_count, children[index].pid, env["PORT"])
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children.values():
+            child.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index, shard_range in enumerate(ranges):
+        if stopping:
+            break
+        spawn(index)
+        if index < len(ranges) - 1:
+            # Each child identifies len(range) shards; stagger so they don't all hit the limit at once
+            time.sleep(SHARD_START_INTERVAL * len(shard_range))
+
+    while children:
+        for index, child in list(children.items()):
+            code = child.poll()
+            if code is None:
+                continue
+            del children[index]
+            if not stopping:
+                log.warning("Shards %s exited with code %s, restarting in %ss", format_shard_ids(ranges[index]), code, RESTART_DELAY)
+                time.sleep(RESTART_DELAY)
+                spawn(index)
+        time.sleep(1)
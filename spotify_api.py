@@ -0,0 +1,175 @@
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from cache import TTLCache
+from metrics import EXTERNAL_SECONDS, timed
+
+# -----------------------------
+# Async Spotify Web API client
+# -----------------------------
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+
+TRACK_CACHE_SIZE = 2048
+TRACK_CACHE_TTL = 24 * 60 * 60  # Track metadata practically never changes
+TRACK_NOT_FOUND_TTL = 10 * 60
+TRACKS_BATCH_SIZE = 50  # Max ids per GET /tracks request
+MAX_RETRY_AFTER = 5  # Longer waits are cut short; the caller has a Discord interaction to answer
+
+_NOT_CACHED = object()
+
+
+def parse_retry_after(value: str | None, default: float = 1.0, maximum: float = MAX_RETRY_AFTER) -> float:
+    """Seconds to wait for a Retry-After header (delta-seconds or HTTP-date), between 0 and `maximum`."""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            seconds = default
+        else:
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        seconds = default
+    return min(max(seconds, 0.0), maximum)
+
+
+class SpotifyClient:
+    """Client-credentials Spotify client sharing one keep-alive aiohttp session."""
+
+    def __init__(self, client_id: str, client_secret: str, *, api_url: str = SPOTIFY_API_URL,
+                 token_url: str = SPOTIFY_TOKEN_URL, timeout: float = 10, max_retries: int = 3,
+                 max_connections: int = 20, track_cache: TTLCache | None = None,
+                 not_found_ttl: float = TRACK_NOT_FOUND_TTL, max_retry_after: float = MAX_RETRY_AFTER):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_url = api_url.rstrip("/")
+        self.token_url = token_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.max_connections = max_connections
+        self.track_cache = track_cache or TTLCache(
+            maxsize=TRACK_CACHE_SIZE, ttl=TRACK_CACHE_TTL, negative_ttl=not_found_ttl
+        )
+
+        self._session: aiohttp.ClientSession | None = None
+        self._token = None
+        self._token_exp = 0
+        self._token_lock = asyncio.Lock()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def _token_valid(self) -> bool:
+        return self._token is not None and time.time() < self._token_exp - 60
+
+    async def get_token(self) -> str:
+        """Return a valid access token, refreshing it at most once for concurrent callers."""
+        if self._token_valid():
+            return self._token
+
+        async with self._token_lock:
+            # Another caller may have refreshed while we waited on the lock
+            if not self._token_valid():
+                await self._refresh_token()
+            return self._token
+
+    @timed(EXTERNAL_SECONDS, service="spotify", call="token")
+    async def _refresh_token(self):
+        session = self._get_session()
+        async with session.post(
+            self.token_url,
+            auth=aiohttp.BasicAuth(self.client_id or "", self.client_secret or ""),
+            data={"grant_type": "client_credentials"},
+        ) as r:
+            r.raise_for_status()
+            res = await r.json()
+        self._token = res["access_token"]
+        self._token_exp = time.time() + res["expires_in"]
+
+    @timed(EXTERNAL_SECONDS, service="spotify", call="api")
+    async def request(self, path: str, params: dict | None = None) -> dict:
+        """GET an API path, retrying on 429 (honouring Retry-After) and on an expired token."""
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            token = await self.get_token()
+            async with session.get(
+                f"{self.api_url}{path}",
+                params=params,
+                headers={"Authorization": f"Bearer {token}"},
+            ) as r:
+                if attempt == self.max_retries or r.status not in (401, 429):
+                    r.raise_for_status()
+                    return await r.json()
+                status = r.status
+                retry_after = parse_retry_after(r.headers.get("Retry-After"), maximum=self.max_retry_after)
+            # Out here so the connection is back in the pool while we wait
+            if status == 429:
+                await asyncio.sleep(retry_after)
+            elif self._token == token:
+                # Unless a concurrent request already got a new one
+                self._token = None
+
+    async def get_track(self, track_id: str) -> dict | None:
+        """Return track metadata from the cache or the API; None if Spotify doesn't know the track."""
+        return await self.track_cache.get_or_load(track_id, lambda: self._fetch_track(track_id))
+
+    async def _fetch_track(self, track_id: str) -> dict | None:
+        try:
+            return await self.request(f"/tracks/{track_id}")
+        except aiohttp.ClientResponseError as e:
+            if e.status not in (400, 404):
+                raise
+        # Cached as a negative entry for `not_found_ttl`
+        return None
+
+    async def get_tracks(self, track_ids) -> dict:
+        """Return {track_id: metadata or None}, fetching uncached tracks in batches of 50 per request."""
+        tracks = {}
+        missing = []
+        for track_id in dict.fromkeys(track_ids):
+            track = self.track_cache.get(track_id, _NOT_CACHED)
+            if track is _NOT_CACHED:
+                missing.append(track_id)
+            else:
+                tracks[track_id] = track
+
+        async def fetch(chunk):
+            res = await self.request("/tracks", {"ids": ",".join(chunk)})
+            # Unknown ids come back as null, in request order
+            for track_id, track in zip(chunk, res["tracks"]):
+                self.track_cache.set(track_id, track)
+                tracks[track_id] = track
+
+        await asyncio.gather(*(
+            fetch(missing[i:i + TRACKS_BATCH_SIZE]) for i in range(0, len(missing), TRACKS_BATCH_SIZE)
+        ))
+        return tracks
+
+    @staticmethod
+    def artist_of(track: dict | None):
+        """(name, url) of a track's first artist, or None."""
+        if not track or not track.get('artists'):
+            return None
+        artist = track['artists'][0]
+        return artist['name'], artist['external_urls']['spotify']
+
+    async def get_artist_from_track(self, track_id: str):
+        return self.artist_of(await self.get_track(track_id))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()